@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'photos.pagecache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -96,6 +97,17 @@ DATABASES = {
     }
 }
 
+# Кэш
+# По умолчанию кэш в памяти процесса. При нескольких воркерах gunicorn
+# укажите общий бэкенд, чтобы инвалидация была видна всем процессам.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'photoboard'),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -153,7 +165,7 @@ LOGOUT_REDIRECT_URL = 'users:login'
 
 # Бэкенды аутентификации
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'users.authentication.CachedModelBackend',
     'users.authentication.EmailAuthBackend',
 ]
 
@@ -214,6 +226,12 @@ if 'RAILWAY_PUBLIC_DOMAIN' in os.environ:
     domain = os.environ['RAILWAY_PUBLIC_DOMAIN']
     CSRF_TRUSTED_ORIGINS.append(f'https://{domain}')
 
+# Число доверенных обратных прокси перед приложением. Каждый дописывает
+# адрес клиента в X-Forwarded-For; REMOTE_ADDR за ними - адрес прокси,
+# поэтому IP для ограничения попыток входа берётся из заголовка
+TRUSTED_PROXY_COUNT = int(os.environ.get(
+    'TRUSTED_PROXY_COUNT', '1' if 'RAILWAY_PUBLIC_DOMAIN' in os.environ else '0'))
+
 # Дополнительные CSRF настройки
 CSRF_COOKIE_SECURE = not DEBUG  # True в продакшене
 CSRF_COOKIE_HTTPONLY = True
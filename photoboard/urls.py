@@ -1,21 +1,19 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from .views import HomePageView
+from .media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', HomePageView.as_view(), name='home'),  # Используем класс-представление
     path('photos/', include('photos.urls', namespace='photos')),  # Добавляем namespace
     path('users/', include('users.urls', namespace="users")),
+    # Медиафайлы с ETag, 304, Range и долгим кэшированием
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
 ]
 
-# Обслуживание статических и медиа файлов
+# Обслуживание статических файлов (в продакшене их отдаёт WhiteNoise)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-else:
-    # Для продакшена (Railway)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,8 +1,12 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from django.contrib import messages
-from .models import Photo, Category, Comment
+from .models import Photo, Category, Comment, ImageFile, PhotoStat, ProcessingJob
+from .cache import PHOTO_LIST_STATS_KEY, bump_version, invalidate_photo_neighbours
+from .pagecache import purge_photo_pages
 from django.contrib.admin import SimpleListFilter
+from django.db.models import F, Q
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -31,10 +35,26 @@ class HasTagsFilter(SimpleListFilter):
         if self.value() == 'no':
             return queryset.filter(tags__isnull=True)
 
+class NearDuplicateFilter(SimpleListFilter):
+    title = 'Похожие изображения'
+    parameter_name = 'near_duplicate'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('yes', 'Есть похожие'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(
+                Q(image_file__similar_to__isnull=False) |
+                Q(image_file__near_duplicates__isnull=False)).distinct()
+
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
-    list_display = ('title', 'display_image', 'category_type', 'uploaded_by', 'uploaded_at', 'tag_list')
-    list_filter = ('category_type', 'uploaded_at', HasTagsFilter)
+    list_display = ('title', 'display_image', 'category_type', 'uploaded_by', 'uploaded_at', 'tag_list', 'processing_status', 'near_duplicate')
+    list_filter = ('category_type', 'uploaded_at', 'processing_status', HasTagsFilter, NearDuplicateFilter)
+    list_select_related = ('uploaded_by', 'image_file__similar_to')
     search_fields = ('title', 'description', 'tags__name')
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = ('uploaded_at', 'display_large_image')
@@ -59,14 +79,14 @@ class PhotoAdmin(admin.ModelAdmin):
     # Пользовательское поле 1: отображение миниатюры
     def display_image(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="50" height="50" style="object-fit: cover;" />', obj.image.url)
+            return format_html('<img src="{}" width="50" height="50" style="object-fit: cover;" />', obj.get_rendition_url('thumb'))
         return "Нет изображения"
     display_image.short_description = 'Миниатюра'
     
     # Пользовательское поле 2: отображение большого изображения
     def display_large_image(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="300" style="max-height: 300px; object-fit: contain;" />', obj.image.url)
+            return format_html('<img src="{}" width="300" style="max-height: 300px; object-fit: contain;" />', obj.get_rendition_url('card'))
         return "Нет изображения"
     display_large_image.short_description = 'Предпросмотр'
     
@@ -74,10 +94,32 @@ class PhotoAdmin(admin.ModelAdmin):
     def tag_list(self, obj):
         return ", ".join(o.name for o in obj.tags.all())
     tag_list.short_description = 'Теги'
+
+    # Пользовательское поле 4: почти совпадающее изображение
+    def near_duplicate(self, obj):
+        similar = obj.image_file.similar_to if obj.image_file else None
+        if similar:
+            return format_html('<span style="color: #c0392b;">⚠ {}</span>', similar.name)
+        return '-'
+    near_duplicate.short_description = 'Похоже на'
     
+    def set_category(self, queryset, category_type):
+        """
+        Массовая смена категории. update() не отправляет сигналы, поэтому
+        счётчики категорий, статистика списка, соседи в категориях и кэш
+        страниц обновляются здесь
+        """
+        updated = queryset.update(category_type=category_type,
+                                  cache_version=F('cache_version') + 1)
+        PhotoStat.rebuild([PhotoStat.CATEGORY])
+        bump_version(PHOTO_LIST_STATS_KEY)
+        invalidate_photo_neighbours()
+        purge_photo_pages()
+        return updated
+
     # Пользовательское действие 1
     def mark_as_nature(self, request, queryset):
-        updated = queryset.update(category_type='NATURE')
+        updated = self.set_category(queryset, 'NATURE')
         self.message_user(
             request, 
             f'Обновлено {updated} фотографий - установлена категория "Природа"',
@@ -87,7 +129,7 @@ class PhotoAdmin(admin.ModelAdmin):
     
     # Пользовательское действие 2
     def mark_as_architecture(self, request, queryset):
-        updated = queryset.update(category_type='ARCHITECTURE')
+        updated = self.set_category(queryset, 'ARCHITECTURE')
         self.message_user(
             request, 
             f'Обновлено {updated} фотографий - установлена категория "Архитектура"',
@@ -134,3 +176,24 @@ class CommentAdmin(admin.ModelAdmin):
     def text_preview(self, obj):
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
     text_preview.short_description = 'Комментарий'
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('photo', 'task', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_by', 'last_error')
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=ProcessingJob.RUNNING).update(
+            status=ProcessingJob.PENDING, attempts=0, locked_by='', run_after=timezone.now())
+        self.message_user(request, f'Возвращено в очередь задач: {updated}', messages.SUCCESS)
+    retry_jobs.short_description = "Повторить выбранные задачи"
+
+@admin.register(ImageFile)
+class ImageFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'ref_count', 'similar_to', 'created_at')
+    list_filter = (('similar_to', admin.EmptyFieldListFilter),)
+    list_select_related = ('similar_to',)
+    search_fields = ('name', 'sha256')
+    readonly_fields = ('name', 'sha256', 'perceptual_hash', 'ref_count', 'similar_to', 'created_at')
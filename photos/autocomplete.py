@@ -0,0 +1,144 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db.models import Count
+from taggit.models import Tag  # type: ignore
+
+from .cache import bump_version, get_version
+from .stemmer import fold
+
+TAG_INDEX_KEY = 'photos:tag_index'
+# Как часто процесс сверяет свою версию индекса с общей в кэше
+TAG_INDEX_CHECK_INTERVAL = 30
+# Полная перезагрузка не реже этого срока: правки в обход сигналов
+# (update(), откат транзакции) не остаются в индексе навсегда
+TAG_INDEX_MAX_AGE = 10 * 60
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 20
+# Сколько готовых ответов по префиксам хранится до следующего изменения тегов
+RESULT_CACHE_SIZE = 1000
+
+
+class TagPrefixIndex:
+    """
+    Индекс названий тегов в памяти процесса для автодополнения.
+
+    Названия хранятся приведёнными (stemmer.fold: регистр, "ё" как "е")
+    в отсортированном списке, так что теги с префиксом - непрерывный
+    диапазон, который находится двоичным поиском; из него берутся самые
+    используемые. Поиск не обращается к БД.
+
+    Изменения тегов в этом процессе вносятся сигналами сразу и отмечаются
+    в общей версии в кэше. Остальные процессы раз в
+    TAG_INDEX_CHECK_INTERVAL секунд сверяют версию и при расхождении
+    загружают индекс заново одним запросом.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.version = None
+        self.checked_at = 0
+        self.loaded_at = 0
+        self.keys = []
+        self.tags = {}
+        self.results = {}
+
+    def load(self):
+        rows = Tag.objects.annotate(count=Count('taggit_taggeditem_items')).values_list(
+            'pk', 'name', 'slug', 'count')
+        with self.lock:
+            self.version = get_version(TAG_INDEX_KEY)
+            self.tags = {pk: [name, slug, count] for pk, name, slug, count in rows}
+            self.keys = sorted((fold(name), pk) for pk, (name, _, _) in self.tags.items())
+            self.results = {}
+            self.loaded = True
+            self.checked_at = self.loaded_at = time.monotonic()
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self.loaded and now - self.checked_at < TAG_INDEX_CHECK_INTERVAL:
+            return
+        if (not self.loaded or now - self.loaded_at >= TAG_INDEX_MAX_AGE
+                or get_version(TAG_INDEX_KEY) != self.version):
+            self.load()
+        self.checked_at = now
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """Самые используемые теги, название которых начинается с prefix"""
+        prefix = fold(prefix.strip())
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        with self.lock:
+            found = self.results.get((prefix, limit))
+            if found is None:
+                start = bisect_left(self.keys, (prefix,))
+                matches = []
+                for i in range(start, len(self.keys)):
+                    key, pk = self.keys[i]
+                    if not key.startswith(prefix):
+                        break
+                    if self.tags[pk][2]:
+                        matches.append(pk)
+                best = heapq.nlargest(limit, matches, key=lambda pk: (self.tags[pk][2], -pk))
+                found = [{'name': self.tags[pk][0], 'slug': self.tags[pk][1],
+                          'count': self.tags[pk][2]} for pk in best]
+                if len(self.results) >= RESULT_CACHE_SIZE:
+                    self.results.clear()
+                self.results[prefix, limit] = found
+            return found
+
+    def _changed(self):
+        """
+        Отмечает изменение в общей версии. Если между изменениями версию
+        увеличил другой процесс, его изменения здесь не видны - индекс
+        будет загружен заново при следующей сверке.
+        """
+        self.results = {}
+        version = bump_version(TAG_INDEX_KEY)
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+        else:
+            self.invalidate()
+
+    def invalidate(self):
+        """Следующий поиск загрузит индекс из БД заново"""
+        self.version = None
+        self.checked_at = 0
+
+    def put(self, tag_id, name, slug):
+        """Новый или переименованный тег"""
+        with self.lock:
+            if self.loaded:
+                tag = self.tags.get(tag_id)
+                if tag is not None:
+                    self.keys.remove((fold(tag[0]), tag_id))
+                    tag[:2] = name, slug
+                else:
+                    self.tags[tag_id] = [name, slug, 0]
+                insort(self.keys, (fold(name), tag_id))
+            self._changed()
+
+    def remove(self, tag_id):
+        with self.lock:
+            tag = self.tags.pop(tag_id, None) if self.loaded else None
+            if tag is not None:
+                self.keys.remove((fold(tag[0]), tag_id))
+            self._changed()
+
+    def add_usage(self, tag_ids, delta):
+        """Теги поставлены (delta > 0) или сняты (delta < 0) с объектов"""
+        with self.lock:
+            tags = [self.tags.get(tag_id) for tag_id in tag_ids] if self.loaded else [None]
+            for tag in tags:
+                if tag is not None:
+                    tag[2] = max(tag[2] + delta, 0)
+            self._changed()
+            if None in tags:
+                self.invalidate()
+
+
+tag_index = TagPrefixIndex()
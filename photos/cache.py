@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+from .models import Photo, PhotoCategory
+
+PHOTO_LIST_STATS_KEY = 'photos:photo_list_stats'
+PHOTO_LIST_STATS_TIMEOUT = 60 * 60
+PHOTO_NEIGHBOURS_KEY = 'photos:neighbours'
+PHOTO_NEIGHBOURS_TIMEOUT = 24 * 60 * 60
+
+
+def get_version(key):
+    """Текущая версия группы кэшированных данных"""
+    version = cache.get(f'{key}:version')
+    if version is None:
+        cache.add(f'{key}:version', 1, timeout=None)
+        version = cache.get(f'{key}:version', 1)
+    return version
+
+
+def bump_version(key):
+    """Инвалидирует все записи группы, увеличивая её версию; возвращает новую"""
+    try:
+        return cache.incr(f'{key}:version')
+    except ValueError:
+        cache.set(f'{key}:version', 2, timeout=None)
+        return 2
+
+
+def get_photo_list_stats():
+    """
+    Статистика для боковой панели списка фотографий.
+
+    Счётчики по категориям, общее число и даты первой/последней загрузки
+    считаются одним запросом с условной агрегацией. Результат вместе со
+    списком лет и популярными тегами хранится в кэше до следующего
+    изменения фотографий или тегов.
+    """
+    version = get_version(PHOTO_LIST_STATS_KEY)
+    stats = cache.get(PHOTO_LIST_STATS_KEY, version=version)
+    if stats is not None:
+        return stats
+
+    categories = PhotoCategory.choices()
+    aggregates = Photo.objects.aggregate(
+        total_photos=Count('pk'),
+        latest_uploaded_at=Max('uploaded_at'),
+        earliest_uploaded_at=Min('uploaded_at'),
+        **{
+            f'category_{category_type}': Count(
+                'pk', filter=Q(category_type=category_type))
+            for category_type, _ in categories
+        })
+
+    category_counts = {
+        category_type: aggregates.pop(f'category_{category_type}')
+        for category_type, _ in categories
+    }
+    stats = {
+        **aggregates,
+        'category_counts': category_counts,
+        'avg_photos_per_category':
+        sum(category_counts.values()) / len(categories) if categories else 0,
+        'years': list(
+            Photo.objects.dates('uploaded_at', 'year').values_list(
+                'uploaded_at__year', flat=True)),
+        'popular_tags': Photo.custom.get_popular_tags(10),
+    }
+
+    cache.set(PHOTO_LIST_STATS_KEY, stats, PHOTO_LIST_STATS_TIMEOUT,
+              version=version)
+    return stats
+
+
+def photo_neighbours_key(pk):
+    return f'{PHOTO_NEIGHBOURS_KEY}:{pk}'
+
+
+def get_photo_neighbours(photo):
+    """Соседи фотографии для навигации (Photo.find_neighbours) из кэша"""
+    key = photo_neighbours_key(photo.pk)
+    version = get_version(PHOTO_NEIGHBOURS_KEY)
+    neighbours = cache.get(key, version=version)
+    if neighbours is None:
+        neighbours = photo.find_neighbours()
+        cache.set(key, neighbours, PHOTO_NEIGHBOURS_TIMEOUT, version=version)
+    return neighbours
+
+
+def neighbour_pks(photo):
+    """pk фотографий, для которых photo - сосед (и наоборот)"""
+    return {
+        neighbour['pk']
+        for neighbour in photo.find_neighbours().values() if neighbour
+    }
+
+
+def invalidate_photo_neighbours(pks=None):
+    """Сбрасывает соседей указанных фотографий или (без аргумента) всех"""
+    if pks is None:
+        bump_version(PHOTO_NEIGHBOURS_KEY)
+    else:
+        cache.delete_many([photo_neighbours_key(pk) for pk in pks],
+                          version=get_version(PHOTO_NEIGHBOURS_KEY))
@@ -0,0 +1,50 @@
+from django.core.paginator import Paginator
+
+from .models import Comment
+
+# Сколько корневых комментариев (вместе с ветками ответов) на странице
+COMMENTS_PER_PAGE = 20
+
+
+def build_comment_tree(comments):
+    """
+    Собирает дерево из плоского списка комментариев (по возрастанию даты).
+
+    Каждому комментарию проставляется children - прямые ответы, а корневому
+    ещё и thread - все ответы ветки в порядке обхода дерева. Родитель
+    присваивается из уже загруженных объектов, поэтому обращение к
+    comment.parent не делает запросов. Возвращает корневые комментарии,
+    новые первыми.
+    """
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        comment.thread = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            comment.parent = parent
+            parent.children.append(comment)
+
+    for root in roots:
+        stack = list(reversed(root.children))
+        while stack:
+            reply = stack.pop()
+            root.thread.append(reply)
+            stack.extend(reversed(reply.children))
+    roots.reverse()
+    return roots
+
+
+def comment_page(photo, page_number=None, per_page=COMMENTS_PER_PAGE):
+    """
+    Страница обсуждения фотографии: все комментарии читаются одним запросом
+    (с авторами через JOIN), дерево строится в Python, а постранично
+    делятся корневые комментарии вместе с их ветками.
+    """
+    comments = list(
+        Comment.objects.filter(photo=photo).select_related('user').order_by('created_at', 'pk'))
+    return Paginator(build_comment_tree(comments), per_page).get_page(page_number)
@@ -0,0 +1,65 @@
+import hashlib
+
+from PIL import Image
+
+# Изображения с расстоянием Хэмминга между dHash не больше порога
+# считаются почти одинаковыми (из 64 бит)
+SIMILARITY_THRESHOLD = 6
+HASH_SIZE = 8
+# Хэш делится на полосы по 8 бит. Полос больше, чем порог, поэтому у двух
+# похожих хэшей хотя бы одна полоса совпадает целиком
+HASH_BANDS = 8
+
+
+def content_hash(file):
+    """SHA-256 содержимого django File, читаемого по частям"""
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        # Уже посчитан ImageUploadHandler во время загрузки
+        return digest
+
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+def perceptual_hash(file):
+    """
+    Разностный хэш (dHash): изображение уменьшается до 9x8 в оттенках
+    серого, каждый бит - сравнение соседних пикселей по горизонтали.
+    Возвращает 16 шестнадцатеричных символов или '' для нечитаемого файла.
+    """
+    try:
+        file.seek(0)
+        image = Image.open(file)
+        # Для JPEG декодер сразу уменьшает изображение, это намного быстрее
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        image = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE),
+                                          Image.Resampling.LANCZOS)
+    except (OSError, ValueError):
+        return ''
+    finally:
+        file.seek(0)
+
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f'{bits:016x}'
+
+
+def hamming_distance(first, second):
+    """Число различающихся бит двух перцептивных хэшей"""
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+def hash_bands(phash):
+    """Пары (номер полосы, значение) перцептивного хэша"""
+    width = len(phash) // HASH_BANDS
+    return [(band, phash[band * width:(band + 1) * width])
+            for band in range(HASH_BANDS)]
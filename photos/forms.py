@@ -1,9 +1,15 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator, MaxLengthValidator
+from django.db import transaction
+from django.urls import reverse_lazy
 from .models import Photo, Category, Comment, PhotoCategory
+from .tagging import parse_tag_names, set_photo_tags
+from .uploadhandlers import MAX_UPLOAD_SIZE, IMAGE_SIGNATURES
 import re
 
+ALLOWED_CONTENT_TYPES = {content_type for _, content_type in IMAGE_SIGNATURES}
+
 
 def validate_no_profanity(value):
     """Собственный валидатор для проверки на нецензурную лексику"""
@@ -14,7 +20,7 @@ def validate_no_profanity(value):
 
 def validate_image_size(value):
     """Собственный валидатор для проверки размера изображения"""
-    if value.size > 10 * 1024 * 1024:  # 10MB
+    if value.size > MAX_UPLOAD_SIZE:
         raise ValidationError('Размер файла не должен превышать 10MB')
 
 def validate_title_format(value):
@@ -78,7 +84,9 @@ class PhotoUploadForm(forms.Form):
         validators=[validate_no_profanity],
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'природа, горы, закат'
+            'placeholder': 'природа, горы, закат',
+            'autocomplete': 'off',
+            'data-autocomplete-url': reverse_lazy('photos:tag_autocomplete'),
         }),
         label="Теги",
         help_text="Введите теги через запятую"
@@ -112,7 +120,9 @@ class PhotoForm(forms.ModelForm):
         validators=[validate_no_profanity],
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'Введите теги через запятую'
+            'placeholder': 'Введите теги через запятую',
+            'autocomplete': 'off',
+            'data-autocomplete-url': reverse_lazy('photos:tag_autocomplete'),
         }),
         label="Теги",
         help_text='Введите теги через запятую, например: природа, горы, закат'
@@ -176,8 +186,11 @@ class PhotoForm(forms.ModelForm):
         """Дополнительная валидация изображения"""
         image = self.cleaned_data.get('image')
         if image:
-            # Проверяем тип файла
-            if not image.content_type.startswith('image/'):
+            # Проверяем тип файла. content_type определён по содержимому
+            # (ImageUploadHandler и Pillow), а не взят из заголовка клиента.
+            # У уже сохранённого изображения при редактировании его нет.
+            content_type = getattr(image, 'content_type', None)
+            if content_type is not None and content_type not in ALLOWED_CONTENT_TYPES:
                 raise ValidationError('Файл должен быть изображением')
             
             # Проверяем расширение
@@ -188,21 +201,15 @@ class PhotoForm(forms.ModelForm):
         return image
 
     def save(self, commit=True):
-        instance = super().save(commit=False)
-        
-        if commit:
-            instance.save()
-            
-            # Обработка тегов с taggit
-            if 'tags' in self.cleaned_data:
-                instance.tags.clear()
-                
-                tag_string = self.cleaned_data['tags']
-                if tag_string:
-                    tag_list = [tag.strip() for tag in tag_string.split(',') if tag.strip()]
-                    instance.tags.add(*tag_list)
-        
-        return instance
+        # Фотография и её теги сохраняются вместе или не сохраняются вовсе
+        with transaction.atomic():
+            return super().save(commit)
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        # Теги записываются разницей с текущими: неизменённые не трогаются
+        if 'tags' in self.cleaned_data:
+            set_photo_tags(self.instance, parse_tag_names(self.cleaned_data['tags']))
 
 class CategoryForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'photos/photo_card.html'
+SIDEBAR_TEMPLATE = 'photos/photo_sidebar.html'
+# Ключ включает версию фотографии, так что устаревшие фрагменты не читаются,
+# а просто вытесняются; срок лишь ограничивает память кэша
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+
+def fragment_key(name, photo):
+    return f'photos:{name}:{photo.pk}:{photo.cache_version}'
+
+
+def render_photo_cards(photos):
+    """
+    Проставляет photo.card_html всем фотографиям страницы.
+
+    Готовые карточки читаются из кэша одним get_many. Только для
+    отсутствующих теги и авторы догружаются двумя запросами и шаблон
+    рендерится заново, поэтому неизменившиеся карточки не стоят ни
+    запросов к БД, ни работы шаблонизатора. Карточка не зависит от
+    пользователя и одна и та же на всех страницах со списками.
+    """
+    photos = list(photos)
+    keys = {photo.pk: fragment_key('card', photo) for photo in photos}
+    cached = cache.get_many(keys.values())
+
+    missing = [photo for photo in photos if keys[photo.pk] not in cached]
+    if missing:
+        prefetch_related_objects(missing, 'uploaded_by', Prefetch('tags', to_attr='tag_list'))
+        rendered = {}
+        for photo in missing:
+            html = render_to_string(CARD_TEMPLATE, {'photo': photo})
+            cached[keys[photo.pk]] = rendered[keys[photo.pk]] = html
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+
+    for photo in photos:
+        photo.card_html = mark_safe(cached[keys[photo.pk]])
+    return photos
+
+
+def render_photo_sidebar(photo):
+    """Описание, теги и категория на странице фотографии"""
+    key = fragment_key('sidebar', photo)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(SIDEBAR_TEMPLATE, {
+            'photo': photo,
+            'tags': list(photo.tags.all()),
+        })
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    return mark_safe(html)
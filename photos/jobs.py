@@ -0,0 +1,136 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Photo, ProcessingJob, ProcessingStatus
+from .pagecache import purge_photo_pages
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# Задачи в статусе "выполняется" дольше этого времени считаются брошенными
+STALE_AFTER = timedelta(minutes=10)
+# Пауза перед повтором упавшей задачи, удваивается с каждой попыткой
+RETRY_DELAY = timedelta(seconds=30)
+
+
+def process_renditions(photo):
+    photo.generate_renditions()
+    if not photo.has_renditions:
+        raise RuntimeError(f'Не удалось создать миниатюры для {photo.image.name}')
+
+
+def process_similarity(photo):
+    if photo.image_file_id:
+        photo.image_file.detect_similar()
+
+
+TASKS = {
+    ProcessingJob.RENDITIONS: process_renditions,
+    ProcessingJob.SIMILARITY: process_similarity,
+}
+
+
+def claim_jobs(limit):
+    """
+    Атомарно забирает до limit задач из очереди.
+
+    UPDATE с условием status=pending гарантирует, что одну задачу не
+    заберут два воркера: каждый получает только строки, помеченные его
+    собственным токеном.
+    """
+    token = uuid.uuid4().hex
+    pending_ids = list(
+        ProcessingJob.objects.filter(
+            status=ProcessingJob.PENDING,
+            run_after__lte=timezone.now()).values_list('pk', flat=True)[:limit])
+    if not pending_ids:
+        return []
+
+    ProcessingJob.objects.filter(
+        pk__in=pending_ids, status=ProcessingJob.PENDING).update(
+            status=ProcessingJob.RUNNING,
+            locked_by=token,
+            started_at=timezone.now())
+    return list(
+        ProcessingJob.objects.filter(locked_by=token,
+                                     status=ProcessingJob.RUNNING).values_list(
+                                         'pk', flat=True))
+
+
+def requeue_stale_jobs():
+    """Возвращает в очередь задачи, брошенные упавшим воркером"""
+    return ProcessingJob.objects.filter(
+        status=ProcessingJob.RUNNING,
+        started_at__lt=timezone.now() - STALE_AFTER).update(
+            status=ProcessingJob.PENDING, locked_by='')
+
+
+def run_job(job_id):
+    """Выполняет одну задачу"""
+    try:
+        job = ProcessingJob.objects.select_related('photo').get(pk=job_id)
+    except ProcessingJob.DoesNotExist:
+        # Фотографию удалили вместе с задачей, пока она ждала выполнения
+        return False
+    photo = job.photo
+    Photo.objects.filter(pk=photo.pk).update(
+        processing_status=ProcessingStatus.PROCESSING,
+        cache_version=F('cache_version') + 1)
+    purge_photo_pages()
+
+    try:
+        TASKS[job.task](photo)
+    except Exception as e:
+        logger.warning('Задача #%s (%s) завершилась ошибкой: %s', job.pk,
+                       job.task, e)
+        attempts = job.attempts + 1
+        failed = attempts >= MAX_ATTEMPTS
+        now = timezone.now()
+        with transaction.atomic():
+            ProcessingJob.objects.filter(pk=job.pk).update(
+                status=ProcessingJob.FAILED if failed else ProcessingJob.PENDING,
+                attempts=attempts,
+                run_after=now + RETRY_DELAY * 2**(attempts - 1),
+                locked_by='',
+                last_error=str(e),
+                finished_at=now if failed else None)
+            Photo.objects.filter(pk=photo.pk).update(
+                processing_status=ProcessingStatus.FAILED
+                if failed else ProcessingStatus.PENDING,
+                cache_version=F('cache_version') + 1)
+        purge_photo_pages()
+        return False
+
+    with transaction.atomic():
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status=ProcessingJob.DONE,
+            attempts=job.attempts + 1,
+            locked_by='',
+            last_error='',
+            finished_at=timezone.now())
+        # Фото считается готовым, когда по нему не осталось незавершённых задач
+        if not ProcessingJob.objects.filter(
+                photo=photo,
+                status__in=[ProcessingJob.PENDING, ProcessingJob.RUNNING
+                            ]).exists():
+            Photo.objects.filter(pk=photo.pk).update(
+                processing_status=ProcessingStatus.READY,
+                cache_version=F('cache_version') + 1)
+    purge_photo_pages()
+    return True
+
+
+def run_job_in_pool(job_id):
+    """Точка входа для процессов пула: закрывает устаревшие соединения с БД"""
+    close_old_connections()
+    return run_job(job_id)
+
+
+def run_pending_jobs(limit=100):
+    """Выполняет ожидающие задачи в текущем процессе"""
+    return [run_job(job_id) for job_id in claim_jobs(limit)]
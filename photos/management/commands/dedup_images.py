@@ -0,0 +1,50 @@
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.core.management.base import BaseCommand
+from photos.dedup import content_hash, perceptual_hash
+from photos.models import ImageFile, Photo
+from photos.pagecache import purge_photo_pages
+
+
+class Command(BaseCommand):
+    help = 'Учёт ссылок на файлы для фотографий, загруженных до дедупликации'
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.filter(image_file__isnull=True).exclude(image='')
+
+        registered = merged = missing = 0
+        for photo in photos.only('pk', 'image').iterator():
+            name = photo.image.name
+            if not default_storage.exists(name):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'  ⚠ Файл не найден: {name}'))
+                continue
+
+            with default_storage.open(name, 'rb') as f:
+                sha256 = content_hash(f)
+                image_file = ImageFile.objects.filter(sha256=sha256).first()
+                if image_file is None:
+                    phash = perceptual_hash(f)
+                    image_file = ImageFile.objects.create(
+                        name=name, sha256=sha256, perceptual_hash=phash,
+                        similar_to_id=ImageFile.find_similar(phash))
+                    registered += 1
+
+            updates = {'image_file': image_file,
+                       'cache_version': F('cache_version') + 1}
+            if image_file.name != name:
+                # Такое же содержимое уже хранится под другим именем
+                updates['image'] = image_file.name
+                updates['has_renditions'] = image_file.photos.filter(
+                    has_renditions=True).exists()
+                merged += 1
+            Photo.objects.filter(pk=photo.pk).update(**updates)
+            ImageFile.objects.filter(pk=image_file.pk).update(
+                ref_count=F('ref_count') + 1)
+            if image_file.name != name:
+                ImageFile.release(None, name)
+
+        purge_photo_pages()
+        self.stdout.write(self.style.SUCCESS(
+            f'Новых файлов: {registered}, объединено дубликатов: {merged}, '
+            f'не найдено: {missing}'))
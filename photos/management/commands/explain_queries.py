@@ -0,0 +1,116 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from photos.models import Comment, Photo, PhotoCategory, PhotoLike
+from photos.pagination import keyset_filter
+
+SEED_BATCH = 10000
+
+
+@contextmanager
+def manual_uploaded_at():
+    """bulk_create не должен затирать заданные даты загрузки (auto_now_add)"""
+    field = Photo._meta.get_field('uploaded_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Планы (EXPLAIN) и время горячих запросов к фотографиям. '
+            'С --seed сначала заполняет БД синтетическими данными - '
+            'только для отдельной тестовой базы!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Добавить столько синтетических фотографий')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Сколько раз выполнять каждый запрос (берётся лучшее время)')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+
+        photo = Photo.objects.order_by('?').only('pk', 'uploaded_at', 'category_type').first()
+        if photo is None:
+            raise CommandError('В базе нет фотографий, используйте --seed')
+        user = User.objects.filter(photo__isnull=False).first()
+        latest_year = Photo.objects.latest('uploaded_at').uploaded_at.year
+        listing = Photo.objects.only('pk', 'title', 'uploaded_at')
+
+        queries = {
+            'Лента, первая страница': listing.order_by('-uploaded_at', '-id')[:7],
+            'Лента, курсор в середине': listing.filter(
+                keyset_filter((photo.uploaded_at, photo.pk))).order_by(
+                    '-uploaded_at', '-id')[:7],
+            'Категория': listing.filter(category_type=photo.category_type).order_by(
+                '-uploaded_at', '-id')[:7],
+            'Предыдущее фото в категории': listing.filter(
+                category_type=photo.category_type,
+                uploaded_at__lt=photo.uploaded_at).order_by('-uploaded_at')[:1],
+            'Фото за год': listing.filter(uploaded_at__year=latest_year).order_by(
+                '-uploaded_at')[:7],
+            'Профиль': listing.filter(uploaded_by=user).order_by('-uploaded_at')[:6],
+            'Комментарии к фото': Comment.objects.filter(
+                photo=photo, parent=None).order_by('-created_at')[:20],
+            'Лайки фото': PhotoLike.objects.filter(photo=photo, value=1).values('pk'),
+        }
+
+        for title, queryset in queries.items():
+            best = min(self.timed(queryset) for _ in range(options['repeat']))
+            self.stdout.write(self.style.SUCCESS(f'\n{title}: {best * 1000:.2f} мс'))
+            self.stdout.write(queryset.explain())
+
+    def timed(self, queryset):
+        start = time.perf_counter()
+        list(queryset._chain())
+        return time.perf_counter() - start
+
+    def seed(self, count):
+        users = [
+            User.objects.get_or_create(username=f'seed_user_{i}')[0]
+            for i in range(50)
+        ]
+        categories = [name for name, _ in PhotoCategory.choices()]
+        now = timezone.now()
+        offset = Photo.objects.count()
+
+        with manual_uploaded_at():
+            for start in range(0, count, SEED_BATCH):
+                batch = []
+                for i in range(start, min(start + SEED_BATCH, count)):
+                    n = offset + i
+                    batch.append(Photo(
+                        title=f'Синтетическое фото {n}',
+                        slug=f'seed-{n}',
+                        image=f'photos/seed-{n}.jpg',
+                        description='Синтетические данные для замеров',
+                        category_type=random.choice(categories),
+                        uploaded_by=random.choice(users + [None]),
+                        uploaded_at=now - timedelta(seconds=random.randint(0, 5 * 365 * 86400))))
+                with transaction.atomic():
+                    Photo.objects.bulk_create(batch)
+                self.stdout.write(f'  добавлено {min(start + SEED_BATCH, count)} из {count}')
+
+        # Комментарии и реакции для нескольких случайных фото
+        photo_ids = list(Photo.objects.order_by('?').values_list('pk', flat=True)[:1000])
+        with transaction.atomic():
+            Comment.objects.bulk_create(
+                Comment(photo_id=pk, user=random.choice(users), text='Комментарий')
+                for pk in photo_ids for _ in range(5))
+            PhotoLike.objects.bulk_create(
+                (PhotoLike(photo_id=pk, user=user, value=random.choice([1, -1]))
+                 for pk in photo_ids for user in random.sample(users, 10)),
+                ignore_conflicts=True)
+        # Свежая статистика для планировщика (SQLite и PostgreSQL)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f'Добавлено фотографий: {count}'))
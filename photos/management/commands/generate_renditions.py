@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from photos.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Создание миниатюр для фотографий, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать миниатюры для всех фотографий')
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.exclude(image='')
+        if not options['all']:
+            photos = photos.filter(has_renditions=False)
+
+        created = failed = 0
+        for photo in photos.only('pk', 'image', 'has_renditions').iterator():
+            photo.generate_renditions()
+            if photo.has_renditions:
+                created += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'  ⚠ Не удалось обработать: {photo.image.name}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано фотографий: {created}, ошибок: {failed}'))
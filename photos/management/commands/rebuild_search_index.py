@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from photos.search import get_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Полная перестройка полнотекстового индекса фотографий'
+
+    def handle(self, *args, **options):
+        if get_search_index() is None:
+            self.stdout.write(self.style.WARNING(
+                'Полнотекстовый поиск для этой базы данных не поддерживается'))
+            return
+        start = time.perf_counter()
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано фотографий: {count} за {time.perf_counter() - start:.1f} с'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from photos.models import PhotoStat
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт сводных счётчиков статистики фотографий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dimension', action='append',
+                            choices=[choice for choice, _ in PhotoStat.DIMENSION_CHOICES],
+                            help='Пересчитать только указанный разрез (можно несколько)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчитываем статистику...')
+        rows = PhotoStat.rebuild(options['dimension'])
+        self.stdout.write(self.style.SUCCESS(f'Записано счётчиков: {rows}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from photos.models import TagUsage
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков использования тегов и весов облака тегов'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчитываем счётчики тегов...')
+        rows = TagUsage.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Записано счётчиков: {rows}'))
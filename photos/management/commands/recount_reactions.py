@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from photos.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт сохранённых счётчиков лайков/дизлайков у фотографий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Размер пачки для bulk_update')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчитываем реакции...')
+
+        photos = Photo.objects.annotate(
+            real_likes=Count('likes', filter=Q(likes__value=1)),
+            real_dislikes=Count('likes', filter=Q(likes__value=-1)),
+            real_score=Sum('likes__value'),
+        ).only('id', 'likes_count', 'dislikes_count', 'score')
+
+        changed = []
+        for photo in photos.iterator():
+            real_score = photo.real_score or 0
+            if (photo.likes_count, photo.dislikes_count, photo.score) == (
+                    photo.real_likes, photo.real_dislikes, real_score):
+                continue
+
+            photo.likes_count = photo.real_likes
+            photo.dislikes_count = photo.real_dislikes
+            photo.score = real_score
+            changed.append(photo)
+
+        with transaction.atomic():
+            Photo.objects.bulk_update(
+                changed, ['likes_count', 'dislikes_count', 'score'],
+                batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено фотографий: {len(changed)}'))
@@ -0,0 +1,72 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from photos.jobs import STALE_AFTER, claim_jobs, requeue_stale_jobs, run_job_in_pool, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер обработки фотографий (очередь задач в БД)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Количество процессов в пуле (0 - выполнять в текущем процессе)')
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Сколько задач забирать из очереди за раз')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Пауза между опросами пустой очереди, сек')
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать текущую очередь и завершиться')
+
+    def handle(self, *args, **options):
+        self.requeued_at = None
+        if options['processes'] == 0:
+            self.run_inline(options)
+            return
+
+        # Процессы пула запускаются через spawn, а не fork: пул создаёт их
+        # лениво, уже после того как родитель открыл соединение с БД, и при
+        # fork они унаследовали бы его сокет. Каждый процесс заново
+        # настраивает Django и открывает собственное соединение.
+        pool = ProcessPoolExecutor(max_workers=options['processes'],
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=django.setup)
+        with pool:
+            self.stdout.write(f'Воркер запущен, процессов: {options["processes"]}')
+            while True:
+                self.requeue_stale()
+                job_ids = claim_jobs(options['batch_size'])
+                if job_ids:
+                    results = list(pool.map(run_job_in_pool, job_ids))
+                    self.report(results)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+    def run_inline(self, options):
+        while True:
+            self.requeue_stale()
+            results = run_pending_jobs(options['batch_size'])
+            if results:
+                self.report(results)
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+    def requeue_stale(self):
+        """Периодически возвращает в очередь задачи упавших воркеров"""
+        now = time.monotonic()
+        if self.requeued_at is not None and now - self.requeued_at < STALE_AFTER.total_seconds() / 2:
+            return
+        self.requeued_at = now
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших задач: {requeued}'))
+
+    def report(self, results):
+        done = sum(results)
+        self.stdout.write(f'Выполнено задач: {done}, с ошибкой: {len(results) - done}')
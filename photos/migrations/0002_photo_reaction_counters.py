@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_reaction_counters(apps, schema_editor):
+    Photo = apps.get_model('photos', 'Photo')
+    photos = Photo.objects.annotate(
+        real_likes=Count('likes', filter=Q(likes__value=1)),
+        real_dislikes=Count('likes', filter=Q(likes__value=-1)),
+        real_score=Sum('likes__value'),
+    )
+    for photo in photos:
+        photo.likes_count = photo.real_likes
+        photo.dislikes_count = photo.real_dislikes
+        photo.score = photo.real_score or 0
+        photo.save(update_fields=['likes_count', 'dislikes_count', 'score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Дизлайки'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Лайки'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='score',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Рейтинг'),
+        ),
+        migrations.RunPython(fill_reaction_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:11
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+
+def fill_photo_stats(apps, schema_editor):
+    Photo = apps.get_model('photos', 'Photo')
+    PhotoStat = apps.get_model('photos', 'PhotoStat')
+    sources = {
+        'category': Photo.objects.values_list('category_type'),
+        'year': Photo.objects.annotate(
+            year=ExtractYear('uploaded_at')).values_list('year'),
+        'uploader': Photo.objects.filter(
+            uploaded_by__isnull=False).values_list('uploaded_by'),
+    }
+    PhotoStat.objects.bulk_create([
+        PhotoStat(dimension=dimension, key=str(key), photo_count=total)
+        for dimension, source in sources.items()
+        for key, total in source.annotate(total=Count('pk')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0002_photo_reaction_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('category', 'Категория'), ('year', 'Год'), ('uploader', 'Автор')], max_length=20, verbose_name='Разрез')),
+                ('key', models.CharField(max_length=50, verbose_name='Значение')),
+                ('photo_count', models.PositiveIntegerField(default=0, verbose_name='Количество фотографий')),
+            ],
+            options={
+                'verbose_name': 'Счётчик фотографий',
+                'verbose_name_plural': 'Счётчики фотографий',
+                'unique_together': {('dimension', 'key')},
+            },
+        ),
+        migrations.RunPython(fill_photo_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0003_photostat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='has_renditions',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры созданы'),
+        ),
+    ]
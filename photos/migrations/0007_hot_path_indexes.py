@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0006_image_files'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['photo', 'parent', 'created_at'], name='comment_photo_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['uploaded_at', 'id'], name='photo_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['category_type', 'uploaded_at', 'id'], name='photo_category_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(condition=models.Q(('uploaded_by__isnull', False)), fields=['uploaded_by', 'uploaded_at'], name='photo_uploader_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photolike',
+            index=models.Index(fields=['photo', 'value'], name='photolike_photo_value_idx'),
+        ),
+    ]
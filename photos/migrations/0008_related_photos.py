@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:28
+
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия photos.related.top_related на момент создания миграции
+TOP_K = 10
+
+
+def top_related(pairs, k=TOP_K):
+    photo_tags = defaultdict(set)
+    postings = defaultdict(list)
+    for photo_id, tag_id in pairs:
+        photo_tags[photo_id].add(tag_id)
+        postings[tag_id].append(photo_id)
+
+    total = len(photo_tags)
+    weights = {tag_id: math.log(1 + total / len(ids)) for tag_id, ids in postings.items()}
+    norms = {pk: sum(weights[t] for t in tags) for pk, tags in photo_tags.items()}
+
+    rows = []
+    for pk, tags in photo_tags.items():
+        shared = defaultdict(float)
+        for tag_id in tags:
+            weight = weights[tag_id]
+            for other in postings[tag_id]:
+                if other != pk:
+                    shared[other] += weight
+        scores = ((value / (norms[pk] + norms[other] - value), other)
+                  for other, value in shared.items())
+        rows.extend((pk, other, score) for score, other in heapq.nlargest(
+            k, ((score, other) for score, other in scores if score > 0)))
+    return rows
+
+
+def fill_related_photos(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    Photo = apps.get_model('photos', 'Photo')
+    RelatedPhoto = apps.get_model('photos', 'RelatedPhoto')
+    content_type = ContentType.objects.filter(app_label='photos', model='photo').first()
+    if content_type is None:
+        return
+    pairs = TaggedItem.objects.filter(
+        content_type=content_type,
+        object_id__in=Photo.objects.values('pk')).values_list('object_id', 'tag_id')
+    RelatedPhoto.objects.bulk_create(
+        (RelatedPhoto(photo_id=pk, related_id=other, score=score)
+         for pk, other, score in top_related(pairs.iterator())),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('photos', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='photos.photo', verbose_name='Фотография')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='photos.photo', verbose_name='Похожая фотография')),
+            ],
+            options={
+                'verbose_name': 'Похожая фотография',
+                'verbose_name_plural': 'Похожие фотографии',
+                'indexes': [models.Index(fields=['photo', '-score'], name='related_photo_score_idx')],
+                'unique_together': {('photo', 'related')},
+            },
+        ),
+        migrations.RunPython(fill_related_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comments_count(apps, schema_editor):
+    Photo = apps.get_model('photos', 'Photo')
+    Comment = apps.get_model('photos', 'Comment')
+    comments = Comment.objects.filter(photo=OuterRef('pk')).order_by().values('photo')
+    Photo.objects.update(comments_count=Coalesce(Subquery(
+        comments.annotate(c=Count('pk')).values('c'),
+        output_field=models.IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0008_related_photos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментарии'),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
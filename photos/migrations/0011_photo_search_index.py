@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Схема индекса на момент создания миграции; photos.search не импортируется,
+# чтобы его дальнейшие изменения не ломали применение миграций.
+# Миграция только создаёт таблицу: существующие фотографии индексирует
+# команда rebuild_search_index, новые - сигналы.
+CREATE_INDEX = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE photos_search USING fts5("
+        "title, tags, description, uploader, tokenize='unicode61')",
+    ],
+    'postgresql': [
+        'CREATE TABLE photos_search ('
+        'photo_id bigint PRIMARY KEY REFERENCES photos_photo (id) ON DELETE CASCADE, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX photos_search_document_idx ON photos_search USING GIN (document)',
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    for sql in CREATE_INDEX.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX:
+        schema_editor.execute('DROP TABLE IF EXISTS photos_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0010_photo_cache_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
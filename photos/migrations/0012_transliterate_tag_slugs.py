@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+# Копия транслитерации из photos.tagging на момент создания миграции
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia',
+}
+
+
+def tag_slug(name):
+    transliterated = ''.join(TRANSLIT.get(ch, ch) for ch in name.lower())
+    return slugify(transliterated) or slugify(name, allow_unicode=True)
+
+
+def unique_slug(base, taken):
+    slug, i = base, 1
+    while slug in taken:
+        slug = f'{base}_{i}'
+        i += 1
+    return slug
+
+
+def transliterate_tag_slugs(apps, schema_editor):
+    """Юникодные слаги существующих тегов заменяются латинскими"""
+    Tag = apps.get_model('taggit', 'Tag')
+    taken = set(Tag.objects.values_list('slug', flat=True))
+    for tag in Tag.objects.order_by('pk'):
+        if tag.slug.isascii():
+            continue
+        slug = unique_slug(tag_slug(tag.name)[:90], taken)
+        if slug.isascii():
+            taken.discard(tag.slug)
+            taken.add(slug)
+            Tag.objects.filter(pk=tag.pk).update(slug=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0005_auto_20220424_2025'),
+        ('photos', '0011_photo_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(transliterate_tag_slugs, migrations.RunPython.noop),
+    ]
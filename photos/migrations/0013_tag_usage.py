@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:49
+
+import math
+from bisect import bisect_right
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+# Копия TagUsage.weight_thresholds на момент создания миграции
+WEIGHT_BUCKETS = 5
+
+
+def weight_thresholds(max_count):
+    if max_count <= 1:
+        return [1] * WEIGHT_BUCKETS if max_count else []
+    return [math.ceil(max_count ** (bucket / (WEIGHT_BUCKETS - 1)) - 1e-9)
+            for bucket in range(WEIGHT_BUCKETS)]
+
+
+def fill_tag_usage(apps, schema_editor):
+    Tag = apps.get_model('taggit', 'Tag')
+    TagUsage = apps.get_model('photos', 'TagUsage')
+    counts = list(Tag.objects.annotate(
+        total=Count('taggit_taggeditem_items')).values_list('pk', 'total'))
+    thresholds = weight_thresholds(max((total for _, total in counts), default=0))
+    TagUsage.objects.bulk_create(
+        (TagUsage(tag_id=pk, photo_count=total, weight=bisect_right(thresholds, total))
+         for pk, total in counts),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0005_auto_20220424_2025'),
+        ('photos', '0012_transliterate_tag_slugs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='taggit.tag', verbose_name='Тег')),
+                ('photo_count', models.PositiveIntegerField(default=0, verbose_name='Количество фотографий')),
+                ('weight', models.PositiveSmallIntegerField(default=0, verbose_name='Вес в облаке тегов')),
+            ],
+            options={
+                'verbose_name': 'Использование тега',
+                'verbose_name_plural': 'Использование тегов',
+                'indexes': [models.Index(fields=['-photo_count', 'tag'], name='tag_usage_count_idx')],
+            },
+        ),
+        migrations.RunPython(fill_tag_usage, migrations.RunPython.noop),
+    ]
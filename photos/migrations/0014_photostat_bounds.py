@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:14
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def fill_upload_bounds(apps, schema_editor):
+    Photo = apps.get_model('photos', 'Photo')
+    PhotoStat = apps.get_model('photos', 'PhotoStat')
+    bounds = Photo.objects.values_list('category_type').annotate(
+        first=Min('uploaded_at'), last=Max('uploaded_at')).order_by()
+    for category_type, first, last in bounds:
+        PhotoStat.objects.filter(dimension='category', key=category_type).update(
+            first_uploaded_at=first, last_uploaded_at=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0013_tag_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photostat',
+            name='first_uploaded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Первая загрузка'),
+        ),
+        migrations.AddField(
+            model_name='photostat',
+            name='last_uploaded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя загрузка'),
+        ),
+        migrations.AddIndex(
+            model_name='photostat',
+            index=models.Index(fields=['dimension', '-photo_count'], name='photostat_top_idx'),
+        ),
+        migrations.RunPython(fill_upload_bounds, migrations.RunPython.noop),
+    ]
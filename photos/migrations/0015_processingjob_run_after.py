@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0014_photostat_bounds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='run_after',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+HASH_BANDS = 8
+
+
+def fill_hash_bands(apps, schema_editor):
+    ImageFile = apps.get_model('photos', 'ImageFile')
+    ImageHashBand = apps.get_model('photos', 'ImageHashBand')
+    hashes = ImageFile.objects.exclude(perceptual_hash='').values_list('pk', 'perceptual_hash')
+    for pk, phash in hashes.iterator():
+        width = len(phash) // HASH_BANDS
+        ImageHashBand.objects.bulk_create([
+            ImageHashBand(image_file_id=pk, band=band, value=phash[band * width:(band + 1) * width])
+            for band in range(HASH_BANDS)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0015_processingjob_run_after'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingjob',
+            name='task',
+            field=models.CharField(choices=[('renditions', 'Создание миниатюр'), ('similarity', 'Поиск похожих изображений')], max_length=30, verbose_name='Задача'),
+        ),
+        migrations.CreateModel(
+            name='ImageHashBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Номер полосы')),
+                ('value', models.CharField(max_length=4, verbose_name='Значение')),
+                ('image_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hash_bands', to='photos.imagefile', verbose_name='Файл изображения')),
+            ],
+            options={
+                'verbose_name': 'Полоса перцептивного хэша',
+                'verbose_name_plural': 'Полосы перцептивных хэшей',
+                'indexes': [models.Index(fields=['band', 'value'], name='imagehashband_lookup_idx')],
+                'unique_together': {('image_file', 'band')},
+            },
+        ),
+        migrations.RunPython(fill_hash_bands, migrations.RunPython.noop),
+    ]
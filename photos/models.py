@@ -1,9 +1,17 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from enum import Enum
-from django.db.models import Count, Q
+from django.db.models import (Case, Count, Q, Sum, F, Max, Min, OuterRef, Subquery, Prefetch,
+                              When)
+from django.db.models.functions import Coalesce, ExtractYear
+from django.utils import timezone
+from django.core.files.storage import default_storage
 from taggit.managers import TaggableManager # type: ignore
+from .renditions import generate_renditions, delete_renditions, rendition_name
+from .pagination import keyset_filter
+from .dedup import SIMILARITY_THRESHOLD, content_hash, hamming_distance, hash_bands, perceptual_hash
+import math
 import uuid
 import os
 
@@ -27,20 +35,96 @@ class PhotoCategory(Enum):
         return [(item.name, item.value) for item in cls]
 
 
+class ProcessingStatus(models.TextChoices):
+    PENDING = 'pending', 'В очереди'
+    PROCESSING = 'processing', 'Обрабатывается'
+    READY = 'ready', 'Готово'
+    FAILED = 'failed', 'Ошибка обработки'
+
+
+# Соседи фотографии: (название, в сторону более старых, внутри категории)
+NEIGHBOURS = [
+    ('previous', True, False),
+    ('next', False, False),
+    ('previous_in_category', True, True),
+    ('next_in_category', False, True),
+]
+NEIGHBOUR_FIELDS = ('pk', 'slug', 'title')
+
+
+def neighbour_label(photo):
+    """Заголовок и слаг, которые соседние страницы показывают в навигации"""
+    return photo.__dict__.get('title'), photo.__dict__.get('slug')
+
+
+# Поля, нужные шаблону карточки (photo_card.html), ключу её фрагмента
+# (cache_version) и страницам со списками
+CARD_FIELDS = ('slug', 'title', 'image', 'has_renditions', 'category_type',
+               'processing_status', 'uploaded_at', 'uploaded_by', 'cache_version')
+
+
 class PhotoManager(models.Manager):
 
+    def for_listing(self):
+        """
+        Фотографии для карточек в списках: автор подтягивается JOIN-ом,
+        теги одним запросом загружаются в photo.tag_list,
+        а их количество аннотируется в tags_count.
+        """
+        return self.select_related('uploaded_by').prefetch_related(
+            Prefetch('tags', to_attr='tag_list')).annotate(
+                tags_count=Count('tags', distinct=True))
+
+    def for_cards(self):
+        """
+        Фотографии для страниц с карточками: только поля CARD_FIELDS,
+        без описания и служебных полей. Теги и авторы не подгружаются:
+        готовые карточки берутся из кэша, а для остальных их догружает
+        fragments.render_photo_cards.
+        """
+        return self.only(*CARD_FIELDS)
+
+    def with_neighbours(self):
+        """
+        Аннотирует соседей в порядке (uploaded_at, id) - в общей ленте и
+        внутри категории - полями <сосед>_pk, _slug и _title. Каждый сосед -
+        коррелированный подзапрос с поиском по индексам (uploaded_at, id)
+        и (category_type, uploaded_at, id), так что всё считается одним
+        запросом без сканирования таблицы.
+        """
+        position = (OuterRef('uploaded_at'), OuterRef('pk'))
+        annotations = {}
+        for name, older, same_category in NEIGHBOURS:
+            candidates = Photo.objects.filter(keyset_filter(position, descending=older))
+            if same_category:
+                candidates = candidates.filter(category_type=OuterRef('category_type'))
+            candidates = candidates.order_by(
+                *(['-uploaded_at', '-id'] if older else ['uploaded_at', 'id']))
+            for field in NEIGHBOUR_FIELDS:
+                annotations[f'{name}_{field}'] = Subquery(candidates.values(field)[:1])
+        return self.annotate(**annotations)
+
     def get_by_category(self, category_type):
         return self.filter(category_type=category_type)
 
     def get_recent(self, count=5):
-        return self.order_by('-uploaded_at')[:count]
+        return self.for_listing().order_by('-uploaded_at')[:count]
 
     def get_by_user(self, user):
         return self.filter(uploaded_by=user)
 
     def get_popular_tags(self, limit=10):
-        from django.db.models import Count
-        return Photo.tags.most_common()[:limit]
+        """
+        Самые используемые теги по счётчикам TagUsage (индекс по photo_count).
+        Как и у most_common() taggit, число фотографий - в tag.num_times.
+        """
+        tags = []
+        for usage in TagUsage.objects.select_related('tag').filter(
+                photo_count__gt=0).order_by('-photo_count', 'tag')[:limit]:
+            usage.tag.num_times = usage.photo_count
+            usage.tag.weight = usage.weight
+            tags.append(usage.tag)
+        return tags
 
     def get_photos_with_tags_count(self):
         return self.annotate(tags_count=Count('tags'))
@@ -88,6 +172,37 @@ class Photo(models.Model):
                                      default=PhotoCategory.OTHER.name,
                                      verbose_name="Тип категории")
     tags = TaggableManager(blank=True, verbose_name="Теги")
+    likes_count = models.PositiveIntegerField(default=0,
+                                              editable=False,
+                                              verbose_name="Лайки")
+    dislikes_count = models.PositiveIntegerField(default=0,
+                                                 editable=False,
+                                                 verbose_name="Дизлайки")
+    score = models.IntegerField(default=0,
+                                editable=False,
+                                verbose_name="Рейтинг")
+    comments_count = models.PositiveIntegerField(default=0,
+                                                 editable=False,
+                                                 verbose_name="Комментарии")
+    # Версия кэшированных фрагментов: карточки в списках и боковой панели
+    cache_version = models.PositiveIntegerField(default=1,
+                                                editable=False,
+                                                verbose_name="Версия кэша")
+    has_renditions = models.BooleanField(default=False,
+                                         editable=False,
+                                         verbose_name="Миниатюры созданы")
+    processing_status = models.CharField(max_length=20,
+                                         choices=ProcessingStatus.choices,
+                                         default=ProcessingStatus.READY,
+                                         editable=False,
+                                         verbose_name="Статус обработки")
+    image_file = models.ForeignKey('ImageFile',
+                                   on_delete=models.SET_NULL,
+                                   null=True,
+                                   blank=True,
+                                   editable=False,
+                                   related_name='photos',
+                                   verbose_name="Файл изображения")
 
     objects = models.Manager()
     custom = PhotoManager()
@@ -106,35 +221,113 @@ class Photo(models.Model):
 
             self.slug = slug
 
+        old_image_name = getattr(self, '_loaded_image_name', None)
+        old_image_file_id = getattr(self, '_loaded_image_file_id', None)
+
+        # Новый файл с уже известным содержимым не записываем повторно,
+        # а ссылаемся на сохранённый
+        new_hash = None
+        duplicate = None
+        if self.image and not self.image._committed:
+            new_hash = content_hash(self.image.file)
+            duplicate = ImageFile.objects.filter(sha256=new_hash).first()
+            if duplicate is not None:
+                self.image = duplicate.name
+                new_hash = None
+
+        image_changed = self.image.name != old_image_name
+        if image_changed:
+            self.image_file = duplicate
+            self.has_renditions = False
+            if self.image:
+                self.processing_status = ProcessingStatus.PENDING
+            if duplicate is not None and duplicate.photos.filter(
+                    has_renditions=True).exists():
+                # Миниатюры общие для всех ссылок на файл
+                self.has_renditions = True
+                self.processing_status = ProcessingStatus.READY
+
         super().save(*args, **kwargs)
 
+        if image_changed:
+            if new_hash is not None:
+                self.image_file = ImageFile.register(self, new_hash)
+            if self.image_file_id:
+                ImageFile.objects.filter(pk=self.image_file_id).update(
+                    ref_count=F('ref_count') + 1)
+            ImageFile.release(old_image_file_id, old_image_name)
+            self._loaded_image_name = self.image.name
+            self._loaded_image_file_id = self.image_file_id
+            if self.image and not self.has_renditions:
+                # Обработка изображения выполняется воркером (run_worker)
+                ProcessingJob.objects.create(photo=self,
+                                             task=ProcessingJob.RENDITIONS)
+            if new_hash is not None:
+                # Для поиска похожих файлов изображение нужно декодировать,
+                # поэтому он тоже выполняется воркером
+                ProcessingJob.objects.create(photo=self,
+                                             task=ProcessingJob.SIMILARITY)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image_name = instance.__dict__.get('image')
+        instance._loaded_image_file_id = instance.__dict__.get('image_file_id')
+        instance._loaded_position = (instance.__dict__.get('uploaded_at'),
+                                     instance.__dict__.get('category_type'))
+        instance._loaded_label = neighbour_label(instance)
+        return instance
+
+    def generate_renditions(self):
+        """Создаёт миниатюры и отмечает это в модели"""
+        self.has_renditions = generate_renditions(self.image.name)
+        Photo.objects.filter(pk=self.pk).update(has_renditions=self.has_renditions,
+                                                cache_version=F('cache_version') + 1)
+
+    def get_rendition_url(self, size, webp=False):
+        """URL уменьшенной копии; пока её нет - URL оригинала"""
+        if not self.has_renditions:
+            return self.image.url
+        return default_storage.url(rendition_name(self.image.name, size, webp))
+
+    def find_neighbours(self):
+        """
+        Соседние фотографии одним запросом: словарь previous, next,
+        previous_in_category, next_in_category со значениями
+        {'pk', 'slug', 'title'} или None.
+        """
+        keys = [f'{name}_{field}' for name, _, _ in NEIGHBOURS for field in NEIGHBOUR_FIELDS]
+        row = Photo.custom.with_neighbours().filter(pk=self.pk).values(*keys).first() or {}
+        return {
+            name: {field: row[f'{name}_{field}'] for field in NEIGHBOUR_FIELDS}
+            if row.get(f'{name}_pk') else None
+            for name, _, _ in NEIGHBOURS
+        }
+
+    def _neighbour(self, older, same_category=False):
+        photos = Photo.objects.filter(
+            keyset_filter((self.uploaded_at, self.pk), descending=older))
+        if same_category:
+            photos = photos.filter(category_type=self.category_type)
+        return photos.order_by(
+            *(['-uploaded_at', '-id'] if older else ['uploaded_at', 'id'])).first()
+
     def get_previous_photo(self):
-        return Photo.objects.filter(
-            uploaded_at__lt=self.uploaded_at).order_by('-uploaded_at').first()
+        return self._neighbour(older=True)
 
     def get_next_photo(self):
-        return Photo.objects.filter(
-            uploaded_at__gt=self.uploaded_at).order_by('uploaded_at').first()
+        return self._neighbour(older=False)
 
     def get_previous_by_category(self):
-        return Photo.objects.filter(
-            category_type=self.category_type,
-            uploaded_at__lt=self.uploaded_at).order_by('-uploaded_at').first()
+        return self._neighbour(older=True, same_category=True)
 
     def get_next_by_category(self):
-        return Photo.objects.filter(
-            category_type=self.category_type,
-            uploaded_at__gt=self.uploaded_at).order_by('uploaded_at').first()
-
-    def get_related_photos(self):
-        if not self.tags.exists():
-            return Photo.objects.none()
+        return self._neighbour(older=False, same_category=True)
 
-        tag_list = self.tags.values_list('name', flat=True)
-        return Photo.objects.filter(tags__name__in=tag_list).exclude(
-            id=self.id).distinct().annotate(
-                common_tags=Count('tags', filter=Q(
-                    tags__name__in=tag_list))).order_by('-common_tags')[:5]
+    def get_related_photos(self, limit=5):
+        """Похожие фотографии из предрассчитанной таблицы RelatedPhoto"""
+        return Photo.objects.filter(related_from__photo=self).order_by(
+            '-related_from__score')[:limit]
 
     def get_uploader_display(self):
         """Возвращает имя загрузившего или 'Анонимный пользователь'"""
@@ -154,17 +347,85 @@ class Photo(models.Model):
     
     def get_likes_count(self):
         """Количество лайков"""
-        return self.likes.filter(value=1).count()
+        return self.likes_count
 
     def get_dislikes_count(self):
         """Количество дизлайков"""
-        return self.likes.filter(value=-1).count()
+        return self.dislikes_count
 
     def get_total_likes(self):
         """Общий рейтинг (лайки - дизлайки)"""
-        return self.likes.aggregate(
-            total=models.Sum('value')
-        )['total'] or 0
+        return self.score
+
+    def refresh_reaction_counters(self):
+        """
+        Пересчитывает счётчики реакций одним UPDATE по таблице PhotoLike.
+        Вызывается в транзакции, удерживающей блокировку строки фотографии
+        (toggle_reaction): иначе при READ COMMITTED два одновременных
+        пересчёта не видят незафиксированные оценки друг друга, и один
+        из них записывает устаревшие счётчики.
+        """
+        reactions = PhotoLike.objects.filter(
+            photo=OuterRef('pk')).order_by().values('photo')
+        Photo.objects.filter(pk=self.pk).update(
+            likes_count=Coalesce(Subquery(
+                reactions.filter(value=1).annotate(c=Count('pk')).values('c'),
+                output_field=models.IntegerField()), 0),
+            dislikes_count=Coalesce(Subquery(
+                reactions.filter(value=-1).annotate(c=Count('pk')).values('c'),
+                output_field=models.IntegerField()), 0),
+            score=Coalesce(Subquery(
+                reactions.annotate(s=Sum('value')).values('s'),
+                output_field=models.IntegerField()), 0),
+            cache_version=F('cache_version') + 1)
+        self.refresh_from_db(fields=['likes_count', 'dislikes_count', 'score', 'cache_version'])
+
+    @classmethod
+    def bump_cache_version(cls, **filters):
+        """Сбрасывает кэшированные фрагменты отобранных фотографий"""
+        cls.objects.filter(**filters).update(cache_version=F('cache_version') + 1)
+
+    @classmethod
+    def apply_comments_count(cls, photo_id, delta):
+        """
+        Атомарно изменяет счётчик комментариев (вместе с ответами) на delta.
+        В отличие от пересчёта подзапросом, одновременные комментарии
+        не теряются: UPDATE с F() применяется к актуальному значению.
+        """
+        photos = cls.objects.filter(pk=photo_id)
+        if delta < 0:
+            photos = photos.filter(comments_count__gte=-delta)
+        photos.update(comments_count=F('comments_count') + delta)
+
+    def toggle_reaction(self, user, value):
+        """
+        Ставит, меняет или снимает оценку пользователя.
+
+        Повторная оценка тем же значением удаляется одним DELETE, иначе
+        оценка записывается одним upsert (INSERT ... ON CONFLICT DO UPDATE),
+        поэтому одновременные клики не приводят к IntegrityError.
+        Возвращает итоговую реакцию пользователя или None.
+        """
+        with transaction.atomic():
+            # Оценки одной фотографии выполняются по очереди: следующая
+            # ждёт фиксации предыдущей и пересчитывает счётчики уже с ней
+            list(Photo.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            deleted, _ = PhotoLike.objects.filter(
+                user=user, photo=self, value=value).delete()
+            if deleted:
+                reaction = None
+            else:
+                PhotoLike.objects.bulk_create(
+                    [PhotoLike(user=user, photo=self, value=value)],
+                    update_conflicts=True,
+                    unique_fields=['user', 'photo'],
+                    update_fields=['value'])
+                reaction = value
+                # Upsert не отправляет post_save, кэш страницы сбрасываем сами
+                from .pagecache import purge_photo_page
+                purge_photo_page(self.pk, self.slug)
+            self.refresh_reaction_counters()
+        return reaction
 
     def user_reaction(self, user):
         """Получить реакцию пользователя на фото"""
@@ -182,6 +443,17 @@ class Photo(models.Model):
     class Meta:
         verbose_name = "Фотография"
         verbose_name_plural = "Фотографии"
+        indexes = [
+            # Лента, годы и курсорная пагинация: ORDER BY uploaded_at, id
+            models.Index(fields=['uploaded_at', 'id'], name='photo_uploaded_idx'),
+            # Страницы категорий и соседние фото в категории
+            models.Index(fields=['category_type', 'uploaded_at', 'id'],
+                         name='photo_category_uploaded_idx'),
+            # Фото в профиле; анонимные загрузки в индекс не попадают
+            models.Index(fields=['uploaded_by', 'uploaded_at'],
+                         name='photo_uploader_uploaded_idx',
+                         condition=Q(uploaded_by__isnull=False)),
+        ]
 
 
 class Comment(models.Model):
@@ -196,6 +468,11 @@ class Comment(models.Model):
         ordering = ['-created_at']
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            # Корневые комментарии (parent IS NULL) и ответы по порядку
+            models.Index(fields=['photo', 'parent', 'created_at'],
+                         name='comment_photo_parent_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.user.username} on {self.photo.title}'
@@ -219,7 +496,399 @@ class PhotoLike(models.Model):
         unique_together = ('user', 'photo')
         verbose_name = 'Лайк/Дизлайк'
         verbose_name_plural = 'Лайки/Дизлайки'
+        indexes = [
+            # Пересчёт счётчиков лайков/дизлайков фото
+            models.Index(fields=['photo', 'value'], name='photolike_photo_value_idx'),
+        ]
     
     def __str__(self):
         action = "лайкнул" if self.value == 1 else "дизлайкнул"
         return f'{self.user.username} {action} {self.photo.title}'
+
+
+class PhotoStat(models.Model):
+    """Предрассчитанные счётчики фотографий по категориям, годам и авторам"""
+    CATEGORY = 'category'
+    YEAR = 'year'
+    UPLOADER = 'uploader'
+    DIMENSION_CHOICES = [
+        (CATEGORY, 'Категория'),
+        (YEAR, 'Год'),
+        (UPLOADER, 'Автор'),
+    ]
+
+    dimension = models.CharField('Разрез', max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField('Значение', max_length=50)
+    photo_count = models.PositiveIntegerField('Количество фотографий', default=0)
+    # Даты первой и последней загрузки ведутся только в разрезе category:
+    # каждая фотография входит ровно в одну категорию, поэтому границы всей
+    # коллекции - минимум и максимум по этим строкам
+    first_uploaded_at = models.DateTimeField('Первая загрузка', null=True, blank=True)
+    last_uploaded_at = models.DateTimeField('Последняя загрузка', null=True, blank=True)
+
+    class Meta:
+        unique_together = ('dimension', 'key')
+        verbose_name = 'Счётчик фотографий'
+        verbose_name_plural = 'Счётчики фотографий'
+        indexes = [
+            # Самые активные авторы: ORDER BY photo_count DESC LIMIT N в разрезе
+            models.Index(fields=['dimension', '-photo_count'], name='photostat_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_dimension_display()} {self.key}: {self.photo_count}'
+
+    @classmethod
+    def keys_for(cls, photo):
+        """
+        Ключи счётчиков, к которым относится фотография.
+        Возвращает None, если нужные поля не загружены (deferred).
+        """
+        values = photo.__dict__
+        if not {'category_type', 'uploaded_at', 'uploaded_by_id'} <= values.keys():
+            return None
+
+        keys = [(cls.CATEGORY, values['category_type'])]
+        if values['uploaded_at']:
+            keys.append((cls.YEAR, str(timezone.localtime(values['uploaded_at']).year)))
+        if values['uploaded_by_id']:
+            keys.append((cls.UPLOADER, str(values['uploaded_by_id'])))
+        return keys
+
+    @classmethod
+    def apply(cls, keys, delta):
+        """Атомарно изменяет счётчики на delta"""
+        for dimension, key in keys:
+            if delta > 0:
+                cls.objects.bulk_create(
+                    [cls(dimension=dimension, key=key)], ignore_conflicts=True)
+                cls.objects.filter(dimension=dimension, key=key).update(
+                    photo_count=F('photo_count') + delta)
+            else:
+                cls.objects.filter(
+                    dimension=dimension, key=key,
+                    photo_count__gte=-delta).update(
+                        photo_count=F('photo_count') + delta)
+
+    @classmethod
+    def refresh_bounds(cls, categories):
+        """
+        Даты первой и последней загрузки категорий одним UPDATE; подзапросы
+        с LIMIT 1 читают края индекса photo_category_uploaded_idx
+        """
+        photos = Photo.objects.filter(category_type=OuterRef('key'))
+        cls.objects.filter(dimension=cls.CATEGORY, key__in=list(categories)).update(
+            first_uploaded_at=Subquery(photos.order_by('uploaded_at').values('uploaded_at')[:1]),
+            last_uploaded_at=Subquery(photos.order_by('-uploaded_at').values('uploaded_at')[:1]))
+
+    @classmethod
+    def upload_bounds(cls, rows):
+        """(первая, последняя) загрузка по строкам разреза category"""
+        firsts = [row.first_uploaded_at for row in rows if row.first_uploaded_at]
+        lasts = [row.last_uploaded_at for row in rows if row.last_uploaded_at]
+        return min(firsts, default=None), max(lasts, default=None)
+
+    @classmethod
+    def rebuild(cls, dimensions=None):
+        """Полностью пересчитывает счётчики GROUP BY-запросами"""
+        sources = {
+            cls.CATEGORY: Photo.objects.values_list('category_type'),
+            cls.YEAR: Photo.objects.annotate(
+                year=ExtractYear('uploaded_at')).values_list('year'),
+            cls.UPLOADER: Photo.objects.filter(
+                uploaded_by__isnull=False).values_list('uploaded_by'),
+        }
+        dimensions = dimensions or list(sources)
+
+        rows = []
+        for dimension in dimensions:
+            bounds = {'first': Min('uploaded_at'), 'last': Max('uploaded_at')} if (
+                dimension == cls.CATEGORY) else {}
+            grouped = sources[dimension].annotate(
+                total=Count('pk'), **bounds).order_by()
+            rows.extend(
+                cls(dimension=dimension, key=str(key), photo_count=total,
+                    first_uploaded_at=first[0] if first else None,
+                    last_uploaded_at=first[1] if first else None)
+                for key, total, *first in grouped)
+
+        with transaction.atomic():
+            cls.objects.filter(dimension__in=dimensions).delete()
+            cls.objects.bulk_create(rows)
+        return len(rows)
+
+
+class ProcessingJob(models.Model):
+    """Задача фоновой обработки фотографии в очереди на базе БД"""
+    RENDITIONS = 'renditions'
+    SIMILARITY = 'similarity'
+    TASK_CHOICES = [
+        (RENDITIONS, 'Создание миниатюр'),
+        (SIMILARITY, 'Поиск похожих изображений'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='jobs', verbose_name='Фотография')
+    task = models.CharField('Задача', max_length=30, choices=TASK_CHOICES)
+    status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    locked_by = models.CharField('Воркер', max_length=64, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    started_at = models.DateTimeField('Начало выполнения', null=True, blank=True)
+    finished_at = models.DateTimeField('Окончание выполнения', null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        verbose_name = 'Задача обработки'
+        verbose_name_plural = 'Задачи обработки'
+
+    def __str__(self):
+        return f'{self.get_task_display()} для фото #{self.photo_id}: {self.get_status_display()}'
+
+
+class ImageFile(models.Model):
+    """
+    Сохранённый файл изображения. Фотографии с одинаковым содержимым
+    ссылаются на один файл; он удаляется, когда уходит последняя ссылка.
+    """
+    name = models.CharField('Файл', max_length=255, unique=True)
+    sha256 = models.CharField('SHA-256', max_length=64, unique=True)
+    perceptual_hash = models.CharField('Перцептивный хэш', max_length=16, blank=True)
+    ref_count = models.PositiveIntegerField('Число ссылок', default=0)
+    similar_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='near_duplicates', verbose_name='Похоже на')
+    created_at = models.DateTimeField('Дата загрузки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
+
+    @classmethod
+    def find_similar(cls, phash, exclude_pk=None):
+        """
+        Ближайший по перцептивному хэшу файл в пределах SIMILARITY_THRESHOLD.
+        Кандидаты выбираются по индексу полос хэша (см. ImageHashBand),
+        расстояние считается только для них.
+        """
+        if not phash:
+            return None
+        bands = Q()
+        for band, value in hash_bands(phash):
+            bands |= Q(band=band, value=value)
+        candidates = cls.objects.filter(
+            pk__in=ImageHashBand.objects.filter(bands).values('image_file')).exclude(
+                pk=exclude_pk).values_list('pk', 'perceptual_hash')
+        best, best_distance = None, SIMILARITY_THRESHOLD + 1
+        for pk, other in candidates:
+            distance = hamming_distance(phash, other)
+            if distance < best_distance:
+                best, best_distance = pk, distance
+        return best
+
+    def detect_similar(self):
+        """
+        Считает перцептивный хэш файла и отмечает почти такой же из уже
+        сохранённых. Выполняется воркером: файл приходится декодировать.
+        """
+        if self.perceptual_hash:
+            return
+        with default_storage.open(self.name, 'rb') as f:
+            phash = perceptual_hash(f)
+        if not phash:
+            return
+        self.perceptual_hash = phash
+        self.similar_to_id = ImageFile.find_similar(phash, exclude_pk=self.pk)
+        with transaction.atomic():
+            ImageFile.objects.filter(pk=self.pk).update(
+                perceptual_hash=phash, similar_to_id=self.similar_to_id)
+            ImageHashBand.objects.bulk_create(
+                [ImageHashBand(image_file=self, band=band, value=value)
+                 for band, value in hash_bands(phash)],
+                ignore_conflicts=True)
+
+    @classmethod
+    def register(cls, photo, sha256):
+        """
+        Заводит запись для только что сохранённого файла фотографии.
+        Если параллельная загрузка успела сохранить те же байты, фотография
+        переводится на её файл, а наша копия удаляется. Перцептивный хэш
+        считает воркер (detect_similar).
+        """
+        image_file, created = cls.objects.get_or_create(
+            sha256=sha256, defaults={'name': photo.image.name})
+        if not created and image_file.name != photo.image.name:
+            duplicate_name = photo.image.name
+            photo.image = image_file.name
+            photo._loaded_image_name = photo.image.name
+            transaction.on_commit(lambda: default_storage.delete(duplicate_name))
+        Photo.objects.filter(pk=photo.pk).update(image=photo.image.name,
+                                                 image_file=image_file,
+                                                 cache_version=F('cache_version') + 1)
+        return image_file
+
+    @classmethod
+    def release(cls, image_file_id, image_name):
+        """
+        Снимает ссылку на файл. Последняя ссылка удаляет запись, файл
+        и его миниатюры после фиксации транзакции. Для фото, загруженных
+        до учёта ссылок, файл удаляется, если на него не ссылается ни одна
+        фотография.
+        """
+        if not image_name:
+            return
+        if image_file_id:
+            cls.objects.filter(pk=image_file_id, ref_count__gt=0).update(
+                ref_count=F('ref_count') - 1)
+            deleted, _ = cls.objects.filter(pk=image_file_id, ref_count=0).delete()
+            if not deleted:
+                return
+        elif Photo.objects.filter(image=image_name).exists():
+            return
+
+        def delete_files():
+            default_storage.delete(image_name)
+            delete_renditions(image_name)
+        transaction.on_commit(delete_files)
+
+
+class ImageHashBand(models.Model):
+    """
+    Полоса перцептивного хэша файла: по индексу (band, value) находятся
+    кандидаты в почти одинаковые файлы без перебора всех хэшей
+    """
+    image_file = models.ForeignKey(ImageFile, on_delete=models.CASCADE, related_name='hash_bands',
+                                   verbose_name='Файл изображения')
+    band = models.PositiveSmallIntegerField('Номер полосы')
+    value = models.CharField('Значение', max_length=4)
+
+    class Meta:
+        unique_together = ('image_file', 'band')
+        indexes = [models.Index(fields=['band', 'value'], name='imagehashband_lookup_idx')]
+        verbose_name = 'Полоса перцептивного хэша'
+        verbose_name_plural = 'Полосы перцептивных хэшей'
+
+    def __str__(self):
+        return f'{self.image_file_id}: {self.band}={self.value}'
+
+
+class RelatedPhoto(models.Model):
+    """
+    Предрассчитанные похожие фотографии: top-K по взвешенному IDF
+    коэффициенту Жаккара общих тегов (см. photos.related)
+    """
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='related_links',
+                              verbose_name='Фотография')
+    related = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='related_from',
+                                verbose_name='Похожая фотография')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        unique_together = ('photo', 'related')
+        indexes = [models.Index(fields=['photo', '-score'], name='related_photo_score_idx')]
+        verbose_name = 'Похожая фотография'
+        verbose_name_plural = 'Похожие фотографии'
+
+    def __str__(self):
+        return f'#{self.photo_id} -> #{self.related_id}: {self.score:.3f}'
+
+
+class TagUsage(models.Model):
+    """
+    Предрассчитанное число фотографий с тегом и вес тега в облаке тегов.
+
+    Вес - номер корзины от 1 до WEIGHT_BUCKETS в логарифмической шкале
+    относительно самого популярного тега (0 - тег не используется).
+    Счётчики меняются сигналами при постановке и снятии тегов; веса
+    пересчитываются для изменившихся тегов, а при смене максимума - для всех.
+    """
+    WEIGHT_BUCKETS = 5
+    # Размер шрифта в облаке тегов по весу
+    FONT_SIZES = (12, 14, 17, 20, 24, 28)
+
+    tag = models.OneToOneField('taggit.Tag', on_delete=models.CASCADE, primary_key=True,
+                               related_name='usage', verbose_name='Тег')
+    photo_count = models.PositiveIntegerField('Количество фотографий', default=0)
+    weight = models.PositiveSmallIntegerField('Вес в облаке тегов', default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-photo_count', 'tag'], name='tag_usage_count_idx')]
+        verbose_name = 'Использование тега'
+        verbose_name_plural = 'Использование тегов'
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.photo_count}'
+
+    @property
+    def font_size(self):
+        return self.FONT_SIZES[self.weight]
+
+    @classmethod
+    def weight_thresholds(cls, max_count):
+        """Минимальное число фотографий для каждого веса, начиная с 1"""
+        if max_count <= 1:
+            return [1] * cls.WEIGHT_BUCKETS if max_count else []
+        return [math.ceil(max_count ** (bucket / (cls.WEIGHT_BUCKETS - 1)) - 1e-9)
+                for bucket in range(cls.WEIGHT_BUCKETS)]
+
+    @classmethod
+    def max_count(cls):
+        """Максимум по индексу tag_usage_count_idx"""
+        top = cls.objects.order_by('-photo_count').values_list('photo_count', flat=True).first()
+        return top or 0
+
+    @classmethod
+    def refresh_weights(cls, tag_ids=None, max_count=None):
+        """Пересчитывает веса одним UPDATE - всех тегов или только tag_ids"""
+        if max_count is None:
+            max_count = cls.max_count()
+        thresholds = cls.weight_thresholds(max_count)
+        weight = Case(
+            *[When(photo_count__gte=threshold, then=bucket)
+              for bucket, threshold in reversed(list(enumerate(thresholds, 1)))],
+            default=0)
+        rows = cls.objects.all() if tag_ids is None else cls.objects.filter(tag_id__in=tag_ids)
+        rows.update(weight=weight)
+
+    @classmethod
+    def apply(cls, tag_ids, delta):
+        """Атомарно изменяет счётчики тегов на delta и обновляет веса"""
+        tag_ids = list(tag_ids)
+        old_max = cls.max_count()
+        if delta > 0:
+            cls.objects.bulk_create([cls(tag_id=tag_id) for tag_id in tag_ids],
+                                    ignore_conflicts=True)
+            cls.objects.filter(tag_id__in=tag_ids).update(photo_count=F('photo_count') + delta)
+        else:
+            cls.objects.filter(tag_id__in=tag_ids, photo_count__gte=-delta).update(
+                photo_count=F('photo_count') + delta)
+        new_max = cls.max_count()
+        cls.refresh_weights(None if new_max != old_max else tag_ids, new_max)
+
+    @classmethod
+    def rebuild(cls):
+        """Полностью пересчитывает счётчики одним GROUP BY по taggit_taggeditem"""
+        from taggit.models import Tag  # type: ignore
+        rows = [cls(tag_id=pk, photo_count=total)
+                for pk, total in Tag.objects.annotate(
+                    total=Count('taggit_taggeditem_items')).values_list('pk', 'total')]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows)
+            cls.refresh_weights()
+        return len(rows)
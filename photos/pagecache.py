@@ -0,0 +1,141 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .cache import bump_version, get_version
+
+PAGE_CACHE_KEY = 'pages'
+PAGE_CACHE_TIMEOUT = 10 * 60
+# Группа всех страниц, зависящих от набора фотографий и тегов: ленты,
+# теги, статистика и (из-за соседей и похожих фото) страницы фотографий
+PHOTO_PAGES = f'{PAGE_CACHE_KEY}:photos'
+
+
+def photo_page_groups(pk=None, slug=None):
+    """Группы страницы одной фотографии: адреса по pk и по слагу"""
+    groups = []
+    if pk is not None:
+        groups.append(f'{PAGE_CACHE_KEY}:photo:pk:{pk}')
+    if slug is not None:
+        groups.append(f'{PAGE_CACHE_KEY}:photo:slug:{slug}')
+    return groups
+
+
+def purge_photo_pages():
+    """Сбрасывает все закэшированные страницы с фотографиями"""
+    bump_version(PHOTO_PAGES)
+
+
+def purge_photo_page(pk, slug):
+    """Сбрасывает только страницу фотографии (комментарии, оценки)"""
+    for group in photo_page_groups(pk, slug):
+        bump_version(group)
+
+
+def page_key(request):
+    raw = f"{request.META.get('HTTP_HOST', '')}{request.get_full_path()}"
+    return f'{PAGE_CACHE_KEY}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def is_anonymous_request(request):
+    """
+    Без cookie сессии пользователь заведомо анонимный, и это видно без
+    обращения к сессии в БД. Запросы с cookie сообщений тоже идут мимо
+    кэша: в ответе должны быть показаны сообщения.
+    """
+    return (request.method == 'GET'
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and CookieStorage.cookie_name not in request.COOKIES)
+
+
+def content_etag(content):
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных посетителей по адресу с query string.
+
+    Кэшируются только ответы представлений с AnonymousPageCacheMixin.
+    Запись хранит версии групп, от которых зависит страница, на момент
+    начала её построения; сигналы увеличивают версии, и запись с устаревшей
+    версией считается промахом. Попадание в кэш - два обращения к кэшу
+    (запись и версии групп), без БД и без внутренних middleware.
+    Ответы отдаются с Vary: Cookie и ETag; совпадение If-None-Match даёт 304.
+    Ставится сразу после WhiteNoiseMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_anonymous_request(request):
+            return self.get_response(request)
+
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and self.is_current(entry['versions']):
+            return self.cached_response(request, entry)
+
+        request.page_cache_candidate = True
+        response = self.get_response(request)
+        versions = getattr(response, 'page_cache_versions', None)
+        if versions is None or not self.is_storable(request, response):
+            return response
+
+        patch_vary_headers(response, ('Cookie',))
+        response.headers['ETag'] = content_etag(response.content)
+        cache.set(key, {
+            'content': response.content,
+            'headers': list(response.items()),
+            'versions': versions,
+        }, PAGE_CACHE_TIMEOUT)
+        response.headers['X-Page-Cache'] = 'MISS'
+        return get_conditional_response(
+            request, etag=response.headers['ETag'], response=response)
+
+    def is_current(self, versions):
+        """Версии читаются одним get_many; пропавшая из кэша версия - промах"""
+        current = cache.get_many([f'{group}:version' for group in versions])
+        return all(current.get(f'{group}:version') == version
+                   for group, version in versions.items())
+
+    def is_storable(self, request, response):
+        """Страницы с cookie (в том числе CSRF-токеном) и личные ответы не кэшируются"""
+        return (response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and 'CSRF_COOKIE_NEEDS_UPDATE' not in request.META
+                and 'private' not in response.get('Cache-Control', ''))
+
+    def cached_response(self, request, entry):
+        response = HttpResponse(entry['content'])
+        for header, value in entry['headers']:
+            response.headers[header] = value
+        response.headers['X-Page-Cache'] = 'HIT'
+        return get_conditional_response(
+            request, etag=response.headers['ETag'], response=response)
+
+
+class AnonymousPageCacheMixin:
+    """
+    Разрешает кэшировать страницу представления для анонимных посетителей.
+    Версии групп page_cache_groups читаются до построения страницы, так что
+    изменение данных во время рендеринга сделает запись сразу устаревшей.
+    """
+    page_cache_groups = [PHOTO_PAGES]
+
+    def get_page_cache_groups(self):
+        return list(self.page_cache_groups)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not getattr(request, 'page_cache_candidate', False):
+            return super().dispatch(request, *args, **kwargs)
+        versions = {group: get_version(group) for group in self.get_page_cache_groups()}
+        response = super().dispatch(request, *args, **kwargs)
+        response.page_cache_versions = versions
+        return response
@@ -0,0 +1,135 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(photo):
+    """Курсор - позиция фотографии (uploaded_at, id) в base64"""
+    raw = json.dumps([photo.uploaded_at.isoformat(), photo.pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        uploaded_at, pk = json.loads(raw)
+        return datetime.fromisoformat(uploaded_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def keyset_filter(position, descending=True):
+    """
+    Условие "после позиции (uploaded_at, id)" в порядке сортировки.
+    Избыточная граница uploaded_at <= (>=) позволяет планировщику начать
+    с нужного места индекса (uploaded_at, id): одно условие с OR
+    SQLite не превращает в поиск по диапазону.
+    """
+    uploaded_at, pk = position
+    if descending:
+        return Q(uploaded_at__lte=uploaded_at) & (
+            Q(uploaded_at__lt=uploaded_at) | Q(id__lt=pk))
+    return Q(uploaded_at__gte=uploaded_at) & (
+        Q(uploaded_at__gt=uploaded_at) | Q(id__gt=pk))
+
+
+class CursorPage:
+    """Страница курсорной пагинации; интерфейс близок к django Page"""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """
+    Пагинация по ключу (uploaded_at, id) вместо OFFSET.
+
+    Страница выбирается условием WHERE по позиции последней (или первой)
+    фотографии предыдущей страницы, поэтому глубокие страницы не медленнее
+    первой. Запрашивается per_page + 1 строка, чтобы узнать, есть ли
+    следующая страница, так что COUNT(*) не нужен; общее количество
+    считается только при обращении к count.
+    """
+
+    def __init__(self, queryset, per_page, descending=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = descending
+
+    @cached_property
+    def count(self):
+        return self.queryset.order_by().count()
+
+    def _ordered(self, forward):
+        descending = self.descending == forward
+        if descending:
+            return self.queryset.order_by('-uploaded_at', '-id')
+        return self.queryset.order_by('uploaded_at', 'id')
+
+    def _after(self, position, forward):
+        """Фотографии, идущие после position в направлении обхода"""
+        return keyset_filter(position, descending=self.descending == forward)
+
+    def page(self, after=None, before=None):
+        """
+        after - курсор последней фотографии предыдущей страницы,
+        before - курсор первой фотографии следующей страницы.
+        Без курсоров возвращается первая страница.
+        """
+        forward = before is None
+        cursor = after if forward else before
+        queryset = self._ordered(forward)
+        if cursor:
+            queryset = queryset.filter(self._after(decode_cursor(cursor), forward))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            return CursorPage(rows, self, has_next=has_more,
+                              has_previous=bool(cursor))
+        rows.reverse()
+        return CursorPage(rows, self, has_next=True, has_previous=has_more)
@@ -0,0 +1,177 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count
+from taggit.models import TaggedItem  # type: ignore
+
+from .models import Photo, RelatedPhoto
+
+# Сколько похожих фотографий хранится для каждой
+TOP_K = 10
+BATCH_SIZE = 5000
+
+
+def photo_tagged_items():
+    """Теги существующих фотографий (строки удаляемого фото ещё могут оставаться)"""
+    return TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Photo),
+        object_id__in=Photo.objects.values('pk'))
+
+
+def idf_weights(tag_ids=None):
+    """
+    IDF тегов: log(1 + N / df), где N - число фотографий с тегами,
+    df - число фотографий с данным тегом. Редкие теги весят больше.
+    """
+    items = photo_tagged_items()
+    total = items.values('object_id').distinct().count()
+    if tag_ids is not None:
+        items = items.filter(tag_id__in=tag_ids)
+    counts = items.values_list('tag_id').annotate(
+        df=Count('object_id', distinct=True)).order_by()
+    return {tag_id: math.log(1 + total / df) for tag_id, df in counts}
+
+
+def weighted_jaccard(tags, other_tags, weights):
+    """Сумма весов общих тегов к сумме весов объединения"""
+    shared = sum(weights.get(t, 0) for t in tags & other_tags)
+    if not shared:
+        return 0.0
+    union = sum(weights.get(t, 0) for t in tags | other_tags)
+    return shared / union
+
+
+def score_photo(photo_id):
+    """
+    Оценки сходства фотографии со всеми, у кого есть общие теги:
+    словарь {pk: оценка}.
+    """
+    items = photo_tagged_items()
+    tags = set(items.filter(object_id=photo_id).values_list('tag_id', flat=True))
+    if not tags:
+        return {}
+
+    candidate_ids = items.filter(tag_id__in=tags).exclude(
+        object_id=photo_id).values('object_id')
+    candidate_tags = defaultdict(set)
+    for object_id, tag_id in items.filter(object_id__in=candidate_ids).values_list(
+            'object_id', 'tag_id'):
+        candidate_tags[object_id].add(tag_id)
+
+    weights = idf_weights(tags.union(*candidate_tags.values()))
+    return {
+        pk: weighted_jaccard(tags, other_tags, weights)
+        for pk, other_tags in candidate_tags.items()
+    }
+
+
+def top_k(scores, k=TOP_K):
+    return heapq.nlargest(k, ((score, pk) for pk, score in scores.items() if score > 0))
+
+
+def _replace_list(photo_id, scores):
+    RelatedPhoto.objects.filter(photo_id=photo_id).delete()
+    RelatedPhoto.objects.bulk_create(
+        RelatedPhoto(photo_id=photo_id, related_id=pk, score=score)
+        for score, pk in top_k(scores))
+
+
+def update_related(photo_id):
+    """
+    Инкрементальное обновление после изменения тегов фотографии:
+    пересчитывается её собственный список, а в списках фотографий с общими
+    тегами обновляется её оценка (с обрезкой до TOP_K). Фотографии,
+    у которых она была в списке, но общих тегов больше нет, пересчитываются
+    целиком. Веса IDF остальных пар при этом не меняются - их уточняет
+    полная перестройка (rebuild_related_photos).
+    """
+    scores = score_photo(photo_id)
+    with transaction.atomic():
+        _replace_list(photo_id, scores)
+
+        lost = set(RelatedPhoto.objects.filter(related_id=photo_id).exclude(
+            photo_id__in=list(scores)).values_list('photo_id', flat=True))
+
+        existing = defaultdict(dict)
+        row_ids = {}
+        for row_id, pk, related_id, score in RelatedPhoto.objects.filter(
+                photo_id__in=list(scores)).values_list('pk', 'photo_id', 'related_id', 'score'):
+            existing[pk][related_id] = score
+            row_ids[pk, related_id] = row_id
+
+        stale, fresh = [], []
+        for pk, score in scores.items():
+            current = existing[pk]
+            current[photo_id] = score
+            keep = {related_id for _, related_id in top_k(current)}
+            stale.extend(row_ids[pk, related_id] for related_id in current
+                         if related_id not in keep and (pk, related_id) in row_ids)
+            if photo_id in keep:
+                fresh.append(RelatedPhoto(photo_id=pk, related_id=photo_id, score=score))
+
+        RelatedPhoto.objects.filter(pk__in=stale).delete()
+        RelatedPhoto.objects.bulk_create(
+            fresh, update_conflicts=True,
+            unique_fields=['photo', 'related'], update_fields=['score'])
+
+    for pk in lost:
+        refresh_related(pk)
+
+
+def refresh_related(photo_id):
+    """Полностью пересчитывает список одной фотографии"""
+    scores = score_photo(photo_id)
+    with transaction.atomic():
+        _replace_list(photo_id, scores)
+
+
+def top_related(pairs, k=TOP_K):
+    """
+    Вычисляет top-K похожих для всех фотографий по парам (photo_id, tag_id).
+
+    Матрица "фото x тег" с весами IDF хранится разреженно, в виде
+    инвертированного индекса тег -> фотографии. Произведение X * X^T
+    (суммарный вес общих тегов для каждой пары) считается обходом списков
+    фотографий по тегам, поэтому пары без общих тегов не перебираются.
+    Возвращает список (photo_id, related_id, score).
+    """
+    photo_tags = defaultdict(set)
+    postings = defaultdict(list)
+    for photo_id, tag_id in pairs:
+        photo_tags[photo_id].add(tag_id)
+        postings[tag_id].append(photo_id)
+
+    total = len(photo_tags)
+    weights = {tag_id: math.log(1 + total / len(ids)) for tag_id, ids in postings.items()}
+    norms = {pk: sum(weights[t] for t in tags) for pk, tags in photo_tags.items()}
+
+    rows = []
+    for pk, tags in photo_tags.items():
+        shared = defaultdict(float)
+        for tag_id in tags:
+            weight = weights[tag_id]
+            for other in postings[tag_id]:
+                if other != pk:
+                    shared[other] += weight
+        scores = {
+            other: value / (norms[pk] + norms[other] - value)
+            for other, value in shared.items()
+        }
+        rows.extend((pk, other, score) for score, other in top_k(scores, k))
+    return rows
+
+
+def rebuild_related_photos():
+    """Полная перестройка таблицы RelatedPhoto"""
+    items = photo_tagged_items()
+    rows = top_related(items.values_list('object_id', 'tag_id').iterator())
+    with transaction.atomic():
+        RelatedPhoto.objects.all().delete()
+        RelatedPhoto.objects.bulk_create(
+            (RelatedPhoto(photo_id=pk, related_id=other, score=score)
+             for pk, other, score in rows),
+            batch_size=BATCH_SIZE)
+    return len(rows)
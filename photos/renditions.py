@@ -0,0 +1,100 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Название: (ширина, высота, обрезать до точного размера)
+RENDITIONS = {
+    'thumb': (150, 150, True),
+    'card': (600, 450, False),
+    'large': (1600, 1600, False),
+}
+
+# Форматы Pillow для расширений оригинала; GIF сохраняем как PNG
+FORMATS = {
+    '.jpg': ('JPEG', '.jpg'),
+    '.jpeg': ('JPEG', '.jpg'),
+    '.png': ('PNG', '.png'),
+    '.gif': ('PNG', '.png'),
+}
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def rendition_name(image_name, size, webp=False):
+    """Имя файла рендишена рядом с оригиналом"""
+    root, ext = os.path.splitext(image_name)
+    if webp:
+        return f'{root}.{size}.webp'
+    return f'{root}.{size}{FORMATS.get(ext.lower(), ("JPEG", ".jpg"))[1]}'
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY,
+                                  optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def _write(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, content)
+
+
+def generate_renditions(image_name):
+    """
+    Создаёт уменьшенные копии изображения photos/<uuid>.<ext>: рядом
+    с оригиналом пишутся photos/<uuid>.<size>.<ext> и .webp-вариант
+    для каждого размера из RENDITIONS.
+    Возвращает True, если все файлы записаны.
+    """
+    _, ext = os.path.splitext(image_name)
+    image_format = FORMATS.get(ext.lower(), ('JPEG', '.jpg'))[0]
+
+    try:
+        with default_storage.open(image_name, 'rb') as f:
+            original = Image.open(f)
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, ValueError) as e:
+        logger.warning('Не удалось открыть изображение %s: %s', image_name, e)
+        return False
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert(
+            'RGBA' if 'transparency' in original.info or 'A' in original.mode
+            else 'RGB')
+
+    for size, (width, height, crop) in RENDITIONS.items():
+        if crop:
+            resized = ImageOps.fit(original, (width, height),
+                                   Image.Resampling.LANCZOS)
+        else:
+            resized = original.copy()
+            resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+        _write(rendition_name(image_name, size), _encode(resized, image_format))
+        _write(rendition_name(image_name, size, webp=True),
+               _encode(resized, 'WEBP'))
+    return True
+
+
+def delete_renditions(image_name):
+    """Удаляет все рендишены изображения"""
+    for size in RENDITIONS:
+        for webp in (False, True):
+            name = rendition_name(image_name, size, webp)
+            if default_storage.exists(name):
+                default_storage.delete(name)
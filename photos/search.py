@@ -0,0 +1,237 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from taggit.models import TaggedItem  # type: ignore
+
+from .models import Photo
+from .stemmer import WORD_RE, fold, stem_words
+
+SEARCH_TABLE = 'photos_search'
+# Больше слов в запросе не учитывается: каждое - отдельное условие MATCH
+MAX_QUERY_TERMS = 10
+BATCH_SIZE = 500
+
+
+class SqliteSearchIndex:
+    """
+    Виртуальная таблица FTS5, rowid - pk фотографии. В колонки пишутся
+    основы слов (stemmer.stem), запрос приводится к основам так же.
+    Ранжирование - bm25 с весами колонок: заголовок важнее тегов,
+    теги - описания, описание - имени автора.
+    """
+    weights = (10.0, 5.0, 2.0, 1.0)
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"title, tags, description, uploader, tokenize='unicode61')")
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def write(self, cursor, documents):
+        self.delete(cursor, [document[0] for document in documents])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, title, tags, description, uploader) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            [(pk, *(' '.join(stem_words(text)) for text in texts))
+             for pk, *texts in documents])
+
+    def delete(self, cursor, photo_ids):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                           [(pk,) for pk in photo_ids])
+
+    def match(self, query):
+        """Все основы запроса обязательны; префиксный поиск прощает неточности стемминга"""
+        stems = [stem for stem in stem_words(query) if stem][:MAX_QUERY_TERMS]
+        return ' '.join(f'"{stem}"*' for stem in stems)
+
+    def count(self, cursor, match):
+        cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+                       [match])
+        return cursor.fetchone()[0]
+
+    def ranked_ids(self, cursor, match, offset, limit):
+        weights = ', '.join(str(weight) for weight in self.weights)
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid DESC LIMIT %s OFFSET %s',
+            [match, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchIndex:
+    """
+    Таблица с tsvector и GIN-индексом. Стемминг - словарь russian
+    самого PostgreSQL; веса A-D задают важность колонок для ts_rank_cd.
+    """
+    document_sql = (
+        "setweight(to_tsvector('russian', %s), 'A') || "
+        "setweight(to_tsvector('russian', %s), 'B') || "
+        "setweight(to_tsvector('russian', %s), 'C') || "
+        "setweight(to_tsvector('russian', %s), 'D')")
+
+    def create(self, schema_editor):
+        schema_editor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            f'photo_id bigint PRIMARY KEY REFERENCES photos_photo (id) ON DELETE CASCADE, '
+            f'document tsvector NOT NULL)')
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)')
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def write(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (photo_id, document) VALUES (%s, {self.document_sql}) '
+            f'ON CONFLICT (photo_id) DO UPDATE SET document = EXCLUDED.document',
+            documents)
+
+    def delete(self, cursor, photo_ids):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE photo_id = ANY(%s)', [list(photo_ids)])
+
+    def match(self, query):
+        return ' '.join(WORD_RE.findall(fold(query))[:MAX_QUERY_TERMS])
+
+    def count(self, cursor, match):
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {SEARCH_TABLE} "
+            f"WHERE document @@ websearch_to_tsquery('russian', %s)", [match])
+        return cursor.fetchone()[0]
+
+    def ranked_ids(self, cursor, match, offset, limit):
+        cursor.execute(
+            f"SELECT photo_id FROM {SEARCH_TABLE}, websearch_to_tsquery('russian', %s) query "
+            f"WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC, photo_id DESC "
+            f"LIMIT %s OFFSET %s", [match, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_INDEXES = {
+    'sqlite': SqliteSearchIndex(),
+    'postgresql': PostgresSearchIndex(),
+}
+
+
+def get_search_index(using=None):
+    """Индекс для базы данных; None, если её полнотекстовый поиск не поддерживается"""
+    return SEARCH_INDEXES.get((using or connection).vendor)
+
+
+def uploader_name(username, first_name, last_name):
+    return ' '.join(name for name in (username, first_name, last_name) if name)
+
+
+def photo_documents(photos, tagged_items):
+    """
+    Документы индекса (pk, заголовок, теги, описание, автор) по выборкам
+    фотографий и их тегов; миграция передаёт выборки исторических моделей.
+    """
+    tags = defaultdict(list)
+    for object_id, name in tagged_items.values_list('object_id', 'tag__name'):
+        tags[object_id].append(name)
+    return [
+        (pk, title, ' '.join(tags[pk]), description,
+         uploader_name(username, first_name, last_name))
+        for pk, title, description, username, first_name, last_name in photos.values_list(
+            'pk', 'title', 'description', 'uploaded_by__username',
+            'uploaded_by__first_name', 'uploaded_by__last_name')
+    ]
+
+
+def index_photos(photo_ids):
+    """Перезаписывает документы фотографий; удалённые убираются из индекса"""
+    index = get_search_index()
+    photo_ids = list(photo_ids)
+    if index is None or not photo_ids:
+        return
+    content_type = ContentType.objects.get_for_model(Photo)
+    with connection.cursor() as cursor:
+        for start in range(0, len(photo_ids), BATCH_SIZE):
+            batch = photo_ids[start:start + BATCH_SIZE]
+            documents = photo_documents(
+                Photo.objects.filter(pk__in=batch),
+                TaggedItem.objects.filter(content_type=content_type, object_id__in=batch))
+            found = {document[0] for document in documents}
+            index.delete(cursor, [pk for pk in batch if pk not in found])
+            if documents:
+                index.write(cursor, documents)
+
+
+def remove_photos(photo_ids):
+    index = get_search_index()
+    if index is not None:
+        with connection.cursor() as cursor:
+            index.delete(cursor, list(photo_ids))
+
+
+def rebuild_search_index():
+    """Полная перестройка индекса; возвращает число проиндексированных фотографий"""
+    index = get_search_index()
+    if index is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    photo_ids = list(Photo.objects.order_by('pk').values_list('pk', flat=True))
+    index_photos(photo_ids)
+    return len(photo_ids)
+
+
+class SearchResults:
+    """
+    Результаты поиска для django Paginator: count() - один COUNT по индексу,
+    срез - запрос страницы pk по рангу и одна выборка фотографий.
+    Запрос без слов ничего не находит.
+    """
+
+    def __init__(self, query, queryset=None):
+        self.query = query
+        self.queryset = queryset if queryset is not None else Photo.custom.for_cards()
+        self.index = get_search_index()
+        self.match = self.index.match(query) if self.index is not None else None
+
+    @cached_property
+    def _count(self):
+        if self.index is None:
+            return self._fallback().count()
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            return self.index.count(cursor, self.match)
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        offset = item.start or 0
+        limit = (item.stop if item.stop is not None else self._count) - offset
+        if self.index is None:
+            return list(self._fallback()[offset:offset + limit])
+        if not self.match or limit <= 0:
+            return []
+        with connection.cursor() as cursor:
+            ids = self.index.ranked_ids(cursor, self.match, offset, limit)
+        photos = self.queryset.in_bulk(ids)
+        return [photos[pk] for pk in ids if pk in photos]
+
+    def _fallback(self):
+        """Базы без полнотекстового поиска: все слова по подстроке, новые первыми"""
+        words = WORD_RE.findall(self.query)[:MAX_QUERY_TERMS]
+        if not words:
+            return self.queryset.none()
+        photos = self.queryset
+        for word in words:
+            photos = photos.filter(pk__in=Photo.objects.filter(
+                Q(title__icontains=word) | Q(description__icontains=word)
+                | Q(tags__name__icontains=word)
+                | Q(uploaded_by__username__icontains=word)).values('pk'))
+        return photos.order_by('-uploaded_at')
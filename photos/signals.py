@@ -0,0 +1,398 @@
+import threading
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from taggit.models import Tag, TaggedItem  # type: ignore
+
+from .autocomplete import tag_index
+from .cache import (PHOTO_LIST_STATS_KEY, bump_version, invalidate_photo_neighbours,
+                    neighbour_pks)
+from .models import (Comment, ImageFile, Photo, PhotoLike, PhotoStat, RelatedPhoto,
+                     TagUsage, neighbour_label)
+from .pagecache import purge_photo_page, purge_photo_pages
+from .related import refresh_related, update_related
+from .search import index_photos, remove_photos
+from .tagging import TAG_CACHE_KEY, unique_tag_slug
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def invalidate_photo_list_stats(sender, **kwargs):
+    """Сбрасывает кэш статистики списка при изменении фото или тегов"""
+    bump_version(PHOTO_LIST_STATS_KEY)
+
+
+@receiver(m2m_changed, sender=Photo.tags.through)
+def invalidate_photo_list_stats_on_tagging(sender, action, **kwargs):
+    """Добавление, удаление и очистка тегов фотографии"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(PHOTO_LIST_STATS_KEY)
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def purge_pages_on_photo_change(sender, **kwargs):
+    """Ленты, теги, статистика и страницы фото зависят от всего набора фотографий"""
+    purge_photo_pages()
+
+
+@receiver(m2m_changed, sender=Photo.tags.through)
+def purge_pages_on_tagging(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        purge_photo_pages()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=PhotoLike)
+@receiver(post_delete, sender=PhotoLike)
+def purge_photo_page_on_discussion(sender, instance, **kwargs):
+    """Комментарии и оценки видны только на странице самой фотографии"""
+    slug = Photo.objects.filter(pk=instance.photo_id).values_list('slug', flat=True).first()
+    purge_photo_page(instance.photo_id, slug)
+
+
+def stat_categories(keys):
+    return {key for dimension, key in keys or [] if dimension == PhotoStat.CATEGORY}
+
+
+@receiver(post_init, sender=Photo)
+def remember_photo_stat_keys(sender, instance, **kwargs):
+    """Запоминает исходные ключи счётчиков, чтобы при сохранении учесть изменения"""
+    instance._stat_keys = PhotoStat.keys_for(instance) if instance.pk else None
+    instance._stat_uploaded_at = instance.__dict__.get('uploaded_at')
+
+
+@receiver(post_save, sender=Photo)
+def update_photo_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Инкрементально обновляет счётчики статистики и даты загрузок категорий"""
+    if raw:
+        return
+
+    old_keys, new_keys = instance._stat_keys, PhotoStat.keys_for(instance)
+    moved = False
+    if created:
+        PhotoStat.apply(new_keys or [], 1)
+        moved = new_keys is not None
+    elif old_keys is not None and new_keys is not None:
+        PhotoStat.apply(set(old_keys) - set(new_keys), -1)
+        PhotoStat.apply(set(new_keys) - set(old_keys), 1)
+        moved = (set(old_keys) != set(new_keys)
+                 or instance._stat_uploaded_at != instance.uploaded_at)
+    if moved:
+        PhotoStat.refresh_bounds(stat_categories(old_keys) | stat_categories(new_keys))
+    instance._stat_keys = new_keys
+    instance._stat_uploaded_at = instance.__dict__.get('uploaded_at')
+
+
+@receiver(post_delete, sender=Photo)
+def update_photo_stats_on_delete(sender, instance, **kwargs):
+    keys = instance._stat_keys or PhotoStat.keys_for(instance) or []
+    PhotoStat.apply(keys, -1)
+    PhotoStat.refresh_bounds(stat_categories(keys))
+
+
+@receiver(post_delete, sender=Photo)
+def release_photo_image(sender, instance, **kwargs):
+    """Файл удаляется только вместе с последней ссылающейся на него фотографией"""
+    ImageFile.release(instance.image_file_id, instance.image.name)
+
+
+@receiver(pre_save, sender=Photo)
+def remember_old_neighbours(sender, instance, **kwargs):
+    """При смене категории или даты запоминаем соседей на старом месте"""
+    position = getattr(instance, '_loaded_position', None)
+    if instance._state.adding or position is None:
+        return
+    if position != (instance.uploaded_at, instance.category_type):
+        instance._old_neighbours = neighbour_pks(instance)
+
+
+@receiver(post_save, sender=Photo)
+def invalidate_neighbours_on_save(sender, instance, created, **kwargs):
+    """
+    Новая или переставленная фотография меняет соседей у окружающих;
+    новые заголовок или слаг - ссылки навигации на их страницах
+    """
+    old_neighbours = instance.__dict__.pop('_old_neighbours', None)
+    label = neighbour_label(instance)
+    relabeled = getattr(instance, '_loaded_label', label) != label
+    if not created and old_neighbours is None and not relabeled:
+        return
+    invalidate_photo_neighbours(
+        neighbour_pks(instance) | (old_neighbours or set()) | {instance.pk})
+    instance._loaded_position = (instance.uploaded_at, instance.category_type)
+    instance._loaded_label = label
+
+
+@receiver(pre_delete, sender=Photo)
+def remember_neighbours_on_delete(sender, instance, **kwargs):
+    instance._old_neighbours = neighbour_pks(instance)
+
+
+@receiver(post_delete, sender=Photo)
+def invalidate_neighbours_on_delete(sender, instance, **kwargs):
+    invalidate_photo_neighbours(
+        instance.__dict__.pop('_old_neighbours', set()) | {instance.pk})
+
+
+# pk фотографий, ждущих пересчёта похожих после фиксации транзакции
+pending_related = threading.local()
+
+
+def update_related_on_commit(photo_ids):
+    """
+    Пересчёт похожих откладывается до фиксации транзакции и выполняется
+    один раз на фотографию, сколько бы изменений тегов в ней ни было
+    (set_photo_tags отправляет и post_remove, и post_add). Каждое изменение
+    регистрирует свой обработчик: при откате транзакции Django отбрасывает
+    их все, а оставшиеся в наборе pk только приведут к лишнему пересчёту.
+    """
+    pending = pending_related.__dict__.setdefault('photo_ids', set())
+    for photo_id in photo_ids:
+        pending.add(photo_id)
+        transaction.on_commit(partial(run_pending_related, photo_id))
+
+
+def run_pending_related(photo_id):
+    pending = pending_related.__dict__.setdefault('photo_ids', set())
+    if photo_id in pending:
+        pending.discard(photo_id)
+        update_related(photo_id)
+
+
+@receiver(m2m_changed, sender=Photo.tags.through)
+def update_related_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчитывает похожие фотографии после изменения тегов"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    update_related_on_commit((pk_set or []) if reverse else [instance.pk])
+
+
+@receiver(pre_delete, sender=Photo)
+def remember_related_referrers(sender, instance, **kwargs):
+    instance._related_referrers = list(
+        RelatedPhoto.objects.filter(related=instance).values_list('photo_id', flat=True))
+
+
+@receiver(post_delete, sender=Photo)
+def refresh_related_referrers(sender, instance, **kwargs):
+    """Фотографии, у которых удалённая была в списке похожих, получают замену"""
+    for photo_id in instance.__dict__.pop('_related_referrers', []):
+        refresh_related(photo_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    """Счётчик комментариев фотографии; правка текста его не меняет"""
+    if created and not raw:
+        Photo.apply_comments_count(instance.photo_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_deleted_comment(sender, instance, **kwargs):
+    """Ответы удаляются каскадом, и сигнал приходит для каждого из них"""
+    Photo.apply_comments_count(instance.photo_id, -1)
+
+
+@receiver(post_save, sender=Photo)
+def bump_photo_cache_version(sender, instance, raw=False, **kwargs):
+    """Сохранённая фотография получает новую версию кэшированных фрагментов"""
+    if not raw:
+        Photo.bump_cache_version(pk=instance.pk)
+
+
+@receiver(m2m_changed, sender=Photo.tags.through)
+def bump_cache_version_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Photo.bump_cache_version(pk=instance.pk)
+    elif pk_set:
+        Photo.bump_cache_version(pk__in=pk_set)
+
+
+@receiver(pre_save, sender=Tag)
+def transliterate_tag_slug(sender, instance, raw=False, **kwargs):
+    """
+    Новый тег получает латинский слаг вместо юникодного слага taggit.
+    Слаг, заданный явно (например, в админке), не меняется.
+    """
+    if raw or not instance._state.adding:
+        return
+    if not instance.slug or instance.slug == instance.slugify(instance.name):
+        instance.slug = unique_tag_slug(instance.name)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_resolved_tags(sender, **kwargs):
+    bump_version(TAG_CACHE_KEY)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def bump_cache_version_on_tag_change(sender, instance, **kwargs):
+    """Переименованный или удаляемый тег меняет карточки всех его фотографий"""
+    Photo.bump_cache_version(tags=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(pre_delete, sender=User)
+def bump_cache_version_on_uploader_change(sender, instance, created=False, update_fields=None,
+                                          **kwargs):
+    """Имя автора есть в карточках; вход (обновление last_login) их не меняет"""
+    if created or update_fields == frozenset(['last_login']):
+        return
+    Photo.bump_cache_version(uploaded_by=instance)
+    purge_photo_pages()
+
+
+@receiver(post_save, sender=Photo)
+def index_photo_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Поисковый документ: заголовок, описание, теги и имя автора"""
+    if raw or (update_fields is not None
+               and not update_fields & {'title', 'description', 'uploaded_by'}):
+        return
+    index_photos([instance.pk])
+
+
+@receiver(post_delete, sender=Photo)
+def remove_photo_from_index(sender, instance, **kwargs):
+    remove_photos([instance.pk])
+
+
+@receiver(m2m_changed, sender=Photo.tags.through)
+def index_photos_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        index_photos((pk_set or []) if reverse else [instance.pk])
+
+
+def matching_photo_ids(**filters):
+    return list(Photo.objects.filter(**filters).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def index_photos_on_tag_rename(sender, instance, created, **kwargs):
+    if not created:
+        index_photos(matching_photo_ids(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_photos(sender, instance, **kwargs):
+    instance._search_photo_ids = matching_photo_ids(tags=instance)
+
+
+@receiver(post_delete, sender=Tag)
+def index_photos_on_tag_delete(sender, instance, **kwargs):
+    index_photos(instance.__dict__.pop('_search_photo_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+def update_tag_index(sender, instance, **kwargs):
+    tag_index.put(instance.pk, instance.name, instance.slug)
+
+
+@receiver(post_delete, sender=Tag)
+def remove_from_tag_index(sender, instance, **kwargs):
+    tag_index.remove(instance.pk)
+
+
+@receiver(m2m_changed, sender=Photo.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Счётчики TagUsage и популярность тегов в автодополнении. pk_set у
+    taggit и tagging.set_photo_tags - только реально добавленные или
+    снятые теги, так что счётчики меняются одним UPDATE на операцию.
+    """
+    if reverse:
+        # Фотографии добавлены к тегу instance или сняты с него
+        if action in ('post_add', 'post_remove') and pk_set:
+            delta = len(pk_set) if action == 'post_add' else -len(pk_set)
+            TagUsage.apply([instance.pk], delta)
+            tag_index.add_usage([instance.pk], delta)
+        return
+    if action == 'pre_clear':
+        instance._cleared_tag_ids = photo_tag_ids(instance.pk)
+        return
+    if action == 'post_clear':
+        tag_ids, delta = instance.__dict__.pop('_cleared_tag_ids', []), -1
+    elif action in ('post_add', 'post_remove'):
+        tag_ids, delta = pk_set or [], 1 if action == 'post_add' else -1
+    else:
+        return
+    if tag_ids:
+        TagUsage.apply(tag_ids, delta)
+        tag_index.add_usage(tag_ids, delta)
+
+
+def photo_tag_ids(photo_id):
+    return list(Photo.tags.through.objects.filter(
+        content_type=ContentType.objects.get_for_model(Photo),
+        object_id=photo_id).values_list('tag_id', flat=True))
+
+
+@receiver(pre_delete, sender=Photo)
+def remember_photo_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = photo_tag_ids(instance.pk)
+
+
+@receiver(post_delete, sender=Photo)
+def uncount_deleted_photo_tags(sender, instance, **kwargs):
+    """Теги удалённой фотографии снимаются каскадом, без m2m_changed"""
+    tag_ids = instance.__dict__.pop('_deleted_tag_ids', [])
+    if tag_ids:
+        TagUsage.apply(tag_ids, -1)
+        tag_index.add_usage(tag_ids, -1)
+
+
+@receiver(post_delete, sender=Tag)
+def refresh_tag_weights(sender, **kwargs):
+    """Удалённый тег мог быть самым популярным - веса остальных меняются"""
+    TagUsage.refresh_weights()
+
+
+@receiver(post_save, sender=Tag)
+def create_tag_usage(sender, instance, created, raw=False, **kwargs):
+    """Новый тег сразу есть в списке тегов, пока с нулевым счётчиком"""
+    if created and not raw:
+        TagUsage.objects.bulk_create([TagUsage(tag=instance)], ignore_conflicts=True)
+
+
+@receiver(post_save, sender=User)
+def index_photos_on_uploader_change(sender, instance, created=False, update_fields=None,
+                                    **kwargs):
+    """Имя автора есть в индексе; вход (обновление last_login) его не меняет"""
+    if created or update_fields == frozenset(['last_login']):
+        return
+    index_photos(matching_photo_ids(uploaded_by=instance))
+
+
+@receiver(pre_delete, sender=User)
+def remember_uploader_photos(sender, instance, **kwargs):
+    instance._search_photo_ids = matching_photo_ids(uploaded_by=instance)
+
+
+@receiver(post_delete, sender=User)
+def index_photos_on_uploader_delete(sender, instance, **kwargs):
+    """Фото удалённого пользователя остаются в индексе без имени автора"""
+    index_photos(instance.__dict__.pop('_search_photo_ids', []))
+
+
+@receiver(post_delete, sender=User)
+def remove_uploader_stat(sender, instance, **kwargs):
+    """Фото удалённого пользователя становятся анонимными (SET_NULL без сигналов)"""
+    PhotoStat.objects.filter(dimension=PhotoStat.UPLOADER, key=str(instance.pk)).delete()
@@ -0,0 +1,125 @@
+"""
+Стеммер русского языка по алгоритму Snowball (snowballstem.org).
+
+Нужен полнотекстовому индексу SQLite: токенизатор FTS5 умеет только
+английский Porter, поэтому слова приводятся к основе до записи в индекс
+и в поисковом запросе. Слова без кириллицы возвращаются как есть.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+# Окончания группы 1 удаляются, только если перед ними стоит "а" или "я"
+PERFECTIVE_GERUND = {
+    'в': True, 'вши': True, 'вшись': True,
+    'ив': False, 'ивши': False, 'ившись': False,
+    'ыв': False, 'ывши': False, 'ывшись': False,
+}
+ADJECTIVE = dict.fromkeys((
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+    'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая',
+    'яя', 'ою', 'ею'), False)
+PARTICIPLE = {
+    'ем': True, 'нн': True, 'вш': True, 'ющ': True, 'щ': True,
+    'ивш': False, 'ывш': False, 'ующ': False,
+}
+REFLEXIVE = dict.fromkeys(('ся', 'сь'), False)
+VERB = {
+    **dict.fromkeys((
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+        'ют', 'ны', 'ть', 'ешь', 'нно'), True),
+    **dict.fromkeys((
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+        'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'), False),
+}
+NOUN = dict.fromkeys((
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'), False)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def fold(text):
+    """Нижний регистр и "ё" как "е" - так слова пишутся в индексе"""
+    return text.lower().replace('ё', 'е')
+
+
+def _region_after_vc(word, start):
+    """Позиция после первой согласной, следующей за гласной, начиная со start"""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, endings):
+    """
+    Удаляет самое длинное из окончаний. Как и в Snowball, если у него
+    не выполнено условие "а/я перед окончанием", более короткие
+    окончания не пробуются. Возвращает None, если ничего не удалено.
+    """
+    for size in range(min(len(word), 6), 0, -1):
+        ending = word[-size:]
+        if ending in endings:
+            stem = word[:-size]
+            if endings[ending] and not stem.endswith(('а', 'я')):
+                return None
+            return stem
+    return None
+
+
+def _strip_adjectival(word):
+    stem = _strip(word, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _strip(stem, PARTICIPLE)
+    return stem if participle is None else participle
+
+
+def stem(word):
+    word = fold(word)
+    rv = next((i + 1 for i, ch in enumerate(word) if ch in VOWELS), len(word))
+    r2 = _region_after_vc(word, _region_after_vc(word, 0))
+    prefix, rest = word[:rv], word[rv:]
+
+    # Шаг 1: деепричастие, иначе возвратная частица и окончание
+    # прилагательного, глагола или существительного
+    stripped = _strip(rest, PERFECTIVE_GERUND)
+    if stripped is None:
+        reflexive = _strip(rest, REFLEXIVE)
+        if reflexive is not None:
+            rest = reflexive
+        for step in (_strip_adjectival, lambda w: _strip(w, VERB), lambda w: _strip(w, NOUN)):
+            stripped = step(rest)
+            if stripped is not None:
+                break
+    if stripped is not None:
+        rest = stripped
+
+    # Шаг 2
+    if rest.endswith('и'):
+        rest = rest[:-1]
+
+    # Шаг 3: словообразовательный суффикс в R2
+    for ending in DERIVATIONAL:
+        if rest.endswith(ending) and rv + len(rest) - len(ending) >= r2:
+            rest = rest[:-len(ending)]
+            break
+
+    # Шаг 4: "нн" -> "н", превосходная степень, мягкий знак
+    superlative = next((e for e in SUPERLATIVE if rest.endswith(e)), None)
+    if superlative is not None:
+        rest = rest[:-len(superlative)]
+    if rest.endswith('нн'):
+        rest = rest[:-1]
+    elif superlative is None and rest.endswith('ь'):
+        rest = rest[:-1]
+    return prefix + rest
+
+
+def stem_words(text):
+    """Основы всех слов текста в исходном порядке"""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
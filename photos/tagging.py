@@ -0,0 +1,176 @@
+import hashlib
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save
+from django.utils.text import slugify
+from taggit.models import Tag  # type: ignore
+
+from .cache import get_version
+from .models import Photo
+
+TAG_CACHE_KEY = 'photos:tags'
+TAG_CACHE_TIMEOUT = 60 * 60
+# Отсутствующий тег тоже кэшируется, чтобы несуществующие адреса не шли в БД
+MISSING = ()
+
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia',
+}
+
+ResolvedTag = namedtuple('ResolvedTag', 'id name slug')
+
+
+def transliterate(text):
+    """Кириллица латиницей по упрощённой схеме загранпаспортов"""
+    return ''.join(TRANSLIT.get(ch, ch) for ch in text.lower())
+
+
+def tag_slug(name):
+    """Латинский слаг тега; если латиницей ничего не выразить - юникодный"""
+    return slugify(transliterate(name)) or slugify(name, allow_unicode=True)
+
+
+def unique_slug(base, taken):
+    """Первый свободный из base, base_1, base_2... (суффикс как у taggit)"""
+    slug, i = base, 1
+    while slug in taken:
+        slug = f'{base}_{i}'
+        i += 1
+    return slug
+
+
+def unique_tag_slug(name, exclude_pk=None):
+    base = tag_slug(name)[:90]
+    taken = set(Tag.objects.filter(slug__startswith=base).exclude(
+        pk=exclude_pk).values_list('slug', flat=True))
+    return unique_slug(base, taken)
+
+
+def _cached(kind, value, lookup):
+    version = get_version(TAG_CACHE_KEY)
+    key = f'{TAG_CACHE_KEY}:{kind}:{hashlib.md5(value.encode()).hexdigest()}'
+    tag = cache.get(key, version=version)
+    if tag is None:
+        found = lookup()
+        tag = ResolvedTag(found.pk, found.name, found.slug) if found else MISSING
+        cache.set(key, tag, TAG_CACHE_TIMEOUT, version=version)
+    return tag or None
+
+
+def resolve_tag(slug):
+    """
+    Тег по адресу страницы: точный слаг, транслитерированный слаг (старые
+    ссылки с кириллицей) или название с пробелами вместо дефисов.
+    Все варианты проверяются одним запросом, результат кэшируется до
+    изменения любого тега. Возвращает ResolvedTag или None.
+    """
+    def lookup():
+        name = slug.replace('-', ' ')
+        transliterated = tag_slug(slug)
+        candidates = Tag.objects.filter(
+            Q(slug__in={slug, transliterated}) | Q(name__iexact=name))
+        by_priority = sorted(candidates[:3], key=lambda tag: (
+            tag.slug != slug, tag.slug != transliterated, tag.name != name))
+        return by_priority[0] if by_priority else None
+
+    return _cached('slug', slug, lookup)
+
+
+def resolve_tag_name(name):
+    """
+    Тег по названию без учёта регистра (фильтр ?tag= в списке).
+    Ключ кэша - название как есть: iexact в SQLite не сравнивает кириллицу
+    без учёта регистра, и промах по одному написанию не должен скрывать
+    тег для остальных.
+    """
+    def lookup():
+        candidates = Tag.objects.filter(name__iexact=name)[:2]
+        return min(candidates, key=lambda tag: tag.name != name, default=None)
+
+    return _cached('name', name, lookup)
+
+
+def parse_tag_names(text):
+    """Названия тегов из строки через запятую, без пустых и повторов"""
+    return list(dict.fromkeys(name.strip() for name in (text or '').split(',') if name.strip()))
+
+
+def create_tags(names):
+    """
+    Создаёт отсутствующие теги одним INSERT с латинскими слагами.
+    bulk_create не вызывает save(), поэтому post_save отправляется явно:
+    индексы и кэши тегов обновляют те же обработчики, что и для save().
+    Возвращает {название: тег} для всех names.
+    """
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in tags]
+    if not missing:
+        return tags
+
+    bases = {name: tag_slug(name)[:90] for name in missing}
+    prefixes = Q()
+    for base in set(bases.values()):
+        prefixes |= Q(slug__startswith=base)
+    taken = set(Tag.objects.filter(prefixes).values_list('slug', flat=True))
+    new_tags = []
+    for name in missing:
+        slug = unique_slug(bases[name], taken)
+        taken.add(slug)
+        new_tags.append(Tag(name=name, slug=slug))
+    # Тег с тем же названием мог появиться параллельно - он просто берётся из БД
+    Tag.objects.bulk_create(new_tags, ignore_conflicts=True)
+
+    for tag in Tag.objects.filter(name__in=missing):
+        tags[tag.name] = tag
+        post_save.send(sender=Tag, instance=tag, created=True, update_fields=None,
+                       raw=False, using=router.db_for_write(Tag, instance=tag))
+    return tags
+
+
+def set_photo_tags(photo, names):
+    """
+    Приводит теги фотографии к списку names одной транзакцией: добавляются
+    и снимаются только отличающиеся теги (bulk_create и один DELETE),
+    недостающие теги создаются create_tags. Как и менеджер taggit,
+    отправляет m2m_changed с pk изменившихся тегов, чтобы счётчики,
+    поисковый индекс и кэши обновились один раз на операцию.
+    Возвращает (добавленные pk, снятые pk).
+    """
+    through = Photo.tags.through
+    content_type = ContentType.objects.get_for_model(Photo)
+    db = router.db_for_write(through, instance=photo)
+    names = list(dict.fromkeys(names))
+
+    with transaction.atomic(using=db):
+        current = dict(through.objects.filter(
+            content_type=content_type, object_id=photo.pk).values_list('tag__name', 'tag_id'))
+        removed = {tag_id for name, tag_id in current.items() if name not in names}
+        added_names = [name for name in names if name not in current]
+        added = set()
+        if added_names:
+            added = {tag.pk for tag in create_tags(added_names).values()}
+
+        for action, pk_set in (('remove', removed), ('add', added)):
+            if not pk_set:
+                continue
+            m2m_changed.send(sender=through, action=f'pre_{action}', instance=photo,
+                             reverse=False, model=Tag, pk_set=pk_set, using=db)
+            if action == 'remove':
+                through.objects.filter(content_type=content_type, object_id=photo.pk,
+                                       tag_id__in=pk_set).delete()
+            else:
+                through.objects.bulk_create(
+                    [through(content_type=content_type, object_id=photo.pk, tag_id=tag_id)
+                     for tag_id in pk_set], ignore_conflicts=True)
+            m2m_changed.send(sender=through, action=f'post_{action}', instance=photo,
+                             reverse=False, model=Tag, pk_set=pk_set, using=db)
+    getattr(photo, '_prefetched_objects_cache', {}).pop('tags', None)
+    return added, removed
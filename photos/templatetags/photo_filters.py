@@ -45,3 +45,26 @@ def add_hashtag(value):
     """Добавляет hashtag перед каждым словом"""
     words = value.split()
     return ' '.join([f'#{word}' for word in words])
+
+
+@register.simple_tag
+def rendition_url(photo, size, image_format=''):
+    """URL уменьшенной копии фото: {% rendition_url photo 'card' %} или {% rendition_url photo 'card' 'webp' %}"""
+    if not photo or not photo.image:
+        return ''
+    return photo.get_rendition_url(size, webp=image_format == 'webp')
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **kwargs):
+    """
+    Query string ссылки пагинации с сохранением фильтров:
+    {% page_query after=page_obj.next_cursor %} или {% page_query page=2 %}
+    """
+    query = context['request'].GET.copy()
+    for key in ('page', 'after', 'before'):
+        query.pop(key, None)
+    for key, value in kwargs.items():
+        if value is not None:
+            query[key] = value
+    return f'?{query.urlencode()}'
@@ -1,3 +1,1203 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import m2m_changed
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from taggit.models import Tag  # type: ignore
+
+from .autocomplete import tag_index
+from .cache import get_photo_list_stats, get_photo_neighbours
+from .comments import COMMENTS_PER_PAGE
+from .jobs import MAX_ATTEMPTS, run_pending_jobs
+from .models import (Comment, ImageFile, Photo, PhotoLike, PhotoStat, ProcessingJob, ProcessingStatus,
+                     RelatedPhoto, TagUsage)
+from .related import rebuild_related_photos
+from .renditions import RENDITIONS, rendition_name
+from .search import SearchResults, rebuild_search_index
+from .stemmer import stem
+from .tagging import (parse_tag_names, resolve_tag, resolve_tag_name, set_photo_tags,
+                      transliterate)
+from .uploadhandlers import MAX_REQUEST_SIZE, MAX_UPLOAD_SIZE, SIZE_ERROR, TYPE_ERROR
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='photo.jpg', size=(40, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'green').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def make_gradient(name='gradient.jpg', quality=90, reverse=False):
+    image = Image.linear_gradient('L').resize((64, 64))
+    if reverse:
+        image = image.transpose(Image.Transpose.FLIP_TOP_BOTTOM).rotate(90)
+    buffer = BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=quality)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PhotoTestCase(TestCase):
+    """Общая настройка: временный MEDIA_ROOT и настоящие файлы изображений"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_photo(self, **kwargs):
+        kwargs.setdefault('title', 'Фото')
+        kwargs.setdefault('description', 'Описание фотографии')
+        kwargs.setdefault('image', make_image())
+        return Photo.objects.create(**kwargs)
+
+
+class PhotoListQueryBudgetTest(PhotoTestCase):
+    """Число запросов списков не должно зависеть от количества карточек"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password123')
+
+    def setUp(self):
+        cache.clear()
+
+    def create_photos(self, count):
+        for i in range(count):
+            photo = self.create_photo(title=f'Фото {i}',
+                                      category_type='NATURE',
+                                      uploaded_by=self.user)
+            photo.tags.add('природа', 'горы', 'закат', f'тег-{i}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url):
+        self.create_photos(1)
+        single = self.count_queries(url)
+        self.create_photos(10)
+        full_page = self.count_queries(url)
+        self.assertEqual(single, full_page)
+
+    def test_photo_list(self):
+        self.assert_constant_queries(reverse('photos:photo_list'))
+
+    def test_photos_by_tag(self):
+        self.assert_constant_queries(
+            reverse('photos:photos_by_tag', kwargs={'tag_slug': 'priroda'}))
+
+    def test_photos_by_category(self):
+        self.assert_constant_queries(
+            reverse('photos:photos_by_category',
+                    kwargs={'category_slug': 'nature'}))
+
+    def test_photos_by_year(self):
+        self.assert_constant_queries(
+            reverse('photos:photos_by_year',
+                    kwargs={'year': timezone.now().year}))
+
+    def test_years_come_from_rollups(self):
+        self.create_photos(1)
+        year = timezone.localtime().year
+        response = self.client.get(
+            reverse('photos:photos_by_year', kwargs={'year': year}))
+        self.assertEqual(response.context['years'], [year])
+
+    def test_cards_load_only_card_fields(self):
+        self.create_photos(1)
+        photo = Photo.custom.for_cards().get()
+        self.assertIn('description', photo.get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertTrue(photo.get_rendition_url('card'))
+
+
+class PhotoListStatsCacheTest(PhotoTestCase):
+    """Статистика списка считается один раз и сбрасывается сигналами"""
+
+    def setUp(self):
+        cache.clear()
+        for category_type in ('NATURE', 'NATURE', 'PEOPLE'):
+            self.create_photo(category_type=category_type)
+
+    def test_counts_by_category_name(self):
+        stats = get_photo_list_stats()
+        self.assertEqual(stats['total_photos'], 3)
+        self.assertEqual(stats['category_counts']['NATURE'], 2)
+        self.assertEqual(stats['category_counts']['PEOPLE'], 1)
+        self.assertEqual(stats['category_counts']['OTHER'], 0)
+
+    def test_cached_until_photo_changes(self):
+        get_photo_list_stats()
+        with self.assertNumQueries(0):
+            get_photo_list_stats()
+
+        photo = Photo.objects.first()
+        photo.tags.add('новый')
+        self.assertEqual(get_photo_list_stats()['popular_tags'][0].name,
+                         'новый')
+
+        photo.delete()
+        self.assertEqual(get_photo_list_stats()['total_photos'], 2)
+
+    def test_admin_category_action(self):
+        self.assertEqual(get_photo_list_stats()['category_counts']['NATURE'], 2)
+        admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:photos_photo_changelist'), {
+            'action': 'mark_as_nature',
+            '_selected_action': list(Photo.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(get_photo_list_stats()['category_counts']['NATURE'], 3)
+
+
+class ReactionCountersTest(PhotoTestCase):
+    """Счётчики оценок на фотографии совпадают со строками PhotoLike"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}', password='password123')
+                     for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.photo = self.create_photo()
+
+    def counters(self):
+        self.photo.refresh_from_db()
+        return self.photo.likes_count, self.photo.dislikes_count, self.photo.score
+
+    def real_counters(self):
+        real = PhotoLike.objects.filter(photo=self.photo).aggregate(
+            likes=Count('pk', filter=Q(value=1)),
+            dislikes=Count('pk', filter=Q(value=-1)),
+            score=Sum('value'))
+        return real['likes'], real['dislikes'], real['score'] or 0
+
+    def test_counters_follow_reactions(self):
+        first, second, third = self.users
+        steps = [
+            (first, 1, (1, 0, 1)),     # лайк
+            (second, 1, (2, 0, 2)),
+            (third, -1, (2, 1, 1)),    # дизлайк
+            (second, -1, (1, 2, -1)),  # смена лайка на дизлайк
+            (first, 1, (0, 2, -2)),    # повтор снимает оценку
+            (third, -1, (0, 1, -1)),
+        ]
+        for user, value, expected in steps:
+            self.photo.toggle_reaction(user, value)
+            self.assertEqual(self.counters(), expected)
+            self.assertEqual(self.counters(), self.real_counters())
+
+    def test_recount_repairs_drift(self):
+        for user in self.users[:2]:
+            self.photo.toggle_reaction(user, 1)
+        self.photo.toggle_reaction(self.users[2], -1)
+        other = self.create_photo(title='Другое фото')
+        Photo.objects.filter(pk=self.photo.pk).update(likes_count=7, dislikes_count=0, score=0)
+
+        call_command('recount_reactions', stdout=StringIO())
+        self.assertEqual(self.counters(), (2, 1, 1))
+        other.refresh_from_db()
+        self.assertEqual((other.likes_count, other.dislikes_count, other.score), (0, 0, 0))
+
+
+class ReactionToggleTest(PhotoTestCase):
+    """JSON-переключение оценки: ответы об ошибках и итоговые счётчики"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password123')
+        cls.other = User.objects.create_user('other', password='password123')
+
+    def setUp(self):
+        cache.clear()
+        self.photo = self.create_photo()
+        self.url = reverse('photos:toggle_reaction', args=[self.photo.slug])
+        self.client.force_login(self.user)
+
+    def post(self, value, url=None):
+        return self.client.post(url or self.url, {'value': value})
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(self.post('2').status_code, 400)
+        self.assertEqual(self.post('лайк').status_code, 400)
+        self.assertEqual(self.post(1, reverse('photos:toggle_reaction', args=['net-takogo']))
+                         .status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.post(1).status_code, 401)
+        self.assertFalse(PhotoLike.objects.exists())
+
+    def test_toggle_and_switch(self):
+        self.photo.toggle_reaction(self.other, 1)
+        steps = [
+            (1, {'reaction': 1, 'likes_count': 2, 'dislikes_count': 0, 'score': 2}),
+            (-1, {'reaction': -1, 'likes_count': 1, 'dislikes_count': 1, 'score': 0}),
+            (-1, {'reaction': None, 'likes_count': 1, 'dislikes_count': 0, 'score': 1}),
+        ]
+        for value, expected in steps:
+            response = self.post(value)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected)
+        self.assertFalse(PhotoLike.objects.filter(user=self.user).exists())
+
+    def test_no_deferred_loads(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post(1)
+        deferred = [q['sql'] for q in queries
+                    if q['sql'].startswith('SELECT "photos_photo"."id", "photos_photo"."slug" FROM')]
+        self.assertEqual(deferred, [])
+
+
+class PhotoStatRollupTest(PhotoTestCase):
+    """Сводные счётчики обновляются сигналами и совпадают с полным пересчётом"""
+
+    def snapshot(self):
+        return {(row.dimension, row.key): row.photo_count
+                for row in PhotoStat.objects.filter(photo_count__gt=0)}
+
+    def test_incremental_matches_rebuild(self):
+        user = User.objects.create_user('author', password='password123')
+        photos = [
+            self.create_photo(category_type=category_type,
+                              uploaded_by=user if i % 2 else None)
+            for i, category_type in enumerate(['NATURE', 'PEOPLE', 'NATURE'])
+        ]
+        photos[0].category_type = 'ANIMALS'
+        photos[0].save()
+        photos[1].delete()
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental[(PhotoStat.CATEGORY, 'NATURE')], 1)
+        self.assertEqual(incremental[(PhotoStat.CATEGORY, 'ANIMALS')], 1)
+        self.assertNotIn((PhotoStat.UPLOADER, str(user.pk)), incremental)
+
+        PhotoStat.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def bounds(self):
+        return PhotoStat.upload_bounds(PhotoStat.objects.filter(dimension=PhotoStat.CATEGORY))
+
+    def test_upload_bounds_follow_photos(self):
+        photos = [self.create_photo(category_type=category_type)
+                  for category_type in ['NATURE', 'PEOPLE', 'NATURE']]
+        self.assertEqual(self.bounds(), (photos[0].uploaded_at, photos[2].uploaded_at))
+
+        earlier = photos[1].uploaded_at - timezone.timedelta(days=400)
+        photos[1].uploaded_at = earlier
+        photos[1].save()
+        photos[2].delete()
+        self.assertEqual(self.bounds(), (earlier, photos[0].uploaded_at))
+
+        incremental = list(PhotoStat.objects.filter(dimension=PhotoStat.CATEGORY).order_by(
+            'key').values_list('key', 'first_uploaded_at', 'last_uploaded_at'))
+        PhotoStat.rebuild()
+        self.assertEqual(list(PhotoStat.objects.filter(dimension=PhotoStat.CATEGORY).order_by(
+            'key').values_list('key', 'first_uploaded_at', 'last_uploaded_at')), incremental)
+
+    def test_stats_page_independent_of_uploaders(self):
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('photos:stats'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.create_photo(uploaded_by=User.objects.create_user('author0'))
+        single = count_queries()
+        for i in range(1, 15):
+            self.create_photo(uploaded_by=User.objects.create_user(f'author{i}'))
+        self.assertEqual(count_queries(), single)
+        self.assertLessEqual(single, 3)
+
+
+class RenditionTest(PhotoTestCase):
+    """Миниатюры создаются при сохранении и заменяются вместе с изображением"""
+
+    def test_renditions_created_next_to_original(self):
+        photo = self.create_photo(image=make_image(size=(2000, 1000)))
+        run_pending_jobs()
+        photo.refresh_from_db()
+        self.assertTrue(photo.has_renditions)
+
+        for size, (width, height, crop) in RENDITIONS.items():
+            for webp in (False, True):
+                name = rendition_name(photo.image.name, size, webp)
+                self.assertEqual(os.path.dirname(name),
+                                 os.path.dirname(photo.image.name))
+                with default_storage.open(name) as f:
+                    rendered = Image.open(f)
+                    self.assertLessEqual(rendered.width, width)
+                    self.assertLessEqual(rendered.height, height)
+
+        self.assertTrue(
+            photo.get_rendition_url('card', webp=True).endswith('.card.webp'))
+
+    def test_replacing_image_removes_old_renditions(self):
+        photo = self.create_photo()
+        run_pending_jobs()
+        old_thumb = rendition_name(photo.image.name, 'thumb')
+
+        photo = Photo.objects.get(pk=photo.pk)
+        photo.image = make_image('new.jpg', size=(60, 40))
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+        run_pending_jobs()
+
+        self.assertFalse(default_storage.exists(old_thumb))
+        self.assertTrue(
+            default_storage.exists(rendition_name(photo.image.name, 'thumb')))
+
+
+class ProcessingQueueTest(PhotoTestCase):
+    """Загрузка ставит задачу в очередь, воркер обновляет статус фото"""
+
+    def test_upload_is_processed_by_worker(self):
+        user = User.objects.create_user('author', password='password123')
+        self.client.force_login(user)
+        response = self.client.post(reverse('photos:upload_photo'), {
+            'title': 'Горы',
+            'description': 'Описание фотографии',
+            'category_type': 'NATURE',
+            'image': make_image(),
+        })
+        self.assertEqual(response.status_code, 302)
+
+        photo = Photo.objects.get()
+        self.assertEqual(photo.processing_status, ProcessingStatus.PENDING)
+        self.assertFalse(photo.has_renditions)
+
+        self.assertEqual(run_pending_jobs(), [True, True])
+        photo.refresh_from_db()
+        self.assertEqual(photo.processing_status, ProcessingStatus.READY)
+        self.assertTrue(photo.has_renditions)
+        self.assertEqual(run_pending_jobs(), [])
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        photo = self.create_photo(image=SimpleUploadedFile(
+            'broken.jpg', b'not an image', 'image/jpeg'))
+
+        with self.assertLogs('photos', 'WARNING'):
+            for _ in range(MAX_ATTEMPTS):
+                self.assertIn(False, run_pending_jobs())
+                # Повтор откладывается, а не забирается сразу же
+                self.assertEqual(run_pending_jobs(), [])
+                ProcessingJob.objects.update(run_after=timezone.now())
+        self.assertEqual(run_pending_jobs(), [])
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.processing_status, ProcessingStatus.FAILED)
+        job = photo.jobs.get(task=ProcessingJob.RENDITIONS)
+        self.assertEqual(job.status, ProcessingJob.FAILED)
+        self.assertEqual(job.attempts, MAX_ATTEMPTS)
+
+
+class ImageUploadHandlerTest(PhotoTestCase):
+    """Загрузка прерывается на превышении размера и на не-изображениях"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='password123')
+        self.client.force_login(self.user)
+        self.url = reverse('photos:upload_photo')
+
+    def upload(self, image, **extra):
+        return self.client.post(self.url, {
+            'title': 'Горы',
+            'description': 'Описание фотографии',
+            'category_type': 'NATURE',
+            'image': image,
+        }, **extra)
+
+    def test_type_sniffed_from_content(self):
+        response = self.upload(make_image())
+        self.assertEqual(response.status_code, 302)
+
+        response = self.upload(SimpleUploadedFile(
+            'fake.jpg', b'<html>not an image</html>', 'image/jpeg'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(TYPE_ERROR, response.context['form'].errors['image'])
+        self.assertEqual(Photo.objects.count(), 1)
+
+    def test_oversized_file_stops_upload(self):
+        data = b'\xff\xd8\xff' + b'\0' * MAX_UPLOAD_SIZE
+        response = self.upload(SimpleUploadedFile('big.jpg', data, 'image/jpeg'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(SIZE_ERROR, response.context['form'].errors['image'])
+        self.assertFalse(Photo.objects.exists())
+
+    def test_oversized_request_rejected_before_reading_body(self):
+        response = self.upload(make_image(),
+                               CONTENT_LENGTH=str(MAX_REQUEST_SIZE + 1))
+        self.assertRedirects(response, self.url)
+        self.assertFalse(Photo.objects.exists())
+
+    def test_csrf_still_enforced(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(self.url, {'title': 'Горы'})
+        self.assertEqual(response.status_code, 403)
+
+
+class ImageDeduplicationTest(PhotoTestCase):
+    """Одинаковые файлы хранятся один раз и удаляются с последней ссылкой"""
+
+    def test_identical_uploads_share_file(self):
+        first = self.create_photo(image=make_gradient('a.jpg'))
+        second = self.create_photo(image=make_gradient('b.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_file_id, second.image_file_id)
+        self.assertEqual(ImageFile.objects.get().ref_count, 2)
+        name = first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(ImageFile.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(ImageFile.objects.exists())
+
+    def test_delete_view_keeps_shared_file(self):
+        user = User.objects.create_user('author', password='password123')
+        first = self.create_photo(image=make_gradient(), uploaded_by=user)
+        self.create_photo(image=make_gradient())
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('photos:delete_photo', kwargs={'slug': first.slug}))
+        self.assertRedirects(response, reverse('photos:photo_list'))
+        self.assertFalse(Photo.objects.filter(pk=first.pk).exists())
+        self.assertTrue(default_storage.exists(first.image.name))
+
+    def test_near_duplicates_flagged(self):
+        original = self.create_photo(image=make_gradient(quality=90))
+        recompressed = self.create_photo(image=make_gradient(quality=40))
+        different = self.create_photo(image=make_gradient(reverse=True))
+        # Хэш и поиск похожих считает воркер, а не запрос загрузки
+        self.assertFalse(ImageFile.objects.exclude(perceptual_hash='').exists())
+        run_pending_jobs()
+
+        self.assertNotEqual(original.image.name, recompressed.image.name)
+        recompressed.image_file.refresh_from_db()
+        different.image_file.refresh_from_db()
+        self.assertEqual(recompressed.image_file.similar_to_id,
+                         original.image_file_id)
+        self.assertIsNone(different.image_file.similar_to_id)
+        self.assertEqual(original.image_file.hash_bands.count(), 8)
+
+
+class MediaServingTest(PhotoTestCase):
+    """Медиафайлы отдаются с валидаторами кэша, 304 и диапазонами"""
+
+    def setUp(self):
+        self.photo = self.create_photo()
+        self.url = self.photo.image.url
+        with default_storage.open(self.photo.image.name) as f:
+            self.content = f.read()
+
+    def test_full_response_is_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        not_modified = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 2-9/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[2:10])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-4:])
+
+        response = self.client.get(
+            self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+        # Устаревший If-Range - отдаётся весь файл
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-9',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_path_traversal_and_missing_files(self):
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/photos/missing.jpg').status_code, 404)
+
+
+class CursorPaginationTest(PhotoTestCase):
+    """Курсорная пагинация по (uploaded_at, id) без COUNT(*) и OFFSET"""
+
+    def setUp(self):
+        self.photos = [self.create_photo(title=f'Фото {i}') for i in range(8)]
+        # Одинаковое время загрузки у части фото: порядок задаёт id
+        Photo.objects.filter(pk__in=[p.pk for p in self.photos[2:5]]).update(
+            uploaded_at=self.photos[2].uploaded_at)
+        self.url = reverse('photos:photo_list')
+
+    def titles(self, response):
+        return [photo.title for photo in response.context['photos']]
+
+    def test_walk_forward_and_back(self):
+        expected = [p.title for p in sorted(
+            Photo.objects.all(), key=lambda p: (p.uploaded_at, p.pk),
+            reverse=True)]
+
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.url)
+        self.assertFalse(any('COUNT(*)' in q['sql'] for q in queries))
+        page = first.context['page_obj']
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        self.assertContains(first, f'href="?after={page.next_cursor}"')
+
+        second = self.client.get(self.url, {'after': page.next_cursor})
+        self.assertEqual(self.titles(first) + self.titles(second), expected)
+        self.assertFalse(second.context['page_obj'].has_next())
+
+        back = self.client.get(
+            self.url, {'before': second.context['page_obj'].previous_cursor})
+        self.assertEqual(self.titles(back), self.titles(first))
+        self.assertFalse(back.context['page_obj'].has_previous())
+
+    def test_other_sort_uses_page_numbers(self):
+        response = self.client.get(self.url, {'sort': 'title', 'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'after': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PhotoNeighboursTest(PhotoTestCase):
+    """Соседи по (uploaded_at, id) одним запросом, с кэшем и инвалидацией"""
+
+    def setUp(self):
+        cache.clear()
+        self.photos = [
+            self.create_photo(title=f'Фото {i}',
+                              category_type='NATURE' if i % 2 else 'PEOPLE')
+            for i in range(4)
+        ]
+        # Одинаковое время загрузки не должно приводить к пропускам
+        Photo.objects.update(uploaded_at=self.photos[0].uploaded_at)
+
+    def test_neighbours_with_equal_timestamps(self):
+        first, second, third, fourth = self.photos
+        with self.assertNumQueries(1):
+            neighbours = second.find_neighbours()
+        self.assertEqual(neighbours['previous']['pk'], first.pk)
+        self.assertEqual(neighbours['next']['pk'], third.pk)
+        self.assertIsNone(neighbours['previous_in_category'])
+        self.assertEqual(neighbours['next_in_category']['pk'], fourth.pk)
+
+    def test_cached_and_invalidated(self):
+        last = self.photos[-1]
+        self.assertIsNone(get_photo_neighbours(last)['next'])
+        with self.assertNumQueries(0):
+            get_photo_neighbours(last)
+
+        newer = self.create_photo(title='Новое фото', category_type='NATURE')
+        self.assertEqual(get_photo_neighbours(last)['next']['pk'], newer.pk)
+
+        newer.delete()
+        self.assertIsNone(get_photo_neighbours(last)['next'])
+
+    def test_category_change_updates_old_neighbours(self):
+        second, fourth = self.photos[1], self.photos[3]
+        self.assertEqual(
+            get_photo_neighbours(second)['next_in_category']['pk'], fourth.pk)
+        fourth = Photo.objects.get(pk=fourth.pk)
+        fourth.category_type = 'ANIMALS'
+        fourth.save()
+        self.assertIsNone(get_photo_neighbours(second)['next_in_category'])
+
+    def test_admin_category_action_resets_neighbours(self):
+        second, fourth = self.photos[1], self.photos[3]
+        self.assertEqual(
+            get_photo_neighbours(second)['next_in_category']['pk'], fourth.pk)
+        admin = User.objects.create_superuser('admin', password='password123')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:photos_photo_changelist'), {
+            'action': 'mark_as_architecture', '_selected_action': [fourth.pk]})
+        self.assertIsNone(get_photo_neighbours(second)['next_in_category'])
+
+    def test_title_change_updates_neighbour_links(self):
+        second, third = self.photos[1], self.photos[2]
+        self.assertEqual(get_photo_neighbours(second)['next']['title'], 'Фото 2')
+        third = Photo.objects.get(pk=third.pk)
+        third.title = 'Закат над морем'
+        third.slug = 'zakat-nad-morem'
+        third.save()
+        self.assertEqual(get_photo_neighbours(second)['next'],
+                         {'pk': third.pk, 'slug': 'zakat-nad-morem', 'title': 'Закат над морем'})
+
+        third.description = 'Другое описание'
+        third.save()
+        with self.assertNumQueries(0):
+            get_photo_neighbours(second)
+
+
+class RelatedPhotosTest(PhotoTestCase):
+    """Похожие фотографии читаются из таблицы и обновляются при смене тегов"""
+
+    def setUp(self):
+        self.a, self.b, self.c, self.d = [
+            self.create_photo(title=f'Фото {i}') for i in range(4)]
+        # Списки похожих пересчитываются после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.tags.add('горы', 'озеро', 'закат')
+            self.b.tags.add('горы', 'озеро')
+            self.c.tags.add('закат', 'город')
+            self.d.tags.add('город')
+
+    def related(self, photo):
+        return list(photo.get_related_photos())
+
+    def test_ranked_by_weighted_overlap(self):
+        with self.assertNumQueries(1):
+            related = self.related(self.a)
+        self.assertEqual(related, [self.b, self.c])
+        self.assertEqual(self.related(self.d), [self.c])
+
+    def test_incremental_updates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.tags.clear()
+        self.assertEqual(self.related(self.a), [self.c])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.d.tags.add('горы', 'озеро', 'закат')
+        self.assertEqual(self.related(self.a)[0], self.d)
+
+        self.d.delete()
+        self.assertEqual(self.related(self.a), [self.c])
+
+    def test_one_update_per_tag_edit(self):
+        with mock.patch('photos.signals.update_related') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            set_photo_tags(self.a, ['горы', 'город'])
+        self.assertEqual(update.call_args_list, [mock.call(self.a.pk)])
+
+    def test_rebuild_matches_incremental_order(self):
+        incremental = {p.pk: self.related(p) for p in (self.a, self.b, self.c, self.d)}
+        RelatedPhoto.objects.all().delete()
+        rebuild_related_photos()
+        for photo in (self.a, self.b, self.c, self.d):
+            self.assertEqual(self.related(photo), incremental[photo.pk])
+
+
+class CommentThreadTest(PhotoTestCase):
+    """Обсуждение читается постоянным числом запросов, ответы попадают в ветку"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('commenter', password='password123')
+
+    def setUp(self):
+        self.photo = self.create_photo(title='Обсуждаемое фото')
+        self.url = reverse('photos:photo_detail_slug', args=[self.photo.slug])
+
+    def add_comments(self, count):
+        for i in range(count):
+            root = Comment.objects.create(photo=self.photo, user=self.user, text=f'Корень {i}')
+            reply = Comment.objects.create(
+                photo=self.photo, user=self.user, text=f'Ответ {i}', parent=root)
+            Comment.objects.create(
+                photo=self.photo, user=self.user, text=f'Ответ на ответ {i}', parent=reply)
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_reply_attached_to_parent(self):
+        root = Comment.objects.create(photo=self.photo, user=self.user, text='Корень')
+        self.client.force_login(self.user)
+        self.client.post(self.url, {'text': 'Ответ', 'parent_id': root.pk})
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+
+        self.client.post(self.url, {'text': 'Без родителя', 'parent_id': 'abc'})
+        self.assertIsNone(Comment.objects.get(text='Без родителя').parent)
+
+    def test_constant_queries(self):
+        self.add_comments(2)
+        few = self.count_queries()
+        self.add_comments(10)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_tree_and_pagination(self):
+        self.add_comments(COMMENTS_PER_PAGE + 1)
+        response = self.client.get(self.url)
+        page = response.context['comments']
+        self.assertEqual(len(page), COMMENTS_PER_PAGE)
+        newest = page[0]
+        self.assertEqual(newest.text, f'Корень {COMMENTS_PER_PAGE}')
+        self.assertEqual([c.text for c in newest.thread],
+                         [f'Ответ {COMMENTS_PER_PAGE}', f'Ответ на ответ {COMMENTS_PER_PAGE}'])
+
+        response = self.client.get(self.url, {'comments_page': 2})
+        self.assertEqual([c.text for c in response.context['comments']], ['Корень 0'])
+
+    def test_comments_count(self):
+        self.add_comments(2)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.comments_count, 6)
+
+        Comment.objects.filter(parent=None).first().delete()
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.comments_count, 3)
+
+        # Счётчик меняется на разницу, а не пересчитывается: одновременные
+        # комментарии не затирают увеличения друг друга
+        Photo.objects.filter(pk=self.photo.pk).update(comments_count=10)
+        Comment.objects.create(photo=self.photo, user=self.user, text='Ещё один')
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.comments_count, 11)
+
+
+class PhotoFragmentCacheTest(PhotoTestCase):
+    """Карточки и боковая панель берутся из кэша до смены версии фотографии"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password123')
+
+    def setUp(self):
+        cache.clear()
+        self.photo = self.create_photo(title='Горное озеро', category_type='NATURE',
+                                       uploaded_by=self.user)
+        self.photo.tags.add('горы')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        tag_queries = [q for q in queries if 'taggit_tag' in q['sql']]
+        return response.content.decode(), tag_queries
+
+    def test_card_shared_between_pages(self):
+        content, tag_queries = self.get(reverse('photos:photo_list'))
+        self.assertIn('горы', content)
+        self.assertTrue(tag_queries)
+
+        url = reverse('photos:photos_by_category', kwargs={'category_slug': 'nature'})
+        content, tag_queries = self.get(url)
+        self.assertIn('горы', content)
+        self.assertEqual(tag_queries, [])
+
+    def test_version_bumped_on_changes(self):
+        url = reverse('photos:photo_list')
+        self.get(url)
+
+        self.photo.tags.add('озеро')
+        content, _ = self.get(url)
+        self.assertIn('озеро', content)
+
+        version = Photo.objects.get(pk=self.photo.pk).cache_version
+        self.photo.toggle_reaction(self.user, 1)
+        self.assertGreater(self.photo.cache_version, version)
+
+        self.user.first_name = 'Анна'
+        self.user.save()
+        content, _ = self.get(url)
+        self.assertIn('Анна', content)
+
+    def test_detail_sidebar_cached(self):
+        url = reverse('photos:photo_detail_slug', args=[self.photo.slug])
+        self.get(url)
+        content, tag_queries = self.get(url)
+        self.assertIn('горы', content)
+        self.assertEqual(tag_queries, [])
+
+        photo = Photo.objects.get(pk=self.photo.pk)
+        photo.description = 'Новое описание'
+        photo.save()
+        content, _ = self.get(url)
+        self.assertIn('Новое описание', content)
+
+
+class AnonymousPageCacheTest(PhotoTestCase):
+    """Анонимные страницы отдаются из кэша без БД до сброса сигналами"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('visitor', password='password123')
+
+    def setUp(self):
+        cache.clear()
+        self.photo = self.create_photo(title='Закат')
+        self.list_url = reverse('photos:photo_list')
+        self.detail_url = reverse('photos:photo_detail_slug', args=[self.photo.slug])
+
+    def get(self, url, data=None, **extra):
+        return self.client.get(url, data, **extra)
+
+    def test_hit_without_queries(self):
+        first = self.get(self.list_url)
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        self.assertIn('Cookie', first['Vary'])
+        with self.assertNumQueries(0):
+            second = self.get(self.list_url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+        not_modified = self.get(self.list_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.assertEqual(self.get(self.list_url, {'sort': 'title'})['X-Page-Cache'], 'MISS')
+
+    def test_targeted_purge(self):
+        self.get(self.list_url)
+        self.get(self.detail_url)
+
+        Comment.objects.create(photo=self.photo, user=self.user, text='Красиво')
+        self.assertEqual(self.get(self.list_url)['X-Page-Cache'], 'HIT')
+        detail = self.get(self.detail_url)
+        self.assertEqual(detail['X-Page-Cache'], 'MISS')
+        self.assertContains(detail, 'Красиво')
+
+        self.photo.toggle_reaction(self.user, 1)
+        self.assertEqual(self.get(self.detail_url)['X-Page-Cache'], 'MISS')
+
+        self.create_photo(title='Новое фото')
+        self.assertEqual(self.get(self.list_url)['X-Page-Cache'], 'MISS')
+
+    def test_logged_in_users_bypass_cache(self):
+        self.get(self.list_url)
+        self.client.force_login(self.user)
+        response = self.get(self.list_url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'visitor')
+
+
+class PhotoSearchTest(PhotoTestCase):
+    """Полнотекстовый поиск с русской морфологией и синхронизацией сигналами"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ivan', first_name='Иван', password='password123')
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        results = SearchResults(query)
+        return [photo.pk for photo in results[:results.count()]]
+
+    def test_russian_stemming(self):
+        self.assertEqual(stem('закатами'), stem('закаты'))
+        self.assertEqual(stem('Ёлки'), stem('елка'))
+        self.assertEqual(stem('красивейший'), stem('красивые'))
+
+    def test_ranked_by_field(self):
+        in_description = self.create_photo(title='Пляж', description='Вечерние закаты у моря')
+        in_title = self.create_photo(title='Закат над горами')
+        self.create_photo(title='Лес')
+        self.assertEqual(self.found('закатов'), [in_title.pk, in_description.pk])
+        self.assertEqual(self.found('закат море'), [in_description.pk])
+        self.assertEqual(self.found('!!!'), [])
+
+    def test_index_follows_changes(self):
+        photo = self.create_photo(title='Пейзаж', uploaded_by=self.user)
+        self.assertEqual(self.found('иван'), [photo.pk])
+
+        photo.tags.add('Горы')
+        self.assertEqual(self.found('горный'), [])
+        self.assertEqual(self.found('горах'), [photo.pk])
+        tag = photo.tags.get()
+        tag.name = 'Озёра'
+        tag.save()
+        self.assertEqual(self.found('озеро'), [photo.pk])
+        photo.tags.clear()
+        self.assertEqual(self.found('озеро'), [])
+
+        photo.title = 'Портрет'
+        photo.save()
+        self.assertEqual(self.found('портреты'), [photo.pk])
+        self.user.delete()
+        self.assertEqual(self.found('иван'), [])
+        photo.delete()
+        self.assertEqual(self.found('портрет'), [])
+
+    def test_rebuild(self):
+        photo = self.create_photo(title='Маяк')
+        self.assertEqual(rebuild_search_index(), 1)
+        self.assertEqual(self.found('маяки'), [photo.pk])
+
+    def test_search_page(self):
+        for i in range(8):
+            self.create_photo(title=f'Закат {i}')
+        response = self.client.get(reverse('photos:search'), {'q': 'закаты', 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['paginator'].count, 8)
+        self.assertEqual(len(response.context['photos']), 2)
+        self.assertContains(response, 'q=%D0%B7%D0%B0%D0%BA%D0%B0%D1%82%D1%8B')
+
+
+class TagAutocompleteTest(PhotoTestCase):
+    """Автодополнение тегов из индекса в памяти, без запросов к БД"""
+
+    def setUp(self):
+        cache.clear()
+        tag_index.invalidate()
+        self.photos = [self.create_photo(title=f'Фото {i}') for i in range(3)]
+        for photo in self.photos:
+            photo.tags.add('Горы')
+        self.photos[0].tags.add('горный пейзаж', 'город')
+        self.photos[1].tags.add('Ёлки')
+
+    def names(self, prefix, **kwargs):
+        return [tag['name'] for tag in tag_index.search(prefix, **kwargs)]
+
+    def test_prefix_by_popularity(self):
+        self.assertEqual(self.names('ГОР')[0], 'Горы')
+        self.assertEqual(set(self.names('гор')), {'Горы', 'горный пейзаж', 'город'})
+        self.assertEqual(self.names('елк'), ['Ёлки'])
+        self.assertEqual(self.names('гор', limit=1), ['Горы'])
+        self.assertEqual(self.names(' '), [])
+        with self.assertNumQueries(0):
+            self.names('го')
+
+    def test_updated_by_signals(self):
+        self.names('гор')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('город'), ['город'])
+        for photo in self.photos[1:]:
+            photo.tags.add('город')
+        self.photos[0].tags.remove('Горы')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('гор')[0], 'город')
+
+        tag = Tag.objects.get(name='город')
+        tag.name = 'Городской пейзаж'
+        tag.save()
+        Tag.objects.get(name='горный пейзаж').delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('гор'), ['Городской пейзаж', 'Горы'])
+
+    def test_reloads_after_change_in_other_process(self):
+        self.names('гор')
+        other = type(tag_index)()
+        other.search('гор')
+        self.photos[2].tags.add('Горное озеро')
+        other.checked_at = 0
+        self.assertIn('Горное озеро', [tag['name'] for tag in other.search('горн')])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('photos:tag_autocomplete'), {'q': 'ёл', 'limit': 'x'})
+        tag = Tag.objects.get(name='Ёлки')
+        self.assertEqual(response.json(),
+                         {'tags': [{'name': 'Ёлки', 'slug': tag.slug, 'count': 1}]})
+
+
+class TagResolutionTest(PhotoTestCase):
+    """Тег страницы находится одним запросом и кэшируется"""
+
+    def setUp(self):
+        cache.clear()
+        self.photo = self.create_photo()
+        self.photo.tags.add('Горный пейзаж')
+        self.tag = Tag.objects.get()
+
+    def test_transliterated_slug(self):
+        self.assertEqual(transliterate('Щука и ёж'), 'shchuka i ezh')
+        self.assertEqual(self.tag.slug, 'gornyi-peizazh')
+        self.photo.tags.add('горный пейзаж!')
+        self.assertEqual(Tag.objects.get(name='горный пейзаж!').slug, 'gornyi-peizazh_1')
+
+    def test_resolved_once_and_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_tag('gornyi-peizazh').id, self.tag.pk)
+        with self.assertNumQueries(0):
+            resolve_tag('gornyi-peizazh')
+        self.assertEqual(resolve_tag('горный-пейзаж').slug, 'gornyi-peizazh')
+        self.assertEqual(resolve_tag('Горный-пейзаж').slug, 'gornyi-peizazh')
+        self.assertIsNone(resolve_tag('нет-такого'))
+
+        self.tag.name = 'Горы'
+        self.tag.save()
+        self.assertEqual(resolve_tag('gornyi-peizazh').name, 'Горы')
+        self.tag.delete()
+        self.assertIsNone(resolve_tag('gornyi-peizazh'))
+
+    def test_tag_page(self):
+        url = reverse('photos:photos_by_tag', kwargs={'tag_slug': 'gornyi-peizazh'})
+        legacy = self.client.get(reverse('photos:photos_by_tag',
+                                         kwargs={'tag_slug': 'горный-пейзаж'}))
+        self.assertRedirects(legacy, url, status_code=301)
+
+        response = self.client.get(url)
+        self.assertEqual(list(response.context['photos']), [self.photo])
+        self.assertEqual(response.context['tag']['name'], 'Горный пейзаж')
+        self.assertEqual(self.client.get(reverse('photos:photos_by_tag',
+                                                 kwargs={'tag_slug': 'nothing'})).status_code, 200)
+
+        listed = self.client.get(reverse('photos:photo_list'), {'tag': 'Горный пейзаж'})
+        self.assertEqual(list(listed.context['photos']), [self.photo])
+
+    def test_name_cache_keyed_by_exact_name(self):
+        self.photo.tags.add('природа', 'ёжик')
+        url = reverse('photos:photo_list')
+        # Другие написания могут не найтись (iexact в SQLite - только ASCII),
+        # но их промах не должен попадать в кэш точного названия
+        self.client.get(url, {'tag': 'ПРИРОДА'})
+        self.client.get(url, {'tag': 'ежик'})
+        self.assertEqual(resolve_tag_name('природа').name, 'природа')
+        self.assertEqual(resolve_tag_name('ёжик').name, 'ёжик')
+        listed = self.client.get(url, {'tag': 'ёжик'})
+        self.assertEqual(list(listed.context['photos']), [self.photo])
+
+
+class TagUsageTest(PhotoTestCase):
+    """Счётчики тегов и веса облака поддерживаются сигналами"""
+
+    def setUp(self):
+        cache.clear()
+        self.photos = [self.create_photo(title=f'Фото {i}') for i in range(4)]
+        for photo in self.photos:
+            photo.tags.add('горы')
+        self.photos[0].tags.add('закат')
+
+    def usage(self):
+        return {usage.tag.name: (usage.photo_count, usage.weight)
+                for usage in TagUsage.objects.select_related('tag')}
+
+    def assert_matches_rebuild(self):
+        usage = self.usage()
+        TagUsage.rebuild()
+        self.assertEqual(usage, self.usage())
+
+    def test_counts_and_weights(self):
+        self.assertEqual(TagUsage.weight_thresholds(16), [1, 2, 4, 8, 16])
+        self.assertEqual(self.usage(), {'горы': (4, 5), 'закат': (1, 1)})
+
+        self.photos[1].tags.add('закат')
+        self.photos[2].tags.add('закат')
+        self.assertEqual(self.usage()['закат'], (3, 4))
+        self.photos[3].delete()
+        self.photos[0].tags.remove('горы')
+        self.photos[1].tags.clear()
+        Tag.objects.create(name='пустой')
+        self.assertEqual(self.usage(), {'горы': (1, 1), 'закат': (2, 5), 'пустой': (0, 0)})
+        self.assert_matches_rebuild()
+
+    def test_popular_tags(self):
+        with self.assertNumQueries(1):
+            tags = Photo.custom.get_popular_tags(1)
+        self.assertEqual([(tag.name, tag.num_times) for tag in tags], [('горы', 4)])
+
+    def test_tag_list(self):
+        # Облако тегов и статистика, без COUNT пагинатора
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('photos:tag_list'))
+        self.assertEqual(response.context['stats'],
+                         {'total_tags': 2, 'max_photos': 4, 'avg_photos': 2.5})
+        self.assertContains(response, 'tag-weight-5')
+        self.assertEqual([usage.tag.name for usage in response.context['tag_usages']],
+                         ['горы', 'закат'])
+
+
+class TagDiffTest(PhotoTestCase):
+    """Теги фотографии записываются разницей с текущими в одной транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        tag_index.invalidate()
+        self.user = User.objects.create_user('author', password='password123')
+        self.photo = self.create_photo(uploaded_by=self.user, category_type='NATURE')
+        set_photo_tags(self.photo, ['горы', 'закат'])
+        self.changes = []
+        m2m_changed.connect(self.record, sender=Photo.tags.through)
+        self.addCleanup(m2m_changed.disconnect, self.record, sender=Photo.tags.through)
+
+    def record(self, action, pk_set, **kwargs):
+        if action.startswith('post_'):
+            self.changes.append((action, {Tag.objects.get(pk=pk).name for pk in pk_set}))
+
+    def tag_names(self):
+        return sorted(self.photo.tags.names())
+
+    def test_parse_tag_names(self):
+        self.assertEqual(parse_tag_names(' горы, ,закат,горы '), ['горы', 'закат'])
+        self.assertEqual(parse_tag_names(None), [])
+
+    def test_unchanged_tags_are_not_written(self):
+        with self.assertNumQueries(3):  # SAVEPOINT, текущие теги, RELEASE
+            self.assertEqual(set_photo_tags(self.photo, ['закат', 'горы']), (set(), set()))
+        self.assertEqual(self.changes, [])
+
+    def test_only_difference_is_written(self):
+        old_slugs = dict(Tag.objects.values_list('name', 'slug'))
+        set_photo_tags(self.photo, ['горы', 'Озеро', 'лес'])
+        self.assertEqual(self.changes, [('post_remove', {'закат'}), ('post_add', {'Озеро', 'лес'})])
+        self.assertEqual(self.tag_names(), ['Озеро', 'горы', 'лес'])
+        slugs = dict(Tag.objects.values_list('name', 'slug'))
+        self.assertEqual((slugs['Озеро'], slugs['лес'], slugs['горы']),
+                         ('ozero', 'les', old_slugs['горы']))
+
+        usage = {usage.tag.name: usage.photo_count
+                 for usage in TagUsage.objects.select_related('tag')}
+        self.assertEqual(usage, {'горы': 1, 'закат': 0, 'Озеро': 1, 'лес': 1})
+        self.assertEqual([tag['name'] for tag in tag_index.search('оз')], ['Озеро'])
+        self.assertEqual(tag_index.search('зак'), [])
+        self.assertEqual(SearchResults('озеро').count(), 1)
+        self.assertEqual(resolve_tag('ozero').name, 'Озеро')
+
+    def test_slug_collision(self):
+        Tag.objects.create(name='les', slug='les')
+        set_photo_tags(self.photo, ['лес'])
+        self.assertEqual(Tag.objects.get(name='лес').slug, 'les_1')
+
+    def test_edit_view_writes_tags_once(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('photos:edit_photo', kwargs={'slug': self.photo.slug}), {
+            'title': 'Фото', 'description': 'Описание фотографии',
+            'category_type': 'NATURE', 'tags': 'горы, море',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.changes, [('post_remove', {'закат'}), ('post_add', {'море'})])
+        self.assertEqual(self.tag_names(), ['горы', 'море'])
+
+    def test_upload_views(self):
+        self.client.force_login(self.user)
+        for name in ('photos:upload_photo', 'photos:upload_photo_non_model'):
+            self.client.post(reverse(name), {
+                'title': 'Новое фото', 'description': 'Описание фотографии',
+                'category_type': 'NATURE', 'tags': 'горы, горы, лес', 'image': make_image(),
+            })
+        self.assertEqual(self.changes, [('post_add', {'горы', 'лес'})] * 2)
+        self.assertEqual(TagUsage.objects.get(tag__name='горы').photo_count, 3)
@@ -0,0 +1,80 @@
+import hashlib
+
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+# Запас на текстовые поля формы и служебные заголовки multipart
+MAX_REQUEST_SIZE = MAX_UPLOAD_SIZE + 256 * 1024
+
+# Сигнатуры (magic bytes) поддерживаемых форматов
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+SIGNATURE_LENGTH = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+SIZE_ERROR = 'Размер файла не должен превышать 10MB'
+TYPE_ERROR = 'Файл должен быть изображением в формате JPG, PNG или GIF'
+
+
+def sniff_image_type(header):
+    """Определяет тип изображения по первым байтам файла"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Потоково пишет загружаемые файлы во временный файл и прерывает
+    загрузку, как только файл превысил MAX_UPLOAD_SIZE или его первые
+    байты не похожи на изображение. Заголовок Content-Type от клиента
+    заменяется типом, определённым по содержимому, а SHA-256 файла
+    считается по ходу загрузки и сохраняется в uploaded_file.sha256.
+
+    Причина отказа сохраняется в request.upload_errors.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None and not hasattr(request, 'upload_errors'):
+            request.upload_errors = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b''
+        self.sniffed_type = None
+        self.sha256 = hashlib.sha256()
+
+    def reject(self, message):
+        self.request.upload_errors.append(message)
+        raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_UPLOAD_SIZE:
+            self.reject(SIZE_ERROR)
+
+        if self.sniffed_type is None and len(self.header) < SIGNATURE_LENGTH:
+            self.header += raw_data[:SIGNATURE_LENGTH - len(self.header)]
+            if len(self.header) >= SIGNATURE_LENGTH:
+                self.check_header()
+
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_header(self):
+        self.sniffed_type = sniff_image_type(self.header)
+        if self.sniffed_type is None:
+            self.reject(TYPE_ERROR)
+
+    def file_complete(self, file_size):
+        if self.sniffed_type is None:
+            # Файл короче самой длинной сигнатуры
+            self.check_header()
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_type = self.sniffed_type
+        uploaded_file.sha256 = self.sha256.hexdigest()
+        return uploaded_file
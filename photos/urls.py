@@ -1,4 +1,4 @@
-from django.urls import path, register_converter, re_path
+from django.urls import path, register_converter
 from . import views, converters
 
 register_converter(converters.StringConverter, 'string')
@@ -18,16 +18,21 @@ urlpatterns = [
     path('photo/<slug:slug>/delete/',
          views.DeletePhotoView.as_view(),
          name='delete_photo'),
+    path('photo/<slug:slug>/react/',
+         views.toggle_reaction,
+         name='toggle_reaction'),
     path('year/<year:year>/',
          views.PhotosByYearView.as_view(),
          name='photos_by_year'),
-    path('tag/<slug:tag_slug>/',
+    path('tag/<string:tag_slug>/',
          views.PhotosByTagView.as_view(),
          name='photos_by_tag'),
     path('category/<slug:category_slug>/',
          views.PhotosByCategoryView.as_view(),
          name='photos_by_category'),
+    path('search/', views.PhotoSearchView.as_view(), name='search'),
     path('tags/', views.TagListView.as_view(), name='tag_list'),
+    path('tags/autocomplete/', views.tag_autocomplete, name='tag_autocomplete'),
     path('stats/', views.StatsView.as_view(), name='stats'),
     path('redirect/',
          views.RedirectToHomeView.as_view(),
@@ -39,10 +44,6 @@ urlpatterns = [
     path('upload-non-model/',
          views.UploadPhotoNonModelView.as_view(),
          name='upload_photo_non_model'),
-    # Кириллица
-    re_path(r'^tag/(?P<tag_slug>[\w\-а-яё]+)/$',
-            views.PhotosByTagView.as_view(),
-            name='photos_by_tag'),
     # Маршруты для комментариев
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
     path('comment/<int:comment_id>/edit/', views.edit_comment, name='edit_comment'),
@@ -1,3 +1,14 @@
+from django.contrib import messages
+from django.http import Http404
+from django.shortcuts import redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .fragments import render_photo_cards
+from .pagination import CursorPaginator, InvalidCursor
+from .uploadhandlers import ImageUploadHandler, MAX_REQUEST_SIZE, SIZE_ERROR
+
+
 class DataMixin:
     """Mixin class to provide common context data across multiple CBVs"""
     title_page = None
@@ -41,3 +52,86 @@ class DataMixin:
         context.update(kwargs)
 
         return context
+
+
+class ImageUploadMixin:
+    """
+    Mixin for views that accept photo uploads.
+
+    Requests whose Content-Length is above MAX_REQUEST_SIZE are rejected
+    before the body is read; the rest are parsed by ImageUploadHandler,
+    which streams the file to disk and aborts on oversized or non-image
+    data. Must be first in the bases so that csrf_exempt on dispatch is
+    picked up by as_view().
+    """
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        # CsrfViewMiddleware reads request.POST before the view runs, so the
+        # upload handlers can only be replaced if the CSRF check is done here
+        if request.method == 'POST':
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = 0
+            if content_length > MAX_REQUEST_SIZE:
+                return self._reject_upload(request, *args, **kwargs)
+            request.upload_handlers = [ImageUploadHandler(request)]
+        return self._protected_dispatch(request, *args, **kwargs)
+
+    @method_decorator(csrf_protect)
+    def _protected_dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def _reject_upload(self, request, *args, **kwargs):
+        # The body is never read; the form is shown again via GET
+        messages.error(request, SIZE_ERROR)
+        return redirect(request.get_full_path())
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        for error in getattr(self.request, 'upload_errors', []):
+            form.add_error('image', error)
+        return form
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin: keyset pagination on (uploaded_at, id) via ?after= and
+    ?before= cursors for querysets ordered by uploaded_at. Any other
+    ordering falls back to the regular page-number paginator.
+    Set paginate_count to show the total (costs one COUNT(*) query).
+    """
+    paginate_count = False
+    cursor_orderings = {'-uploaded_at': True, 'uploaded_at': False}
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = tuple(queryset.query.order_by)
+        if len(ordering) != 1 or ordering[0] not in self.cursor_orderings:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(
+            queryset, page_size, descending=self.cursor_orderings[ordering[0]])
+        try:
+            page = paginator.page(after=self.request.GET.get('after'),
+                                  before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Неверный курсор страницы')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['paginate_count'] = self.paginate_count
+        return context
+
+
+class PhotoCardsMixin:
+    """
+    ListView mixin: attaches the cached card fragment (photo.card_html) to
+    every photo on the page, see fragments.render_photo_cards.
+    """
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        render_photo_cards(context['object_list'])
+        return context
@@ -1,17 +1,26 @@
-from django.db.models.functions import ExtractYear
 from django.shortcuts import render, get_object_or_404, redirect, Http404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.models import User
 from django.contrib import messages
-from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
 from django.urls import reverse_lazy
-from .models import Photo, Category, PhotoCategory, Comment, PhotoLike
+from .models import Photo, Category, PhotoCategory, Comment, PhotoLike, PhotoStat, TagUsage
 from .forms import CommentForm, PhotoForm, PhotoUploadForm
-from .utils import DataMixin
-from django.db.models import Count, Avg, Max, Value, FloatField, ExpressionWrapper, IntegerField, F
-from datetime import date
+from .utils import CursorPaginationMixin, DataMixin, ImageUploadMixin, PhotoCardsMixin
+from .cache import get_photo_list_stats, get_photo_neighbours
+from .comments import comment_page
+from .fragments import render_photo_sidebar
+from .pagecache import AnonymousPageCacheMixin, photo_page_groups
+from .search import SearchResults
+from .tagging import parse_tag_names, resolve_tag, resolve_tag_name, set_photo_tags
+from .autocomplete import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, tag_index
+from django.db import transaction
+from django.db.models import Count, Avg, Max
+from django.db.models.functions import Coalesce
 
 
 class RedirectToHomeView(View):
@@ -52,7 +61,7 @@ class SimplePhotoView(View):
         return self.get(request, *args, **kwargs)
 
 
-class UploadPhotoView(DataMixin, CreateView):
+class UploadPhotoView(ImageUploadMixin, DataMixin, CreateView):
     """Загрузка фотографии"""
     model = Photo
     form_class = PhotoForm
@@ -69,22 +78,15 @@ class UploadPhotoView(DataMixin, CreateView):
             'Форма связанная с моделью (использует upload_to)'
         })
 
+    def get_success_url(self):
+        return reverse_lazy('photos:photo_detail_slug',
+                            kwargs={'slug': self.object.slug})
+
     def form_valid(self, form):
         try:
-            photo = form.save(commit=False)
+            # Фотография с тегами сохраняется один раз - в form.save()
             if self.request.user.is_authenticated:
-                photo.uploaded_by = self.request.user
-            photo.save()
-
-            tags_text = form.cleaned_data.get('tags', '')
-            if tags_text:
-                tags_list = [
-                    tag.strip() for tag in tags_text.split(',') if tag.strip()
-                ]
-                photo.tags.add(*tags_list)
-
-            self.success_url = reverse_lazy('photos:photo_detail_slug',
-                                            kwargs={'slug': photo.slug})
+                form.instance.uploaded_by = self.request.user
             return super().form_valid(form)
         except Exception as e:
             messages.error(self.request, f'Ошибка при загрузке: {str(e)}')
@@ -95,7 +97,7 @@ class UploadPhotoView(DataMixin, CreateView):
         return super().form_invalid(form)
 
 
-class UploadPhotoNonModelView(DataMixin, FormView):
+class UploadPhotoNonModelView(ImageUploadMixin, DataMixin, FormView):
     """Загрузка фотографии с использованием обычной формы"""
     form_class = PhotoUploadForm
     template_name = 'photos/upload_photo_non_model.html'
@@ -122,15 +124,9 @@ class UploadPhotoNonModelView(DataMixin, FormView):
             if self.request.user.is_authenticated:
                 photo.uploaded_by = self.request.user
 
-            photo.save()
-
-            # Работа с тегами
-            tags_text = form.cleaned_data.get('tags', '')
-            if tags_text:
-                tags_list = [
-                    tag.strip() for tag in tags_text.split(',') if tag.strip()
-                ]
-                photo.tags.add(*tags_list)
+            with transaction.atomic():
+                photo.save()
+                set_photo_tags(photo, parse_tag_names(form.cleaned_data.get('tags')))
 
             self.success_url = reverse_lazy('photos:photo_detail_slug',
                                             kwargs={'slug': photo.slug})
@@ -144,7 +140,7 @@ class UploadPhotoNonModelView(DataMixin, FormView):
         return super().form_invalid(form)
 
 
-class EditPhotoView(DataMixin, LoginRequiredMixin, UpdateView):
+class EditPhotoView(ImageUploadMixin, DataMixin, LoginRequiredMixin, UpdateView):
     """Редактирование фотографии"""
     model = Photo
     form_class = PhotoForm
@@ -174,19 +170,10 @@ class EditPhotoView(DataMixin, LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         try:
-            updated_photo = form.save()
-
-            # Редактирование тегов
-            tags_text = form.cleaned_data.get('tags', '')
-            updated_photo.tags.clear()
-            if tags_text:
-                tags_list = [
-                    tag.strip() for tag in tags_text.split(',') if tag.strip()
-                ]
-                updated_photo.tags.add(*tags_list)
-
+            # Теги сохраняет form.save(): меняются только добавленные и снятые
+            response = super().form_valid(form)
             messages.success(self.request, 'Фотография успешно обновлена!')
-            return super().form_valid(form)
+            return response
         except Exception as e:
             messages.error(self.request, f'Ошибка при обновлении: {str(e)}')
             return self.form_invalid(form)
@@ -207,7 +194,7 @@ class DeletePhotoView(DataMixin, DeleteView):
     model = Photo
     template_name = 'photos/delete_photo.html'
     slug_url_kwarg = 'slug'
-    success_url = reverse_lazy('photo_list')
+    success_url = reverse_lazy('photos:photo_list')
     title_page = 'Удалить фотографию'
 
     def get_object(self, queryset=None):
@@ -219,23 +206,20 @@ class DeletePhotoView(DataMixin, DeleteView):
             raise Http404("Нет прав для удаления")
         return obj
 
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
+        # Файл и миниатюры удаляет сигнал post_delete, когда на файл
+        # больше не ссылается ни одна фотография
         try:
-            self.object = self.get_object()
-            # Удаляем файл с сервера
-            if self.object.image:
-                default_storage.delete(self.object.image.name)
-
             success_url = self.get_success_url()
             self.object.delete()
-            messages.success(request, 'Фотография успешно удалена!')
+            messages.success(self.request, 'Фотография успешно удалена!')
             return redirect(success_url)
         except Exception as e:
-            messages.error(request, f'Ошибка при удалении: {str(e)}')
+            messages.error(self.request, f'Ошибка при удалении: {str(e)}')
             return redirect('photos:photo_detail_slug', slug=self.object.slug)
 
 
-class PhotosByYearView(DataMixin, ListView):
+class PhotosByYearView(PhotoCardsMixin, CursorPaginationMixin, DataMixin, ListView):
     """Список фото по годам"""
     model = Photo
     template_name = 'photos/photos_by_year.html'
@@ -243,21 +227,22 @@ class PhotosByYearView(DataMixin, ListView):
 
     def get_queryset(self):
         year = self.kwargs['year']
-        return Photo.objects.filter(uploaded_at__year=year)
+        return Photo.custom.for_cards().filter(
+            uploaded_at__year=year).order_by('-uploaded_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         year = self.kwargs['year']
-        years = Photo.objects.dates('uploaded_at',
-                                    'year').values_list('uploaded_at__year',
-                                                        flat=True)
+        # Годы с фотографиями берутся из счётчиков, а не из всей таблицы фото
+        years = sorted(int(key) for key in PhotoStat.objects.filter(
+            dimension=PhotoStat.YEAR, photo_count__gt=0).values_list('key', flat=True))
         return self.get_mixin_context(context,
                                       year=year,
                                       years=years,
                                       title=f'Фотографии за {year} год')
 
 
-class PhotosByCategoryView(DataMixin, ListView):
+class PhotosByCategoryView(PhotoCardsMixin, CursorPaginationMixin, DataMixin, ListView):
     """Список фото по категориям"""
     model = Photo
     template_name = 'photos/photos_by_category.html'
@@ -265,7 +250,8 @@ class PhotosByCategoryView(DataMixin, ListView):
 
     def get_queryset(self):
         category_slug = self.kwargs['category_slug']
-        return Photo.objects.filter(category_type=category_slug.upper())
+        return Photo.custom.for_cards().filter(
+            category_type=category_slug.upper()).order_by('-uploaded_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -287,7 +273,8 @@ class HomeView(DataMixin, TemplateView):
         return self.get_mixin_context(context, recent_photos=recent_photos)
 
 
-class PhotoListView(DataMixin, ListView):
+class PhotoListView(AnonymousPageCacheMixin, PhotoCardsMixin, CursorPaginationMixin, DataMixin,
+                    ListView):
     """Список фотографий с пагинацией"""
     model = Photo
     template_name = 'photos/photo_list.html'
@@ -299,13 +286,14 @@ class PhotoListView(DataMixin, ListView):
         category_filter = self.request.GET.get('category_type', None)
         tag_filter = self.request.GET.get('tag', None)
 
-        photos = Photo.objects.all()
+        photos = Photo.custom.for_cards()
 
         if category_filter:
             photos = photos.filter(category_type=category_filter)
 
         if tag_filter:
-            photos = photos.filter(tags__name=tag_filter)
+            tag = resolve_tag_name(tag_filter)
+            photos = photos.filter(tags__id=tag.id) if tag else photos.none()
 
         return photos.order_by(sort_by)
 
@@ -317,55 +305,32 @@ class PhotoListView(DataMixin, ListView):
         tag_filter = self.request.GET.get('tag', None)
         sort_by = self.request.GET.get('sort', '-uploaded_at')
 
-        # Получаем данные для фильтров
-        years = Photo.objects.dates('uploaded_at',
-                                    'year').values_list('uploaded_at__year',
-                                                        flat=True)
-
+        # Данные для фильтров и статистика берутся из кэша
+        stats = get_photo_list_stats()
         categories = PhotoCategory.choices()  # Это возвращает список кортежей (type, name)
 
-        popular_tags = Photo.tags.most_common()[:10]
-
-        # Статистика
-        category_counts = []
-        for category_type in PhotoCategory.choices():
-            count = Photo.objects.filter(category_type=category_type).count()
-            category_counts.append(count)
-
-        avg_photos_per_category = sum(category_counts) / len(
-            category_counts) if category_counts else 0
-
-        stats = {
-            'total_photos':
-            Photo.objects.count(),
-            'avg_photos_per_category':
-            avg_photos_per_category,
-            'latest_photo':
-            Photo.objects.latest('uploaded_at')
-            if Photo.objects.exists() else None,
-            'earliest_photo':
-            Photo.objects.earliest('uploaded_at')
-            if Photo.objects.exists() else None,
-        }
-
         return self.get_mixin_context(
             context,
-            years=years,
+            years=stats['years'],
             categories=categories,
-            popular_tags=popular_tags,
+            popular_tags=stats['popular_tags'],
             current_category=category_filter,
             current_tag=tag_filter,
             current_sort=sort_by,
             stats=stats)
 
 
-class PhotoDetailView(DataMixin, DetailView):
+class PhotoDetailView(AnonymousPageCacheMixin, DataMixin, DetailView):
     """Подробная карточка фотографии с комментариями"""
     model = Photo
     template_name = 'photos/photo_detail.html'
     context_object_name = 'photo'
     slug_url_kwarg = 'slug'
 
+    def get_page_cache_groups(self):
+        return super().get_page_cache_groups() + photo_page_groups(
+            self.kwargs.get('pk'), self.kwargs.get('slug'))
+
     def get_object(self, queryset=None):
         pk = self.kwargs.get('pk')
         slug = self.kwargs.get('slug')
@@ -387,12 +352,12 @@ class PhotoDetailView(DataMixin, DetailView):
         context = super().get_context_data(**kwargs)
         photo = self.object
 
-        prev_photo = photo.get_previous_photo()
-        next_photo = photo.get_next_photo()
+        # Соседи считаются одним запросом и кэшируются для каждой фотографии
+        neighbours = get_photo_neighbours(photo)
         related_photos = photo.get_related_photos()
         
-        # Получаем комментарии (только родительские, без ответов)
-        comments = photo.comments.filter(parent=None).select_related('user').order_by('-created_at')
+        # Всё обсуждение одним запросом; на странице - корневые комментарии с ветками
+        comments = comment_page(photo, self.request.GET.get('comments_page'))
         
         # Формы для комментариев
         comment_form = CommentForm()
@@ -403,9 +368,12 @@ class PhotoDetailView(DataMixin, DetailView):
             user_reaction = photo.user_reaction(self.request.user)
 
         return self.get_mixin_context(context,
-                                      prev_photo=prev_photo,
-                                      next_photo=next_photo,
+                                      prev_photo=neighbours['previous'],
+                                      next_photo=neighbours['next'],
+                                      prev_in_category=neighbours['previous_in_category'],
+                                      next_in_category=neighbours['next_in_category'],
                                       related_photos=related_photos,
+                                      photo_sidebar=render_photo_sidebar(photo),
                                       comments=comments,
                                       comment_form=comment_form,
                                       user_reaction=user_reaction,
@@ -422,23 +390,18 @@ class PhotoDetailView(DataMixin, DetailView):
                 messages.warning(request, 'Для оценки фотографий необходимо войти в систему.')
                 return redirect('photos:photo_detail_slug', slug=photo.slug)
             
-            action = request.POST.get('like_action')
             try:
-                existing_like = PhotoLike.objects.get(user=request.user, photo=photo)
-                if existing_like.value == int(action):
-                    # Если пользователь нажал на ту же кнопку - убираем оценку
-                    existing_like.delete()
-                    messages.info(request, 'Оценка убрана.')
-                else:
-                    # Меняем оценку
-                    existing_like.value = int(action)
-                    existing_like.save()
-                    action_text = 'лайк' if int(action) == 1 else 'дизлайк'
-                    messages.success(request, f'Поставлен {action_text}!')
-            except PhotoLike.DoesNotExist:
-                # Создаем новую оценку
-                PhotoLike.objects.create(user=request.user, photo=photo, value=int(action))
-                action_text = 'лайк' if int(action) == 1 else 'дизлайк'
+                action = int(request.POST.get('like_action'))
+            except (TypeError, ValueError):
+                action = None
+            if action not in (1, -1):
+                messages.error(request, 'Неверная оценка.')
+                return redirect('photos:photo_detail_slug', slug=photo.slug)
+
+            if photo.toggle_reaction(request.user, action) is None:
+                messages.info(request, 'Оценка убрана.')
+            else:
+                action_text = 'лайк' if action == 1 else 'дизлайк'
                 messages.success(request, f'Поставлен {action_text}!')
             
             return redirect('photos:photo_detail_slug', slug=photo.slug)
@@ -460,9 +423,8 @@ class PhotoDetailView(DataMixin, DetailView):
                 parent_id = request.POST.get('parent_id')
                 if parent_id:
                     try:
-                        parent_comment = Comment.objects.get(id=parent_id, photo=photo)
-                        Comment.parent = parent_comment
-                    except comment.DoesNotExist:
+                        comment.parent = Comment.objects.get(id=parent_id, photo=photo)
+                    except (Comment.DoesNotExist, ValueError):
                         pass
                 
                 comment.save()
@@ -476,46 +438,30 @@ class PhotoDetailView(DataMixin, DetailView):
         return redirect('photos:photo_detail_slug', slug=photo.slug)
 
 
-class PhotosByTagView(DataMixin, ListView):
+class PhotosByTagView(PhotoCardsMixin, CursorPaginationMixin, DataMixin, ListView):
     """Отображение фотографий по тегу"""
     model = Photo
     template_name = 'photos/photos_by_tag.html'
     context_object_name = 'photos'
+    paginate_count = True
 
-    def get_queryset(self):
-        tag_slug = self.kwargs['tag_slug']
-        from taggit.models import Tag # type: ignore
+    def get(self, request, *args, **kwargs):
+        # Тег ищется один раз за запрос; адрес по названию или по старому
+        # кириллическому слагу перенаправляется на канонический
+        self.tag = resolve_tag(self.kwargs['tag_slug'])
+        if self.tag is not None and self.tag.slug != self.kwargs['tag_slug']:
+            return redirect('photos:photos_by_tag', tag_slug=self.tag.slug, permanent=True)
+        return super().get(request, *args, **kwargs)
 
-        try:
-            # Пытаемся найти тег по slug
-            tag = Tag.objects.get(slug=tag_slug)
-            return Photo.objects.filter(tags__slug=tag_slug).distinct()
-        except Tag.DoesNotExist:
-            try:
-                # Пытаемся найти тег по возможному варианту (кириллица)
-                possible_name = tag_slug.replace('-', ' ')
-                tag = Tag.objects.get(name__iexact=possible_name)
-                return Photo.objects.filter(
-                    tags__name__iexact=possible_name).distinct()
-            except Tag.DoesNotExist:
-                return Photo.objects.none()
+    def get_queryset(self):
+        if self.tag is None:
+            return Photo.objects.none()
+        return Photo.custom.for_cards().filter(tags__id=self.tag.id).order_by('-uploaded_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         tag_slug = self.kwargs['tag_slug']
-
-        from taggit.models import Tag # type: ignore
-        try:
-            tag = Tag.objects.get(slug=tag_slug)
-            tag_name = tag.name
-        except Tag.DoesNotExist:
-            try:
-                possible_name = tag_slug.replace('-', ' ')
-                tag = Tag.objects.get(name__iexact=possible_name)
-                tag_name = tag.name
-            except Tag.DoesNotExist:
-                tag_name = tag_slug.replace('-', ' ')
-
+        tag_name = self.tag.name if self.tag else tag_slug.replace('-', ' ')
         return self.get_mixin_context(context,
                                       tag={
                                           'name': tag_name,
@@ -524,37 +470,51 @@ class PhotosByTagView(DataMixin, ListView):
                                       title=f'Фотографии с тегом: {tag_name}')
 
 
-class TagListView(DataMixin, ListView):
+class PhotoSearchView(AnonymousPageCacheMixin, PhotoCardsMixin, DataMixin, ListView):
+    """Полнотекстовый поиск по заголовку, описанию, тегам и автору"""
+    template_name = 'photos/search.html'
+    context_object_name = 'photos'
+    title_page = 'Поиск'
+
+    def get_search_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        # Результаты упорядочены по релевантности; страница - срез по рангу
+        query = self.get_search_query()
+        return SearchResults(query) if query else []
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.get_search_query()
+        return self.get_mixin_context(context,
+                                      query=query,
+                                      title=f'Поиск: {query}' if query else self.title_page)
+
+
+class TagListView(AnonymousPageCacheMixin, DataMixin, ListView):
     """Показать все теги"""
     template_name = 'photos/tag_list.html'
-    context_object_name = 'tags'
+    context_object_name = 'tag_usages'
     title_page = 'Все теги'
+    # Облако - первые cloud_size тегов по индексу, без пагинатора и его COUNT
+    paginate_by = None
+    cloud_size = 200
 
     def get_queryset(self):
-        from taggit.models import Tag # type: ignore
-        from django.db.models import Count
-        return Tag.objects.annotate(photo_count=Count(
-            'taggit_taggeditem_items')).order_by('-photo_count')
+        # Счётчики и веса предрассчитаны в TagUsage, сортировка - по индексу
+        return TagUsage.objects.select_related('tag').order_by(
+            '-photo_count', 'tag')[:self.cloud_size]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        tags = self.get_queryset()
-
-        stats = {
-            'total_tags':
-            tags.count(),
-            'max_photos':
-            tags.aggregate(Max('photo_count'))['photo_count__max']
-            if tags.exists() else 0,
-            'avg_photos':
-            tags.aggregate(Avg('photo_count'))['photo_count__avg']
-            if tags.exists() else 0,
-        }
-
+        stats = TagUsage.objects.aggregate(total_tags=Count('pk'),
+                                           max_photos=Coalesce(Max('photo_count'), 0),
+                                           avg_photos=Coalesce(Avg('photo_count'), 0.0))
         return self.get_mixin_context(context, stats=stats)
 
 
-class StatsView(DataMixin, TemplateView):
+class StatsView(AnonymousPageCacheMixin, DataMixin, TemplateView):
     """Показать статистику"""
     template_name = 'photos/stats.html'
     title_page = 'Статистика'
@@ -562,13 +522,19 @@ class StatsView(DataMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        total_photos = Photo.objects.count()
+        # Категории и годы - несколько десятков строк; авторы не загружаются целиком
+        rows = list(PhotoStat.objects.filter(
+            dimension__in=[PhotoStat.CATEGORY, PhotoStat.YEAR]))
+        category_rows = [row for row in rows if row.dimension == PhotoStat.CATEGORY]
+        category_stats = {row.key: row.photo_count for row in category_rows}
+        total_photos = sum(category_stats.values())
+        earliest_uploaded_at, latest_uploaded_at = PhotoStat.upload_bounds(category_rows)
 
         categories_with_counts = []
         categories_with_percentages = []
 
         for category_type, category_name in PhotoCategory.choices():
-            count = Photo.objects.filter(category_type=category_type).count()
+            count = category_stats.get(category_type, 0)
             categories_with_counts.append({
                 'name': category_name,
                 'photo_count': count
@@ -585,25 +551,24 @@ class StatsView(DataMixin, TemplateView):
                 'percentage': percentage
             })
 
-        photos_per_year = Photo.objects.annotate(
-            year=ExtractYear('uploaded_at')).values('year').annotate(
-                count=Count('id'),
-                percentage=ExpressionWrapper(
-                    Count('id') * Value(100.0) /
-                    Value(total_photos) if total_photos > 0 else Value(0.0),
-                    output_field=FloatField())).order_by('year')
-
-        photos_with_age = Photo.objects.annotate(
-            age=ExpressionWrapper(Value(date.today().year) -
-                                  ExtractYear('uploaded_at'),
-                                  output_field=IntegerField()))
-
-        latest_photo = Photo.objects.latest(
-            'uploaded_at') if Photo.objects.exists() else None
-        earliest_photo = Photo.objects.earliest(
-            'uploaded_at') if Photo.objects.exists() else None
-        first_photo = Photo.objects.order_by('id').first()
-        last_photo = Photo.objects.order_by('id').last()
+        photos_per_year = [{
+            'year': int(row.key),
+            'count': row.photo_count,
+            'percentage': (row.photo_count * 100.0) / total_photos if total_photos > 0 else 0.0,
+        } for row in rows if row.dimension == PhotoStat.YEAR and row.photo_count]
+        photos_per_year.sort(key=lambda row: row['year'])
+
+        # Десять самых активных по индексу photostat_top_idx
+        uploader_counts = [
+            (int(key), count) for key, count in PhotoStat.objects.filter(
+                dimension=PhotoStat.UPLOADER, photo_count__gt=0).order_by(
+                    '-photo_count').values_list('key', 'photo_count')[:10]]
+        users = User.objects.in_bulk([user_id for user_id, _ in uploader_counts])
+        active_users = []
+        for user_id, count in uploader_counts:
+            if user_id in users:
+                users[user_id].photo_count = count
+                active_users.append(users[user_id])
 
         return self.get_mixin_context(
             context,
@@ -611,11 +576,9 @@ class StatsView(DataMixin, TemplateView):
             categories_with_counts=categories_with_counts,
             categories_with_percentages=categories_with_percentages,
             photos_per_year=photos_per_year,
-            photos_with_age=photos_with_age,
-            latest_photo=latest_photo,
-            earliest_photo=earliest_photo,
-            first_photo=first_photo,
-            last_photo=last_photo)
+            active_users=active_users,
+            latest_uploaded_at=latest_uploaded_at,
+            earliest_uploaded_at=earliest_uploaded_at)
 
 
 @login_required
@@ -659,3 +622,39 @@ def edit_comment(request, comment_id):
         'title': 'Редактировать комментарий'
     }
     return render(request, 'photos/edit_comment.html', context)
+
+
+@require_POST
+def toggle_reaction(request, slug):
+    """Лайк/дизлайк через AJAX: возвращает новые счётчики в JSON"""
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'error': 'Для оценки фотографий необходимо войти в систему.'},
+            status=401)
+
+    try:
+        value = int(request.POST.get('value'))
+    except (TypeError, ValueError):
+        value = None
+    if value not in (1, -1):
+        return JsonResponse({'error': 'Неверная оценка.'}, status=400)
+
+    photo = get_object_or_404(Photo.objects.only(
+        'pk', 'slug', 'likes_count', 'dislikes_count', 'score'), slug=slug)
+    reaction = photo.toggle_reaction(request.user, value)
+
+    return JsonResponse({
+        'reaction': reaction,
+        'likes_count': photo.likes_count,
+        'dislikes_count': photo.dislikes_count,
+        'score': photo.score,
+    })
+
+
+def tag_autocomplete(request):
+    """Популярные теги по началу названия (без учёта регистра и "ё") в JSON"""
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), MAX_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    return JsonResponse({'tags': tag_index.search(request.GET.get('q', ''), max(limit, 1))})
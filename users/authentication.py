@@ -1,25 +1,119 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.backends import BaseBackend, ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models.functions import Lower
 
-class EmailAuthBackend(BaseBackend):
+from .throttling import check_login
+
+# Пользователь сессии кэшируется целиком, вместе с хешем пароля: на запрос
+# не приходится ни одного обращения к БД. Сохранение и удаление пользователя
+# сбрасывают запись сигналом; изменения в обход сигналов (QuerySet.update())
+# и сброс в кэше другого процесса (LocMemCache) вступают в силу не позже
+# чем через USER_CACHE_TIMEOUT
+USER_CACHE_TIMEOUT = 30
+
+
+def user_cache_key(user_id):
+    return f'users:user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """Пользователь по pk: из кэша, при промахе - одним запросом за строкой"""
+    user_model = get_user_model()
+    manager = user_model._default_manager
+    fields = [field.attname for field in user_model._meta.concrete_fields]
+    key = user_cache_key(user_id)
+    values = cache.get(key)
+    # Запись, сохранённая до изменения модели пользователя, считается промахом
+    if values is None or list(values) != fields:
+        try:
+            user = manager.get(pk=user_id)
+        except (user_model.DoesNotExist, ValueError):
+            return None
+        cache.set(key, {name: getattr(user, name) for name in fields}, USER_CACHE_TIMEOUT)
+        return user
+    return user_model.from_db(manager.db, fields, [values[name] for name in fields])
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def users_with_email(email):
     """
-    Бэкенд для аутентификации пользователей по email адресу
+    Поиск по email без учёта регистра. Условие LOWER(email) = ... использует
+    индекс users_email_lower_idx (миграция users.0003).
+    """
+    return get_user_model()._default_manager.alias(
+        email_lower=Lower('email')).filter(email_lower=email.lower())
+
+
+def looks_like_email(username):
+    return '@' in (username or '')
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend с пользователем сессии из кэша.
+
+    Первым в AUTHENTICATION_BACKENDS, поэтому до любой проверки пароля
+    забирает токены ограничителя попыток входа. При исчерпании лимита
+    PermissionDenied останавливает django.contrib.auth.authenticate,
+    и остальные бэкенды не вызываются; request.login_throttled хранит
+    число секунд до следующей попытки.
+
+    Если логина нет, а введён email, холостое хеширование пароля
+    (защита от перебора по времени ответа) пропускается: его выполнит
+    EmailAuthBackend, так что на одну попытку входа приходится ровно одно
+    вычисление хеша.
     """
-    
+
     def authenticate(self, request, username=None, password=None, **kwargs):
         user_model = get_user_model()
-        try:
-            # Пытаемся найти пользователя по email
-            user = user_model.objects.get(email=username)
-            if user.check_password(password):
-                return user
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
             return None
+        retry_after = check_login(request, username)
+        if retry_after is not None:
+            if request is not None:
+                request.login_throttled = retry_after
+            raise PermissionDenied
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
         except user_model.DoesNotExist:
+            if not looks_like_email(username):
+                user_model().set_password(password)
             return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
 
     def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+class EmailAuthBackend(BaseBackend):
+    """
+    Бэкенд для аутентификации пользователей по email адресу
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if not looks_like_email(username) or password is None:
+            return None
         user_model = get_user_model()
-        try:
-            return user_model.objects.get(pk=user_id)
-        except user_model.DoesNotExist:
-            return None
\ No newline at end of file
+        # Два совпадения (адреса, различающиеся регистром) - неоднозначность,
+        # вход по email в этом случае не выполняется
+        users = list(users_with_email(username)[:2])
+        if len(users) != 1:
+            user_model().set_password(password)
+            return None
+        user = users[0]
+        if user.check_password(password):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        return get_cached_user(user_id)
@@ -5,6 +5,8 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.http import HttpResponseForbidden
 
+from .permissions import get_user_access
+
 
 def permission_required(permission, raise_exception=True):
     """
@@ -18,14 +20,14 @@ def permission_required(permission, raise_exception=True):
         @wraps(view_func)
         @login_required
         def _wrapped_view(request, *args, **kwargs):
-            if request.user.has_perm(permission):
+            if get_user_access(request).has_perm(permission):
                 return view_func(request, *args, **kwargs)
             else:
                 if raise_exception:
                     raise PermissionDenied("У вас нет прав для выполнения этого действия.")
                 else:
                     messages.error(request, "У вас нет прав для выполнения этого действия.")
-                    return redirect('photo_list')
+                    return redirect('photos:photo_list')
         return _wrapped_view
     return decorator
 
@@ -42,14 +44,14 @@ def group_required(group_name, raise_exception=True):
         @wraps(view_func)
         @login_required
         def _wrapped_view(request, *args, **kwargs):
-            if request.user.groups.filter(name=group_name).exists():
+            if get_user_access(request).in_group(group_name):
                 return view_func(request, *args, **kwargs)
             else:
                 if raise_exception:
                     raise PermissionDenied(f"Вы должны быть в группе '{group_name}' для выполнения этого действия.")
                 else:
                     messages.error(request, f"Вы должны быть в группе '{group_name}' для выполнения этого действия.")
-                    return redirect('photo_list')
+                    return redirect('photos:photo_list')
         return _wrapped_view
     return decorator
 
@@ -66,7 +68,8 @@ def multiple_permissions_required(permissions, require_all=True):
         @wraps(view_func)
         @login_required
         def _wrapped_view(request, *args, **kwargs):
-            user_permissions = [request.user.has_perm(perm) for perm in permissions]
+            access = get_user_access(request)
+            user_permissions = [access.has_perm(perm) for perm in permissions]
             
             if require_all:
                 has_permission = all(user_permissions)
@@ -1,8 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
-from django.contrib.auth.forms import UserCreationForm, PasswordResetForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm, PasswordResetForm
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from .authentication import users_with_email
 from .models import Profile
 
 
@@ -162,9 +163,9 @@ class UserRegistrationForm(UserCreationForm):
         self.fields['password2'].help_text = 'Введите тот же пароль для подтверждения.'
 
     def clean_email(self):
-        """Проверка уникальности email"""
+        """Проверка уникальности email (без учёта регистра, как при входе)"""
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email=email).exists():
+        if email and users_with_email(email).exists():
             raise ValidationError('Пользователь с таким email уже существует.')
         return email
 
@@ -189,6 +190,22 @@ class UserRegistrationForm(UserCreationForm):
         return user
 
 
+class LoginForm(AuthenticationForm):
+    """
+    Форма входа с отдельным сообщением об исчерпании лимита попыток
+    """
+
+    def get_invalid_login_error(self):
+        retry_after = getattr(self.request, 'login_throttled', None)
+        if retry_after is not None:
+            return ValidationError(
+                'Слишком много попыток входа. Повторите через %(seconds)s с.',
+                code='throttled',
+                params={'seconds': retry_after},
+            )
+        return super().get_invalid_login_error()
+
+
 class CustomPasswordResetForm(PasswordResetForm):
     """
     Кастомная форма для сброса пароля с проверкой существования email
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from users.throttling import LOGIN_RATES, throttle_metrics
+
+
+class Command(BaseCommand):
+    help = 'Статистика ограничителя попыток входа: проверено и отклонено по ключам'
+
+    def handle(self, *args, **options):
+        metrics = throttle_metrics()
+        self.stdout.write(f"Проверено попыток входа: {metrics['checked']}")
+        for scope, (capacity, period) in LOGIN_RATES.items():
+            self.stdout.write(
+                f"Отклонено по ключу {scope} (до {capacity} попыток за {period} с): "
+                f"{metrics[f'throttled:{scope}']}")
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс по LOWER(email) для входа по email без учёта регистра.
+    Модель auth.User не наша, поэтому индекс создаётся SQL-выражением
+    (поддерживается SQLite и PostgreSQL).
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_remove_profile_location_remove_profile_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX users_email_lower_idx ON auth_user (LOWER(email));',
+            'DROP INDEX users_email_lower_idx;',
+        ),
+    ]
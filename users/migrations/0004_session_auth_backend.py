@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+BACKEND_SESSION_KEY = '_auth_user_backend'
+OLD_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+NEW_BACKEND = 'users.authentication.CachedModelBackend'
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db',
+                      'django.contrib.sessions.backends.cached_db')
+
+
+def replace_backend(apps, old, new):
+    """
+    Сессии хранят путь бэкенда, через который выполнен вход, и действуют,
+    только пока он есть в AUTHENTICATION_BACKENDS. Путь заменяется в
+    сохранённых сессиях, чтобы смена бэкенда не завершила их.
+    """
+    if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+        return
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    store = SessionStore()
+    sessions = Session.objects.filter(expire_date__gt=timezone.now())
+    for key, session_data in sessions.values_list('session_key', 'session_data').iterator():
+        data = store.decode(session_data)
+        if data.get(BACKEND_SESSION_KEY) == old:
+            data[BACKEND_SESSION_KEY] = new
+            Session.objects.filter(session_key=key).update(session_data=store.encode(data))
+
+
+def forwards(apps, schema_editor):
+    replace_backend(apps, OLD_BACKEND, NEW_BACKEND)
+
+
+def backwards(apps, schema_editor):
+    replace_backend(apps, NEW_BACKEND, OLD_BACKEND)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+        ('users', '0003_user_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,124 @@
+from django.core.cache import cache
+from django.contrib.auth.models import Permission
+from django.utils.functional import cached_property
+
+from photos.cache import bump_version, get_version
+
+USER_ACCESS_KEY = 'users:access'
+USER_ACCESS_TIMEOUT = 60 * 60
+
+MODERATORS_GROUP = 'Модераторы'
+CONTENT_ADMINS_GROUP = 'Администраторы контента'
+USERS_GROUP = 'Пользователи'
+
+# Флаги групп, доступные в шаблонах как user_groups.<флаг>
+GROUP_FLAGS = {
+    'is_moderator': MODERATORS_GROUP,
+    'is_admin': CONTENT_ADMINS_GROUP,
+    'is_user': USERS_GROUP,
+}
+
+
+def user_access_key(user_id):
+    return f'{USER_ACCESS_KEY}:{user_id}'
+
+
+def load_user_access(user):
+    """
+    Группы и разрешения пользователя: два запроса к БД, результат хранится
+    в кэше по ключу пользователя и версии прав. Разрешения собираются так же,
+    как в ModelBackend: собственные и полученные через группы.
+    """
+    key = user_access_key(user.pk)
+    version = get_version(USER_ACCESS_KEY)
+    access = cache.get(key, version=version)
+    if access is not None:
+        return access
+
+    groups = frozenset(user.groups.values_list('name', flat=True))
+    permissions = Permission.objects.filter(
+        user=user) | Permission.objects.filter(group__user=user)
+    access = (groups, frozenset(
+        f'{app_label}.{codename}' for app_label, codename in
+        permissions.values_list('content_type__app_label', 'codename').distinct()))
+    cache.set(key, access, USER_ACCESS_TIMEOUT, version=version)
+    return access
+
+
+def invalidate_user_access(user_ids=None):
+    """Сбрасывает права указанных пользователей или (без аргумента) всех"""
+    if user_ids is None:
+        bump_version(USER_ACCESS_KEY)
+    else:
+        cache.delete_many([user_access_key(pk) for pk in user_ids])
+
+
+class UserAccess:
+    """
+    Права пользователя в рамках одного запроса. Загружаются при первом
+    обращении, поэтому страницы, которые их не проверяют, не платят за них.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _loaded(self):
+        if not self.user.is_authenticated:
+            return frozenset(), frozenset()
+        return load_user_access(self.user)
+
+    @property
+    def groups(self):
+        return self._loaded[0]
+
+    def in_group(self, name):
+        return name in self.groups
+
+    def has_perm(self, perm):
+        if not self.user.is_active:
+            return False
+        if self.user.is_superuser:
+            return True
+        return perm in self._loaded[1]
+
+    def has_perms(self, perms):
+        return all(self.has_perm(perm) for perm in perms)
+
+    @cached_property
+    def permission_flags(self):
+        return PermissionFlags(self)
+
+    @cached_property
+    def group_flags(self):
+        return GroupFlags(self)
+
+
+class PermissionFlags:
+    """user_permissions.can_moderate_comments -> has_perm('users.can_moderate_comments')"""
+
+    def __init__(self, access):
+        self.access = access
+
+    def __getitem__(self, codename):
+        if not codename.startswith('can_'):
+            raise KeyError(codename)
+        return self.access.has_perm(f'users.{codename}')
+
+
+class GroupFlags:
+    """user_groups.is_moderator -> состоит ли пользователь в группе модераторов"""
+
+    def __init__(self, access):
+        self.access = access
+
+    def __getitem__(self, flag):
+        return self.access.in_group(GROUP_FLAGS[flag])
+
+
+def get_user_access(request):
+    """Общий для контекстного процессора, декораторов и представлений объект прав"""
+    access = getattr(request, '_user_access', None)
+    if access is None or access.user is not request.user:
+        access = request._user_access = UserAccess(request.user)
+    return access
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .permissions import invalidate_user_access
+
+CHANGE_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_access_on_user_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Группы и личные разрешения пользователя. При изменении со стороны
+    группы или разрешения (group.user_set.add(...)) затронутые пользователи
+    известны по pk_set, кроме очистки - тогда сбрасываются права всех.
+    """
+    if action not in CHANGE_ACTIONS:
+        return
+    if not reverse:
+        invalidate_user_access([instance.pk])
+    elif pk_set:
+        invalidate_user_access(pk_set)
+    elif action == 'post_clear':
+        invalidate_user_access()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_access_on_group_permissions(sender, action, **kwargs):
+    """Разрешения группы меняют права всех её участников"""
+    if action in CHANGE_ACTIONS:
+        invalidate_user_access()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_access_on_group_change(sender, **kwargs):
+    invalidate_user_access()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_session_user(sender, instance, **kwargs):
+    """Пользователь сессии (пароль, is_active, имя) перечитывается после изменений"""
+    invalidate_cached_user(instance.pk)
@@ -1,3 +1,192 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .authentication import CachedModelBackend, user_cache_key, users_with_email
+from .permissions import MODERATORS_GROUP, UserAccess, get_user_access
+from .throttling import LOGIN_RATES, local_buckets, take_token, throttle_metrics
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class UserAccessTest(TestCase):
+    """Права загружаются один раз и кэшируются до изменения групп или разрешений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('member', password='password123')
+        cls.moderators = Group.objects.create(name=MODERATORS_GROUP)
+        cls.permission = Permission.objects.get(codename='change_user')
+
+    def setUp(self):
+        cache.clear()
+
+    def access(self):
+        return UserAccess(User.objects.get(pk=self.user.pk))
+
+    def test_loaded_lazily_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        access = get_user_access(request)
+        self.assertIs(get_user_access(request), access)
+        with self.assertNumQueries(2):
+            access.in_group(MODERATORS_GROUP)
+            access.has_perm('auth.change_user')
+            access.permission_flags['can_moderate_comments']
+        other_request = UserAccess(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(0):
+            other_request.has_perm('auth.change_user')
+
+    def test_invalidated_by_group_membership(self):
+        self.assertFalse(self.access().in_group(MODERATORS_GROUP))
+        self.user.groups.add(self.moderators)
+        self.assertTrue(self.access().in_group(MODERATORS_GROUP))
+        self.moderators.user_set.remove(self.user)
+        self.assertFalse(self.access().in_group(MODERATORS_GROUP))
+
+    def test_invalidated_by_permissions(self):
+        self.user.groups.add(self.moderators)
+        self.assertFalse(self.access().has_perm('auth.change_user'))
+        self.moderators.permissions.add(self.permission)
+        self.assertTrue(self.access().has_perm('auth.change_user'))
+        self.moderators.permissions.clear()
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.access().has_perm('auth.change_user'))
+
+    def test_moderator_panel(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('users:moderator_panel')).status_code, 302)
+        self.user.groups.add(self.moderators)
+        self.assertEqual(self.client.get(reverse('users:moderator_panel')).status_code, 200)
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class EmailAuthTest(TestCase):
+    """Вход по email без учёта регистра и пользователь сессии из кэша"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'member', email='Member@Example.com', password='password123')
+
+    def setUp(self):
+        cache.clear()
+        local_buckets.clear()
+
+    def test_email_login_is_case_insensitive(self):
+        self.assertEqual(authenticate(username='member@example.COM', password='password123'),
+                         self.user)
+        self.assertIsNone(authenticate(username='member@example.com', password='wrong'))
+        self.assertEqual(authenticate(username='member', password='password123'), self.user)
+
+    def test_email_lookup_uses_index(self):
+        plan = users_with_email('member@example.com').explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('users_email_lower_idx', plan)
+
+    def test_one_password_hash_per_attempt(self):
+        with mock.patch.object(User, 'set_password') as dummy, \
+                mock.patch.object(User, 'check_password', return_value=False) as check:
+            authenticate(username='member@example.com', password='wrong')
+            authenticate(username='nobody@example.com', password='wrong')
+            authenticate(username='nobody', password='wrong')
+        self.assertEqual(check.call_count + dummy.call_count, 3)
+
+    def test_session_user_cached_until_saved(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = backend.get_user(self.user.pk)
+        self.assertEqual(user, self.user)
+        self.assertTrue(user.check_password('password123'))
+
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        self.assertEqual(backend.get_user(self.user.pk).first_name, 'Новое имя')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_password_change_ends_sessions(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('users:profile_view')).status_code, 200)
+        self.user.set_password('changed123')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('users:profile_view')).status_code, 302)
+
+    def test_schema_change_is_cache_miss(self):
+        cache.set(user_cache_key(self.user.pk), {'id': self.user.pk})
+        self.assertEqual(CachedModelBackend().get_user(self.user.pk), self.user)
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LoginThrottleTest(TestCase):
+    """Лимит попыток входа срабатывает до проверки пароля"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('member', password='password123')
+
+    def setUp(self):
+        cache.clear()
+        local_buckets.clear()
+
+    def login(self, username, password='wrong', ip='10.0.0.1', **extra):
+        return self.client.post(reverse('users:login'),
+                                {'username': username, 'password': password},
+                                REMOTE_ADDR=ip, **extra)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_ip_taken_from_trusted_proxy(self):
+        capacity = LOGIN_RATES['ip'][0]
+        for i in range(capacity):
+            # Адрес, подставленный клиентом левее записи прокси, не учитывается
+            self.login(f'user{i}', HTTP_X_FORWARDED_FOR=f'1.2.3.{i}, 10.0.0.1')
+        self.assertEqual(self.login('member', HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 429)
+        # Клиенты за тем же прокси (общий REMOTE_ADDR) ограничиваются отдельно
+        self.assertEqual(self.login('member', password='password123',
+                                    HTTP_X_FORWARDED_FOR='10.0.0.2').status_code, 302)
+
+    def test_token_bucket_refills(self):
+        state = None
+        for _ in range(5):
+            allowed, state, _ = take_token(state, 5, 60, now=0)
+            self.assertTrue(allowed)
+        allowed, state, retry_after = take_token(state, 5, 60, now=0)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 12)
+        self.assertTrue(take_token(state, 5, 60, now=12)[0])
+
+    def test_username_limited_before_password_check(self):
+        capacity = LOGIN_RATES['username'][0]
+        for i in range(capacity):
+            self.assertEqual(self.login('member', ip=f'10.0.0.{i}').status_code, 200)
+
+        with mock.patch.object(User, 'check_password') as check:
+            response = self.login('MEMBER', password='password123', ip='10.0.1.1')
+        check.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(throttle_metrics()['throttled:username'], 1)
+
+    def test_ip_limited_across_usernames(self):
+        capacity = LOGIN_RATES['ip'][0]
+        for i in range(capacity):
+            self.login(f'user{i}')
+        self.assertEqual(self.login('member', password='password123').status_code, 429)
+        self.assertEqual(throttle_metrics()['throttled:ip'], 1)
+
+    def test_shared_bucket_applies_across_processes(self):
+        capacity = LOGIN_RATES['username'][0]
+        for _ in range(capacity):
+            self.login('member')
+        local_buckets.clear()
+        self.assertEqual(self.login('member').status_code, 429)
@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Ведро на ключ: (ёмкость, за сколько секунд пополняется полностью).
+# По IP допускается всплеск в 30 попыток, по логину - 5, дальше
+# попытки пропускаются с постоянной скоростью пополнения.
+LOGIN_RATES = {
+    'ip': (30, 5 * 60),
+    'username': (5, 5 * 60),
+}
+THROTTLE_KEY = 'users:throttle'
+METRICS_KEY = f'{THROTTLE_KEY}:metrics'
+# Сколько вёдер держит процесс; самые давние вытесняются первыми
+LOCAL_MAX_BUCKETS = 10000
+
+
+def take_token(state, capacity, period, now):
+    """
+    Шаг алгоритма token bucket. state - (токены, время обновления) или None
+    для нового ведра. Возвращает (пропущен ли запрос, новое состояние,
+    через сколько секунд появится токен).
+    """
+    rate = capacity / period
+    tokens, updated = state if state is not None else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return True, (tokens - 1, now), 0
+    return False, (tokens, now), math.ceil((1 - tokens) / rate)
+
+
+class LocalBuckets:
+    """
+    Вёдра в памяти процесса. Проверяются до обращения к общему кэшу,
+    поэтому поток попыток на один воркер отсекается без сетевых запросов.
+    """
+
+    def __init__(self, max_buckets=LOCAL_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self.lock:
+            allowed, state, retry_after = take_token(
+                self.buckets.pop(key, None), capacity, period, now)
+            self.buckets[key] = state
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+local_buckets = LocalBuckets()
+
+
+def take_shared(key, capacity, period, now):
+    """
+    Ведро в общем кэше - общий лимит для всех воркеров. Чтение и запись
+    не атомарны, поэтому при одновременных попытках лимит может быть
+    превышен на число воркеров; для защиты от перебора этого достаточно.
+    """
+    allowed, state, retry_after = take_token(cache.get(key), capacity, period, now)
+    cache.set(key, state, period)
+    return allowed, retry_after
+
+
+def bucket_key(scope, value):
+    digest = hashlib.sha256(value.encode()).hexdigest()[:32]
+    return f'{THROTTLE_KEY}:{scope}:{digest}'
+
+
+def client_ip(request):
+    """
+    IP клиента. За TRUSTED_PROXY_COUNT прокси берётся запись X-Forwarded-For,
+    добавленная самым внешним из них: записи левее клиент может подставить
+    сам. Без заголовка (запрос не прошёл через прокси) - REMOTE_ADDR.
+    """
+    if request is None:
+        return None
+    proxies = settings.TRUSTED_PROXY_COUNT
+    if proxies:
+        forwarded = [ip.strip() for ip in
+                     request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def record(metric):
+    key = f'{METRICS_KEY}:{metric}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def throttle_metrics():
+    """Число проверенных попыток входа и отклонённых по каждому ключу"""
+    metrics = ['checked'] + [f'throttled:{scope}' for scope in LOGIN_RATES]
+    values = cache.get_many([f'{METRICS_KEY}:{metric}' for metric in metrics])
+    return {metric: values.get(f'{METRICS_KEY}:{metric}', 0) for metric in metrics}
+
+
+def check_login(request, username):
+    """
+    Забирает токены попытки входа по IP и по логину/email.
+    Возвращает None, если попытку можно проверять, иначе - через сколько
+    секунд повторить. Вызывается до проверки пароля.
+    """
+    now = time.time()
+    keys = []
+    ip = client_ip(request)
+    if ip:
+        keys.append(('ip', bucket_key('ip', ip)))
+    if username:
+        keys.append(('username', bucket_key('username', username.strip().lower())))
+
+    record('checked')
+    for take in (local_buckets.take, take_shared):
+        for scope, key in keys:
+            capacity, period = LOGIN_RATES[scope]
+            allowed, retry_after = take(key, capacity, period, now)
+            if not allowed:
+                record(f'throttled:{scope}')
+                logger.info('Попытка входа отклонена (%s), повтор через %s с',
+                            scope, retry_after)
+                return retry_after
+    return None
@@ -10,17 +10,29 @@ from django.views.generic import CreateView
 from django.db import transaction
 from django.core.exceptions import PermissionDenied
 from .models import Profile
-from .forms import ProfileForm, UserUpdateForm, UserRegistrationForm, CustomPasswordResetForm
+from .forms import (ProfileForm, UserUpdateForm, UserRegistrationForm, CustomPasswordResetForm,
+                    LoginForm)
+from .permissions import MODERATORS_GROUP, get_user_access
 
 
 class LoginUser(LoginView):
     """Представление для входа в систему"""
+    form_class = LoginForm
     template_name = 'users/login.html'
     extra_context = {'title': 'Авторизация'}
 
     def get_success_url(self):
         return reverse_lazy('photos:photo_list')
 
+    def form_invalid(self, form):
+        """Отклонённая ограничителем попытка - 429 с Retry-After"""
+        response = super().form_invalid(form)
+        retry_after = getattr(self.request, 'login_throttled', None)
+        if retry_after is not None:
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+        return response
+
 
 class RegisterUser(CreateView):
     """Представление для регистрации пользователя"""
@@ -39,7 +51,7 @@ class RegisterUser(CreateView):
             Profile.objects.get_or_create(user=user)
             
             # Входим в систему
-            user.backend = 'django.contrib.auth.backends.ModelBackend'
+            user.backend = 'users.authentication.CachedModelBackend'
             login(self.request, user)
             
             messages.success(self.request, 'Регистрация прошла успешно!')
@@ -99,7 +111,7 @@ def profile_view(request, username=None):
     if username:
         user = get_object_or_404(User, username=username)
         # Проверяем разрешение на просмотр чужих профилей
-        if user != request.user and not request.user.has_perm('users.can_view_all_profiles'):
+        if user != request.user and not get_user_access(request).has_perm('users.can_view_all_profiles'):
             messages.error(request, 'У вас нет прав для просмотра этого профиля.')
             return redirect('users:profile_view')
     else:
@@ -109,8 +121,10 @@ def profile_view(request, username=None):
     
     # Получаем фотографии пользователя
     try:
+        from photos.fragments import render_photo_cards
         from photos.models import Photo
-        user_photos = Photo.objects.filter(uploaded_by=user).order_by('-uploaded_at')[:6]
+        user_photos = render_photo_cards(
+            Photo.custom.for_cards().filter(uploaded_by=user).order_by('-uploaded_at')[:6])
         total_photos = Photo.objects.filter(uploaded_by=user).count()
     except ImportError:
         user_photos = []
@@ -122,16 +136,7 @@ def profile_view(request, username=None):
         'user_photos': user_photos,
         'is_own_profile': request.user == user,
         'total_photos': total_photos,
-        'user_permissions': {
-            'can_edit_any_profile': request.user.has_perm('users.can_edit_any_profile'),
-            'can_view_all_profiles': request.user.has_perm('users.can_view_all_profiles'),
-            'can_moderate_comments': request.user.has_perm('users.can_moderate_comments'),
-            'can_manage_user_roles': request.user.has_perm('users.can_manage_user_roles'),
-        },
-        'user_groups': {
-            'is_moderator': request.user.groups.filter(name='Модераторы').exists(),
-            'is_admin': request.user.groups.filter(name='Администраторы контента').exists(),
-        }
+        # user_permissions и user_groups добавляет контекстный процессор
     }
     
     return render(request, 'users/profile.html', context)
@@ -143,7 +148,7 @@ def edit_profile(request, username=None):
     if username:
         user = get_object_or_404(User, username=username)
         # Проверяем права на редактирование чужого профиля
-        if user != request.user and not request.user.has_perm('users.can_edit_any_profile'):
+        if user != request.user and not get_user_access(request).has_perm('users.can_edit_any_profile'):
             messages.error(request, 'У вас нет прав для редактирования этого профиля.')
             return redirect('users:profile_view')
     else:
@@ -186,9 +191,9 @@ def edit_profile(request, username=None):
 @login_required
 def all_profiles_view(request):
     """Просмотр всех профилей (только для пользователей с соответствующим разрешением)"""
-    if not request.user.has_perm('users.can_view_all_profiles'):
+    if not get_user_access(request).has_perm('users.can_view_all_profiles'):
         messages.error(request, "У вас нет прав для просмотра всех профилей.")
-        return redirect('photo_list')
+        return redirect('photos:photo_list')
     
     profiles = Profile.objects.select_related('user').all().order_by('-created_at')
     
@@ -203,9 +208,9 @@ def all_profiles_view(request):
 @login_required
 def moderator_panel(request):
     """Панель модератора"""
-    if not request.user.groups.filter(name='Модераторы').exists() and not request.user.is_staff:
+    if not get_user_access(request).in_group(MODERATORS_GROUP) and not request.user.is_staff:
         messages.error(request, "Доступ только для модераторов.")
-        return redirect('photo_list')
+        return redirect('photos:photo_list')
     
     from django.contrib.auth.models import Group
     
@@ -213,7 +218,7 @@ def moderator_panel(request):
     total_users = User.objects.count()
     total_profiles = Profile.objects.count()
     try:
-        moderators_count = Group.objects.get(name='Модераторы').user_set.count()
+        moderators_count = Group.objects.get(name=MODERATORS_GROUP).user_set.count()
     except Group.DoesNotExist:
         moderators_count = 0
     
@@ -234,7 +239,7 @@ def moderator_panel(request):
 @login_required
 def manage_user_roles(request, user_id):
     """Управление ролями пользователя"""
-    if not request.user.has_perm('users.can_manage_user_roles'):
+    if not get_user_access(request).has_perm('users.can_manage_user_roles'):
         raise PermissionDenied("У вас нет прав для управления ролями пользователей.")
     
     from django.contrib.auth.models import Group, Permission